@@ -0,0 +1,86 @@
+"""
+The address book: deduplicated, immutable Address rows.
+
+address_for() turns shipping details into the user's Address row for
+them, creating it only if the user never used that address before.
+Details count as the same address when they match after trimming,
+collapsing whitespace and ignoring case.
+"""
+import hashlib
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Address
+
+ADDRESS_FIELDS = ["name", "email", "phone", "address", "city", "state", "postal_code", "country"]
+MAX_LENGTHS = {"name": 100, "phone": 15, "city": 100, "state": 100, "postal_code": 10, "country": 100}
+
+
+def clean_address(data):
+    """The address fields of `data`, trimmed to what the columns hold"""
+    cleaned = {}
+    for field in ADDRESS_FIELDS:
+        value = (data.get(field) or "").strip()
+        cleaned[field] = value[: MAX_LENGTHS[field]] if field in MAX_LENGTHS else value
+    return cleaned
+
+
+def address_hash(data):
+    normalized = "\x1f".join(" ".join((data.get(field) or "").split()).casefold() for field in ADDRESS_FIELDS)
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def address_for(user, data):
+    """
+    The user's Address for these details, added to the address book if new.
+    One the user removed stays out of the book; only address_book_view
+    puts it back.
+    """
+    cleaned = clean_address(data)
+    content_hash = address_hash(cleaned)
+    now = timezone.now()
+    address = Address.objects.filter(user=user, content_hash=content_hash).first()
+    if address is None:
+        try:
+            with transaction.atomic():
+                return Address.objects.create(user=user, content_hash=content_hash, last_used_at=now, **cleaned)
+        except IntegrityError:
+            # Another checkout of the same user added it first
+            address = Address.objects.get(user=user, content_hash=content_hash)
+    Address.objects.filter(id=address.id).update(last_used_at=now)
+    return address
+
+
+def saved_addresses(user):
+    return Address.objects.filter(user=user, saved=True).order_by("-is_default", "-last_used_at", "-id")
+
+
+def default_address(user, default_country=""):
+    """
+    Shipping details to prefill checkout with: the user's default address,
+    else the one used last, else the profile fields.
+    """
+    address = saved_addresses(user).first()
+    if address:
+        return {field: getattr(address, field) for field in ADDRESS_FIELDS}
+    return {
+        "name": user.get_full_name() or user.username,
+        "email": user.email or "",
+        "phone": getattr(user, "phone_number", "") or "",
+        "address": getattr(user, "address", "") or "",
+        "city": getattr(user, "city", "") or "",
+        "state": getattr(user, "state", "") or "",
+        "postal_code": getattr(user, "postal_code", "") or "",
+        "country": getattr(user, "country", "") or default_country,
+    }
+
+
+def set_default(user, address_id):
+    """Make one of the user's saved addresses the default; returns whether it exists"""
+    with transaction.atomic():
+        if not Address.objects.filter(id=address_id, user=user, saved=True).exists():
+            return False
+        Address.objects.filter(user=user, is_default=True).update(is_default=False)
+        Address.objects.filter(id=address_id).update(is_default=True)
+    return True
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, UserProfile, SellerProfile
+from .models import User, UserProfile, SellerProfile, Address
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -27,3 +27,10 @@ class SellerProfileAdmin(admin.ModelAdmin):
     list_filter = ('is_verified', 'rating', 'created_at')
     search_fields = ('business_name', 'user__username', 'business_license')
     readonly_fields = ('rating', 'total_sales')
+
+@admin.register(Address)
+class AddressAdmin(admin.ModelAdmin):
+    list_display = ('name', 'user', 'city', 'country', 'is_default', 'saved', 'last_used_at')
+    list_filter = ('saved', 'is_default', 'country')
+    search_fields = ('user__username', 'name', 'city', 'postal_code')
+    readonly_fields = ('content_hash', 'created_at', 'last_used_at')
@@ -2,7 +2,7 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
-from .models import User, UserProfile, SellerProfile
+from .models import Address, User, UserProfile, SellerProfile
 
 class UserRegistrationForm(forms.Form):
     email = forms.EmailField(required=True)
@@ -87,3 +87,11 @@ class UserUpdateForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         for field_name, field in self.fields.items():
             field.widget.attrs['class'] = 'w-full p-3 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-600'
+
+class AddressForm(forms.ModelForm):
+    class Meta:
+        model = Address
+        fields = ['name', 'email', 'phone', 'address', 'city', 'state', 'postal_code', 'country']
+        widgets = {
+            'address': forms.Textarea(attrs={'rows': 3}),
+        }
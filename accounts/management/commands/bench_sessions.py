@@ -0,0 +1,110 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from crazycart.sessions import ENGINES
+
+PLAIN_SERIALIZER = "django.core.signing.JSONSerializer"
+
+# What a logged-in buyer's session holds between buy-now and payment
+SAMPLE_SESSION = {
+    "_auth_user_id": "42",
+    "_auth_user_backend": "django.contrib.auth.backends.ModelBackend",
+    "_auth_user_hash": "0" * 64,
+    "buy_now_item": {
+        "product_id": 1234,
+        "product_name": "Wireless Noise Cancelling Headphones",
+        "product_price": "12999.00",
+        "quantity": 2,
+        "total_price": "25998.00",
+        "seller_id": 17,
+        "seller_name": "Rahim Electronics",
+    },
+    "pending_order_id": 5678,
+}
+
+
+class Command(BaseCommand):
+    help = "Compare per-request session overhead of the session engines and serializers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="Requests per engine")
+        parser.add_argument(
+            "--write-every", type=int, default=10, help="Every Nth request changes the session (0 never)"
+        )
+
+    def measure(self, engine, serializer, count, write_every):
+        factory = RequestFactory()
+        state = {"write": True}
+
+        def view(request):
+            if state["write"]:
+                request.session.update(SAMPLE_SESSION)
+                request.session["seen"] = time.time()
+            else:
+                request.session.get("buy_now_item")
+            return HttpResponse()
+
+        with override_settings(SESSION_ENGINE=engine, SESSION_SERIALIZER=serializer):
+            middleware = SessionMiddleware(view)
+            response = middleware(factory.get("/"))
+            cookie = response.cookies[settings.SESSION_COOKIE_NAME].value
+
+            timings = []
+            with CaptureQueriesContext(connection) as queries:
+                for number in range(1, count + 1):
+                    state["write"] = bool(write_every) and number % write_every == 0
+                    request = factory.get("/")
+                    request.COOKIES[settings.SESSION_COOKIE_NAME] = cookie
+                    start = time.perf_counter()
+                    response = middleware(request)
+                    timings.append((time.perf_counter() - start) * 1000)
+                    if settings.SESSION_COOKIE_NAME in response.cookies:
+                        cookie = response.cookies[settings.SESSION_COOKIE_NAME].value
+
+            store = middleware.SessionStore(cookie)
+            stored_bytes = len(store.encode(store.load()))
+            store.delete()
+
+        timings.sort()
+        return {
+            "mean": statistics.mean(timings),
+            "p95": timings[int(len(timings) * 0.95) - 1],
+            "queries": len(queries) / count,
+            "bytes": stored_bytes,
+        }
+
+    def handle(self, *args, **options):
+        count, write_every = options["requests"], options["write_every"]
+        compact = "crazycart.sessions.CompactJSONSerializer"
+        runs = [("db", "plain", ENGINES["db"], PLAIN_SERIALIZER)]
+        for name in ("db", "cached_db", "signed_cookies"):
+            runs.append((name, "compact", ENGINES[name], compact))
+
+        self.stdout.write(f"{'engine':15} {'serializer':10} {'ms/req':>8} {'p95 ms':>8} {'queries':>8} {'bytes':>6}")
+        results = {}
+        for name, serializer_name, engine, serializer in runs:
+            result = self.measure(engine, serializer, count, write_every)
+            results[(name, serializer_name)] = result
+            self.stdout.write(
+                f"{name:15} {serializer_name:10} {result['mean']:8.3f} {result['p95']:8.3f} "
+                f"{result['queries']:8.2f} {result['bytes']:6}"
+            )
+
+        baseline = results[("db", "plain")]
+        configured = next((name for name, path in ENGINES.items() if path == settings.SESSION_ENGINE), None)
+        current = results.get((configured, "compact"))
+        if current and baseline["mean"]:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Configured engine ({settings.SESSION_ENGINE}): "
+                    f"{100 * (1 - current['mean'] / baseline['mean']):.0f}% less time per request than plain db sessions"
+                )
+            )
@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Delete expired sessions from the database in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--pause", type=float, default=0.0, help="Seconds to sleep between batches, to let checkouts write"
+        )
+
+    def handle(self, *args, **options):
+        if settings.SESSION_ENGINE.endswith((".signed_cookies", ".cache")):
+            self.stdout.write(f"{settings.SESSION_ENGINE} keeps no session rows; nothing to purge")
+            return
+
+        # Unlike clearsessions, each DELETE holds the write lock only briefly
+        now = timezone.now()
+        deleted = 0
+        while True:
+            keys = list(
+                Session.objects.filter(expire_date__lt=now).values_list("session_key", flat=True)[
+                    : options["batch_size"]
+                ]
+            )
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            if options["pause"]:
+                time.sleep(options["pause"])
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired sessions"))
@@ -46,3 +46,35 @@ class SellerProfile(models.Model):
     
     def __str__(self):
         return f"{self.business_name} - {self.user.username}"
+
+class Address(models.Model):
+    """
+    A postal address a user shipped to. Rows are never edited: saving a
+    changed address makes a new row, so an order keeps the address it was
+    placed with. One user's identical addresses share a row, found by
+    content_hash; see accounts/addresses.py.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='addresses')
+    name = models.CharField(max_length=100)
+    email = models.EmailField()
+    phone = models.CharField(max_length=15)
+    address = models.TextField()
+    city = models.CharField(max_length=100)
+    state = models.CharField(max_length=100, blank=True)
+    postal_code = models.CharField(max_length=10, blank=True)
+    country = models.CharField(max_length=100)
+    content_hash = models.CharField(max_length=64)
+    # Listed in the user's address book; removing it from there keeps the row for its orders
+    saved = models.BooleanField(default=True)
+    is_default = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'content_hash'], name='unique_user_address'),
+        ]
+        indexes = [models.Index(fields=['user', 'saved', 'last_used_at'])]
+
+    def __str__(self):
+        return f"{self.name}, {self.address}, {self.city}"
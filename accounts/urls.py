@@ -9,6 +9,9 @@ urlpatterns = [
     path('signup/', views.signup_view, name='signup'),
     path('profile/', views.profile_view, name='profile'),
     path('edit-profile/', views.edit_profile_view, name='edit_profile'),
+    path('addresses/', views.address_book_view, name='address_book'),
+    path('addresses/<int:address_id>/default/', views.set_default_address_view, name='set_default_address'),
+    path('addresses/<int:address_id>/remove/', views.remove_address_view, name='remove_address'),
     path('seller-profile/', views.seller_profile_view, name='seller_profile'),
     path('seller-dashboard/', views.seller_dashboard_view, name='seller_dashboard'),
     path('admin-dashboard/', views.admin_dashboard_view, name='admin_dashboard'),
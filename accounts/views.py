@@ -3,8 +3,9 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import transaction
-from .models import User, UserProfile, SellerProfile
-from .forms import UserRegistrationForm, UserProfileForm, SellerProfileForm, UserUpdateForm
+from django.views.decorators.http import require_POST
+from .models import Address, User, UserProfile, SellerProfile
+from .forms import AddressForm, UserRegistrationForm, UserProfileForm, SellerProfileForm, UserUpdateForm
 
 def login_view(request):
     if request.user.is_authenticated:
@@ -103,6 +104,65 @@ def edit_profile_view(request):
         'profile_form': profile_form
     })
 
+@login_required
+def address_book_view(request):
+    """Saved addresses; checkout prefills from the default one"""
+    from .addresses import address_for, default_address, saved_addresses, set_default
+
+    # Addresses are never edited in place: saving a change adds a new one in its stead
+    replaces_id = request.POST.get('replaces') or request.GET.get('edit') or ''
+    replaces = saved_addresses(request.user).filter(id=replaces_id).first() if replaces_id.isdigit() else None
+
+    if request.method == 'POST':
+        form = AddressForm(request.POST)
+        if form.is_valid():
+            with transaction.atomic():
+                address = address_for(request.user, form.cleaned_data)
+                # Back in the book if it was removed before
+                Address.objects.filter(id=address.id).update(saved=True)
+                if replaces and replaces.id != address.id:
+                    Address.objects.filter(id=replaces.id).update(saved=False, is_default=False)
+                has_default = saved_addresses(request.user).filter(is_default=True).exists()
+                if request.POST.get('make_default') or not has_default:
+                    set_default(request.user, address.id)
+            messages.success(request, 'Address saved.')
+            return redirect('accounts:address_book')
+    elif replaces:
+        form = AddressForm(instance=replaces)
+    elif saved_addresses(request.user).exists():
+        form = AddressForm()
+    else:
+        # Start the book from the profile
+        form = AddressForm(initial=default_address(request.user))
+
+    return render(request, 'accounts/address_book.html', {
+        'addresses': saved_addresses(request.user),
+        'form': form,
+        'replaces': replaces,
+    })
+
+@login_required
+@require_POST
+def set_default_address_view(request, address_id):
+    from .addresses import set_default
+
+    if set_default(request.user, address_id):
+        messages.success(request, 'Default address updated.')
+    else:
+        messages.error(request, 'Address not found.')
+    return redirect('accounts:address_book')
+
+@login_required
+@require_POST
+def remove_address_view(request, address_id):
+    # Orders placed with it keep pointing at the row
+    removed = Address.objects.filter(id=address_id, user=request.user, saved=True).update(saved=False, is_default=False)
+    if removed:
+        messages.success(request, 'Address removed.')
+    else:
+        messages.error(request, 'Address not found.')
+    return redirect('accounts:address_book')
+
 @login_required
 def seller_profile_view(request):
     if request.user.user_type != 'seller':
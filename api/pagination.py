@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """Newest first; cursor pagination keeps deep pages as cheap as the first one"""
+    ordering = "-created_at"
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class NameCursorPagination(CreatedAtCursorPagination):
+    ordering = "name"
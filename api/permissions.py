@@ -0,0 +1,19 @@
+from rest_framework import permissions
+
+
+class IsSellerOrReadOnly(permissions.BasePermission):
+    """Anyone can read; only sellers can create, and only the owner can change"""
+
+    def has_permission(self, request, view):
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        return bool(
+            request.user
+            and request.user.is_authenticated
+            and request.user.user_type == "seller"
+        )
+
+    def has_object_permission(self, request, view, obj):
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        return obj.seller_id == request.user.id
@@ -0,0 +1,208 @@
+from decimal import Decimal
+
+from rest_framework import serializers
+
+from bargaining.models import BargainRequest
+from cart.models import Cart, CartItem
+from orders.models import Order, OrderItem, Payment
+from orders.services import ADDRESS_FIELDS, CART_PAYMENT_METHODS
+from products.models import Category, Product, ProductImage, Wishlist
+
+
+class SparseFieldsMixin:
+    """Limit output to the comma-separated `fields` passed in by the viewset (?fields=)"""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ["id", "name", "slug", "parent", "depth", "product_count", "description", "image"]
+
+
+class ProductImageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductImage
+        fields = ["id", "image", "alt_text", "is_primary", "order"]
+
+
+class ProductSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Product
+        fields = ["id", "slug", "name", "price", "stock_quantity"]
+
+
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    category = serializers.PrimaryKeyRelatedField(
+        queryset=Category.objects.filter(is_active=True)
+    )
+    category_name = serializers.CharField(source="category.name", read_only=True)
+    seller = serializers.CharField(source="seller.username", read_only=True)
+    images = ProductImageSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Product
+        fields = [
+            "id", "slug", "sku", "name", "description", "category", "category_name",
+            "seller", "price", "original_price", "condition", "stock_quantity",
+            "brand", "model", "color", "size", "weight", "dimensions",
+            "is_active", "is_featured", "allow_bargaining", "minimum_bargain_price",
+            "views_count", "images", "created_at", "updated_at",
+        ]
+        read_only_fields = ["slug", "sku", "views_count", "created_at", "updated_at"]
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # The lowest price a seller accepts in bargaining is theirs alone to see
+        request = self.context.get("request")
+        if not (request and request.user.is_authenticated and request.user.id == instance.seller_id):
+            data.pop("minimum_bargain_price", None)
+        return data
+
+
+class CartItemSerializer(serializers.ModelSerializer):
+    product = serializers.PrimaryKeyRelatedField(
+        queryset=Product.objects.filter(is_active=True)
+    )
+    product_name = serializers.CharField(source="product.name", read_only=True)
+    product_slug = serializers.CharField(source="product.slug", read_only=True)
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = CartItem
+        fields = [
+            "id", "product", "product_name", "product_slug",
+            "quantity", "price_at_time", "total_price",
+        ]
+        read_only_fields = ["price_at_time"]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.instance is not None:
+            # price_at_time belongs to the product the line was added with
+            fields["product"] = serializers.PrimaryKeyRelatedField(read_only=True)
+        return fields
+
+    def validate(self, attrs):
+        product = attrs.get("product") or self.instance.product
+        quantity = attrs.get("quantity", self.instance.quantity if self.instance else 1)
+        if quantity <= 0:
+            raise serializers.ValidationError({"quantity": "Invalid quantity"})
+        if quantity > product.stock_quantity:
+            raise serializers.ValidationError({"quantity": "Not enough stock available"})
+        return attrs
+
+
+class CartSerializer(serializers.ModelSerializer):
+    items = CartItemSerializer(many=True, read_only=True)
+    total_items = serializers.IntegerField(read_only=True)
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    discount_amount = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = Cart
+        fields = ["id", "items", "total_items", "subtotal", "discount_amount", "total_price", "updated_at"]
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source="product.name", read_only=True)
+    product_slug = serializers.CharField(source="product.slug", read_only=True)
+    seller = serializers.CharField(source="seller.username", read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = [
+            "id", "product", "product_name", "product_slug", "seller", "quantity",
+            "price_at_time", "total_price", "status", "tracking_number",
+            "shipped_at", "delivered_at",
+        ]
+
+
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
+    # The shipping address keeps its flat shipping_* fields
+    shipping_name = serializers.CharField(source="shipping.name", read_only=True)
+    shipping_email = serializers.CharField(source="shipping.email", read_only=True)
+    shipping_phone = serializers.CharField(source="shipping.phone", read_only=True)
+    shipping_address = serializers.CharField(source="shipping.address", read_only=True)
+    shipping_city = serializers.CharField(source="shipping.city", read_only=True)
+    shipping_state = serializers.CharField(source="shipping.state", read_only=True)
+    shipping_postal_code = serializers.CharField(source="shipping.postal_code", read_only=True)
+    shipping_country = serializers.CharField(source="shipping.country", read_only=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            "order_number", "status", "payment_status", "subtotal", "discount_amount",
+            "tax_amount", "shipping_amount", "total_amount",
+        ] + [f"shipping_{field}" for field in ADDRESS_FIELDS] + [
+            "tracking_number", "estimated_delivery", "items",
+            "created_at", "updated_at", "shipped_at", "delivered_at",
+        ]
+        read_only_fields = fields
+
+
+class OrderCreateSerializer(serializers.Serializer):
+    """Checkout the cart; shipping fields default to the user's profile"""
+    payment_method = serializers.ChoiceField(
+        choices=[
+            choice for choice in Payment.PAYMENT_METHOD_CHOICES
+            if choice[0] in CART_PAYMENT_METHODS
+        ]
+    )
+    shipping_name = serializers.CharField(max_length=100, required=False)
+    shipping_email = serializers.EmailField(required=False)
+    shipping_phone = serializers.CharField(max_length=15, required=False)
+    shipping_address = serializers.CharField(required=False)
+    shipping_city = serializers.CharField(max_length=100, required=False)
+    shipping_state = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    shipping_postal_code = serializers.CharField(max_length=10, required=False, allow_blank=True)
+    shipping_country = serializers.CharField(max_length=100, required=False)
+
+
+class WishlistSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    product = serializers.PrimaryKeyRelatedField(
+        queryset=Product.objects.filter(is_active=True), write_only=True
+    )
+    product_detail = ProductSummarySerializer(source="product", read_only=True)
+
+    class Meta:
+        model = Wishlist
+        fields = ["id", "product", "product_detail", "created_at"]
+
+
+class BargainRequestSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    product = serializers.PrimaryKeyRelatedField(
+        queryset=Product.objects.filter(is_active=True)
+    )
+    product_name = serializers.CharField(source="product.name", read_only=True)
+    buyer = serializers.CharField(source="buyer.username", read_only=True)
+    seller = serializers.CharField(source="seller.username", read_only=True)
+    requested_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal("0.01"))
+
+    class Meta:
+        model = BargainRequest
+        fields = [
+            "id", "product", "product_name", "buyer", "seller", "original_price",
+            "requested_price", "current_offer", "status", "message", "quantity",
+            "expires_at", "created_at", "updated_at", "responded_at",
+        ]
+        read_only_fields = [
+            "original_price", "current_offer", "status", "expires_at",
+            "created_at", "updated_at", "responded_at",
+        ]
+
+
+class BargainResponseSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=["accept", "reject", "counter"])
+    counter_offer = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal("0.01"), required=False
+    )
+    message = serializers.CharField(required=False, allow_blank=True, default="")
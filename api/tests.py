@@ -0,0 +1,165 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from accounts.addresses import address_for
+from accounts.models import Address, User
+from bargaining.models import BargainRequest
+from cart.models import Cart, CartItem
+from orders.models import Order, OrderItem
+from products.models import Category, Product, ProductImage, Wishlist
+
+
+class APIQueryCountTests(TestCase):
+    """List endpoints must not issue per-row queries"""
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="pass1234", user_type="seller")
+        self.buyer = User.objects.create_user(
+            "buyer", password="pass1234", crazycart_balance=Decimal("1000.00")
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+        self.cart = Cart.objects.create(user=self.buyer)
+
+    def add_rows(self, count):
+        category = Category.objects.create(name=f"Category {Category.objects.count()}")
+        address = address_for(
+            self.buyer,
+            {
+                "name": "Buyer",
+                "email": "buyer@example.com",
+                "phone": "123",
+                "address": "Street 1",
+                "city": "Dhaka",
+                "country": "Bangladesh",
+            },
+        )
+        for i in range(count):
+            product = Product.objects.create(
+                seller=self.seller,
+                category=category,
+                name=f"Product {category.id}-{i}",
+                description="Test product",
+                price=Decimal("10.00"),
+                stock_quantity=10,
+            )
+            ProductImage.objects.create(product=product, image="products/test.jpg")
+            CartItem.objects.create(cart=self.cart, product=product, quantity=1)
+            Wishlist.objects.create(user=self.buyer, product=product)
+            BargainRequest.objects.create(
+                buyer=self.buyer,
+                seller=self.seller,
+                product=product,
+                original_price=product.price,
+                requested_price=Decimal("8.00"),
+            )
+            order = Order.objects.create(
+                user=self.buyer,
+                subtotal=product.price,
+                total_amount=product.price,
+                shipping=address,
+                billing=address,
+            )
+            OrderItem.objects.create(
+                order=order,
+                product=product,
+                seller=self.seller,
+                quantity=1,
+                price_at_time=product.price,
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries)
+
+    def test_list_endpoints_have_bounded_query_counts(self):
+        urls = {
+            "/api/v1/categories/": 3,
+            "/api/v1/products/": 4,
+            "/api/v1/cart/": 5,
+            "/api/v1/cart/items/": 2,
+            "/api/v1/orders/": 4,
+            "/api/v1/wishlist/": 2,
+            "/api/v1/bargains/": 2,
+        }
+        self.add_rows(2)
+        small = {url: self.count_queries(url) for url in urls}
+        self.add_rows(8)
+        for url, limit in urls.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), small[url])
+                self.assertLessEqual(small[url], limit)
+
+    def test_sparse_fieldsets(self):
+        self.add_rows(1)
+        response = self.client.get("/api/v1/products/?fields=id,name")
+        self.assertEqual(set(response.json()["results"][0]), {"id", "name"})
+
+    def test_etag_returns_not_modified(self):
+        self.add_rows(1)
+        response = self.client.get("/api/v1/products/")
+        etag = response["ETag"]
+        response = self.client.get("/api/v1/products/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_create_order_from_cart(self):
+        self.add_rows(1)
+        Address.objects.filter(user=self.buyer).update(saved=False)
+        response = self.client.post(
+            "/api/v1/orders/", {"payment_method": "crazycart_wallet"}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)  # buyer has no address on file
+
+        response = self.client.post(
+            "/api/v1/orders/",
+            {
+                "payment_method": "crazycart_wallet",
+                "shipping_phone": "123",
+                "shipping_address": "Street 1",
+                "shipping_city": "Dhaka",
+                "shipping_country": "Bangladesh",
+                "shipping_email": "buyer@example.com",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()["payment_status"], "paid")
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.crazycart_balance, Decimal("990.00"))
+        self.assertFalse(self.cart.items.exists())
+
+    def test_bargain_floor_is_only_shown_to_the_seller(self):
+        self.add_rows(1)
+        Product.objects.update(minimum_bargain_price=Decimal("7.00"))
+        slug = Product.objects.get().slug
+        self.assertNotIn("minimum_bargain_price", self.client.get(f"/api/v1/products/{slug}/").json())
+        self.assertNotIn("minimum_bargain_price", APIClient().get("/api/v1/products/").json()["results"][0])
+
+        self.client.force_authenticate(self.seller)
+        self.assertEqual(self.client.get(f"/api/v1/products/{slug}/").json()["minimum_bargain_price"], "7.00")
+
+    def test_cart_item_product_cannot_be_swapped(self):
+        self.add_rows(2)
+        cheap, item = Product.objects.order_by("id").first(), CartItem.objects.order_by("id").last()
+        response = self.client.patch(
+            f"/api/v1/cart/items/{item.id}/", {"product": cheap.id, "quantity": 2}, format="json"
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        item.refresh_from_db()
+        self.assertNotEqual(item.product_id, cheap.id)
+        self.assertEqual(item.quantity, 2)
+
+    def test_category_filter_includes_subcategories(self):
+        self.add_rows(1)
+        parent = Category.objects.create(name="Electronics")
+        child = Category.objects.create(name="Phones", parent=parent)
+        Product.objects.update(category=child)
+        for slug, count in ((parent.slug, 1), (child.slug, 1), ("missing", 0)):
+            with self.subTest(slug=slug):
+                self.assertEqual(len(APIClient().get(f"/api/v1/products/?category={slug}").json()["results"]), count)
@@ -1,10 +1,20 @@
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
+from rest_framework.authtoken.views import obtain_auth_token
+from . import views
 
-# Create the router for API viewsets when we implement them
+# Version 1 of the API; clients address it as /api/v1/...
 router = DefaultRouter()
+router.register('categories', views.CategoryViewSet, basename='category')
+router.register('products', views.ProductViewSet, basename='product')
+router.register('cart/items', views.CartItemViewSet, basename='cart-item')
+router.register('cart', views.CartViewSet, basename='cart')
+router.register('orders', views.OrderViewSet, basename='order')
+router.register('wishlist', views.WishlistViewSet, basename='wishlist')
+router.register('bargains', views.BargainViewSet, basename='bargain')
 
 urlpatterns = [
-    path('', include(router.urls)),
+    re_path(r'^(?P<version>v1)/', include(router.urls)),
+    path('auth/token/', obtain_auth_token, name='api_token_auth'),
     path('auth/', include('rest_framework.urls')),
 ]
@@ -0,0 +1,329 @@
+import hashlib
+
+from django.db import IntegrityError
+from django.db.models import Q
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from bargaining.models import BargainRequest
+from crazycart.replicas import use_primary
+from bargaining.services import BargainError, create_bargain, respond_to_bargain
+from cart.models import Cart, CartItem
+from orders.models import Order
+from orders.services import (
+    ADDRESS_FIELDS,
+    CheckoutError,
+    cancel_order,
+    missing_shipping_fields,
+    place_cart_order,
+    shipping_from_user,
+)
+from products.categories import get_category_tree
+from products.conditional import catalog_version, catalog_version_with, stock_version
+from products.models import Category, Product, Wishlist
+
+from .pagination import CreatedAtCursorPagination, NameCursorPagination
+from .permissions import IsSellerOrReadOnly
+from .serializers import (
+    BargainRequestSerializer,
+    BargainResponseSerializer,
+    CartItemSerializer,
+    CartSerializer,
+    CategorySerializer,
+    OrderCreateSerializer,
+    OrderSerializer,
+    ProductSerializer,
+    WishlistSerializer,
+)
+
+
+class OptimizedQuerysetMixin:
+    """
+    Each viewset declares the relations its serializer walks, so list
+    endpoints run a fixed number of queries regardless of page size.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    def optimize(self, queryset):
+        if self.select_related_fields:
+            queryset = queryset.select_related(*self.select_related_fields)
+        if self.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*self.prefetch_related_fields)
+        return queryset
+
+
+class SparseFieldsViewMixin:
+    """Pass ?fields=a,b to serializers that support sparse fieldsets"""
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.request.query_params.get("fields")
+        if fields and self.request.method in permissions.SAFE_METHODS:
+            kwargs["fields"] = [field.strip() for field in fields.split(",") if field.strip()]
+        return super().get_serializer(*args, **kwargs)
+
+
+class ETagMixin:
+    """Strong ETag over the rendered body; answers If-None-Match with 304"""
+
+    def get_etag(self, request, response):
+        response.render()
+        return quote_etag(hashlib.md5(response.content).hexdigest())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method in ("GET", "HEAD") and response.status_code == 200:
+            etag = self.get_etag(request, response)
+            response["ETag"] = etag
+            response = get_conditional_response(request, etag=etag, response=response)
+        return response
+
+
+class CatalogETagMixin(ETagMixin):
+    """
+    For public catalog data: the ETag comes from the catalog version, so a
+    matching If-None-Match is answered before the queryset is evaluated.
+    """
+
+    def versions(self, request):
+        """
+        The catalog version, plus values for data that changes without a
+        version bump; catalog_version_with() reads them in the same query.
+        """
+        return [catalog_version()]
+
+    def get_etag(self, request, response=None):
+        # Computed once: before the queryset for If-None-Match, and again for the response
+        if getattr(self, "_etag", None) is None:
+            # Sellers see fields of their own products that others don't
+            values = [*self.versions(request), request.get_full_path(), request.accepted_media_type, request.user.pk]
+            self._etag = quote_etag(hashlib.md5(repr(values).encode()).hexdigest())
+        return self._etag
+
+    def not_modified(self, request):
+        etag = self.get_etag(request)
+        conditional = get_conditional_response(request, etag=etag)
+        if conditional is not None:
+            return Response(status=conditional.status_code, headers={"ETag": etag})
+
+    def list(self, request, *args, **kwargs):
+        return self.not_modified(request) or super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.not_modified(request) or super().retrieve(request, *args, **kwargs)
+
+
+class BaseAPIViewSet(ETagMixin, SparseFieldsViewMixin, OptimizedQuerysetMixin, viewsets.GenericViewSet):
+    pagination_class = CreatedAtCursorPagination
+
+
+class CategoryViewSet(CatalogETagMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, BaseAPIViewSet):
+    serializer_class = CategorySerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = NameCursorPagination
+    lookup_field = "slug"
+
+    def get_queryset(self):
+        return Category.objects.filter(is_active=True)
+
+
+class ProductViewSet(
+    CatalogETagMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.CreateModelMixin,
+    mixins.UpdateModelMixin,
+    mixins.DestroyModelMixin,
+    BaseAPIViewSet,
+):
+    serializer_class = ProductSerializer
+    permission_classes = [IsSellerOrReadOnly]
+    lookup_field = "slug"
+    select_related_fields = ("category", "seller")
+    prefetch_related_fields = ("images",)
+
+    def get_queryset(self):
+        products = Product.objects.all()
+        if self.request.method in permissions.SAFE_METHODS:
+            products = products.filter(is_active=True)
+            slug = self.request.query_params.get("category")
+            if slug:
+                # The category and its subcategories, as on the product list page
+                category = get_category_tree().get(slug)
+                products = products.filter(category_id__in=category.descendant_ids) if category else products.none()
+            query = self.request.query_params.get("q")
+            if query:
+                products = products.filter(
+                    Q(name__icontains=query)
+                    | Q(description__icontains=query)
+                    | Q(brand__icontains=query)
+                )
+        return self.optimize(products)
+
+    def versions(self, request):
+        # Exact stock counts change with every checkout
+        if self.action == "retrieve":
+            return catalog_version_with(
+                Product.objects.filter(slug=self.kwargs["slug"]).values_list("stock_quantity", flat=True)
+            )
+        return catalog_version_with(stock_version())
+
+    def perform_create(self, serializer):
+        serializer.save(seller=self.request.user)
+
+
+class CartViewSet(ETagMixin, viewsets.ViewSet):
+    """The current user's cart with totals"""
+
+    def list(self, request, *args, **kwargs):
+        cart, created = Cart.objects.get_or_create(user=request.user)
+        cart = (
+            Cart.objects.select_related("applied_discount__discount")
+            .prefetch_related("items__product")
+            .get(id=cart.id)
+        )
+        return Response(CartSerializer(cart, context={"request": request}).data)
+
+
+class CartItemViewSet(
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    mixins.UpdateModelMixin,
+    mixins.DestroyModelMixin,
+    BaseAPIViewSet,
+):
+    serializer_class = CartItemSerializer
+    pagination_class = None
+    select_related_fields = ("product",)
+
+    def get_queryset(self):
+        return self.optimize(CartItem.objects.filter(cart__user=self.request.user))
+
+    def perform_create(self, serializer):
+        cart, created = Cart.objects.get_or_create(user=self.request.user)
+        product = serializer.validated_data["product"]
+        quantity = serializer.validated_data.get("quantity", 1)
+
+        existing = CartItem.objects.filter(cart=cart, product=product).first()
+        if existing:
+            existing.quantity = min(existing.quantity + quantity, product.stock_quantity)
+            existing.save()
+            serializer.instance = existing
+        else:
+            serializer.save(cart=cart, price_at_time=product.price)
+
+
+class OrderViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, BaseAPIViewSet):
+    serializer_class = OrderSerializer
+    lookup_field = "order_number"
+    select_related_fields = ("shipping",)
+    prefetch_related_fields = ("items__product", "items__seller")
+
+    def get_queryset(self):
+        return self.optimize(Order.objects.filter(user=self.request.user))
+
+    def create(self, request, *args, **kwargs):
+        """Place an order from the user's cart"""
+        serializer = OrderCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        shipping = shipping_from_user(request.user)
+        for field in ADDRESS_FIELDS:
+            if f"shipping_{field}" in data:
+                shipping[field] = data[f"shipping_{field}"]
+        missing_fields = missing_shipping_fields(shipping)
+        if missing_fields:
+            raise ValidationError(
+                {"shipping": f"Missing required fields: {', '.join(missing_fields)}"}
+            )
+
+        with use_primary():
+            cart = get_object_or_404(Cart, user=request.user)
+            try:
+                order = place_cart_order(request.user, cart, data["payment_method"], shipping)
+            except CheckoutError as e:
+                raise ValidationError({"detail": e.message, "problems": e.problems})
+
+            order = self.get_queryset().get(id=order.id)
+        return Response(self.get_serializer(order).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=["post"])
+    def cancel(self, request, *args, **kwargs):
+        order = self.get_object()
+        try:
+            cancel_order(order, request.user)
+        except CheckoutError as e:
+            raise ValidationError({"detail": e.message})
+        return Response(self.get_serializer(order).data)
+
+
+class WishlistViewSet(
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    mixins.DestroyModelMixin,
+    BaseAPIViewSet,
+):
+    serializer_class = WishlistSerializer
+    select_related_fields = ("product",)
+
+    def get_queryset(self):
+        return self.optimize(Wishlist.objects.filter(user=self.request.user))
+
+    def perform_create(self, serializer):
+        try:
+            serializer.save(user=self.request.user)
+        except IntegrityError:
+            raise ValidationError({"product": "Already in wishlist"})
+
+
+class BargainViewSet(
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.CreateModelMixin,
+    BaseAPIViewSet,
+):
+    """Bargains where the user is the buyer or the seller"""
+    serializer_class = BargainRequestSerializer
+    select_related_fields = ("product", "buyer", "seller")
+
+    def get_queryset(self):
+        user = self.request.user
+        return self.optimize(
+            BargainRequest.objects.filter(Q(buyer=user) | Q(seller=user))
+        )
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        try:
+            serializer.instance = create_bargain(
+                self.request.user,
+                data["product"],
+                data["requested_price"],
+                data.get("message") or "",
+                data.get("quantity", 1),
+            )
+        except BargainError as e:
+            raise ValidationError({"detail": e.message})
+
+    @action(detail=True, methods=["post"])
+    def respond(self, request, *args, **kwargs):
+        bargain = self.get_object()
+        serializer = BargainResponseSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            respond_to_bargain(
+                bargain,
+                request.user,
+                serializer.validated_data["action"],
+                counter_offer=serializer.validated_data.get("counter_offer"),
+                message=serializer.validated_data["message"],
+            )
+        except BargainError as e:
+            raise ValidationError({"detail": e.message})
+        return Response(self.get_serializer(bargain).data)
@@ -0,0 +1,170 @@
+import gzip
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+
+# Optional, better minifiers/compressors; the fallbacks only strip what is
+# provably safe to strip
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BUNDLE_DIR = "bundles"
+COMPRESSIBLE_SUFFIXES = (".js", ".css", ".svg", ".json", ".txt", ".map")
+MIN_COMPRESS_SIZE = 256
+
+
+class BundleError(Exception):
+    pass
+
+
+def bundle_path(name):
+    """Static path of a built bundle, e.g. bundles/site.js"""
+    return f"{BUNDLE_DIR}/{name}"
+
+
+def _backticks(line, in_template):
+    """Unescaped template-literal delimiters on a line, skipping quoted strings and // comments"""
+    count = 0
+    quote = None
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if char == "\\":
+            i += 2
+            continue
+        if in_template:
+            if char == "`":
+                count += 1
+                in_template = False
+        elif quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char == "`":
+            count += 1
+            in_template = True
+        elif line.startswith("//", i):
+            break
+        i += 1
+    return count
+
+
+def strip_js(source):
+    """
+    Line-level JS minification: drops indentation, blank lines and
+    whole-line comments, leaving template literals untouched. Newlines are
+    kept so automatic semicolon insertion behaves as before.
+    """
+    lines = []
+    in_template = False
+    in_comment = False
+    for line in source.splitlines():
+        if in_template:
+            lines.append(line.rstrip())
+        else:
+            stripped = line.strip()
+            if in_comment:
+                if "*/" not in stripped:
+                    continue
+                in_comment = False
+                stripped = stripped.split("*/", 1)[1].strip()
+            if stripped.startswith("/*"):
+                if "*/" not in stripped:
+                    in_comment = True
+                    continue
+                stripped = stripped.split("*/", 1)[1].strip()
+            if not stripped or stripped.startswith("//"):
+                continue
+            lines.append(stripped)
+            line = stripped
+        if _backticks(line, in_template) % 2:
+            in_template = not in_template
+    return "\n".join(lines)
+
+
+def strip_css(source):
+    source = re.sub(r"/\*.*?\*/", "", source, flags=re.S)
+    source = re.sub(r"\s+", " ", source)
+    source = re.sub(r"\s*([{};>])\s*", r"\1", source)
+    return source.replace(";}", "}").strip()
+
+
+def minify(name, source):
+    if name.endswith(".js"):
+        return rjsmin.jsmin(source) if rjsmin else strip_js(source)
+    if name.endswith(".css"):
+        return rcssmin.cssmin(source) if rcssmin else strip_css(source)
+    return source
+
+
+def build_bundle(name, sources, minified=True):
+    parts = []
+    for source in sources:
+        path = finders.find(source)
+        if not path:
+            raise BundleError(f"{name}: static file {source} not found")
+        with open(path, encoding="utf-8") as f:
+            content = f.read()
+        parts.append(minify(name, content) if minified else content)
+
+    # Guard against files that end without a semicolon
+    separator = "\n;\n" if name.endswith(".js") else "\n"
+    return separator.join(parts) + "\n"
+
+
+def build_bundles(bundles=None, output_dir=None, minified=True):
+    """Write every configured bundle under output_dir/bundles/; returns {name: size}"""
+    bundles = settings.ASSET_BUNDLES if bundles is None else bundles
+    output_dir = Path(output_dir or settings.ASSET_BUILD_DIR) / BUNDLE_DIR
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    sizes = {}
+    for name, sources in bundles.items():
+        content = build_bundle(name, sources, minified)
+        (output_dir / name).write_text(content, encoding="utf-8")
+        sizes[name] = len(content.encode())
+    return sizes
+
+
+def precompress(root, names):
+    """
+    Write .gz (and .br when brotli is installed) next to each file so the
+    web server can send them as-is. Returns the number of files written.
+    """
+    written = 0
+    for name in names:
+        if not name.endswith(COMPRESSIBLE_SUFFIXES):
+            continue
+        path = os.path.join(root, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            continue
+
+        variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli:
+            variants.append((".br", brotli.compress(data)))
+        for suffix, compressed in variants:
+            if len(compressed) < len(data):
+                with open(path + suffix, "wb") as f:
+                    f.write(compressed)
+                written += 1
+    return written
@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.views.static import serve as dev_serve
+
+from assets.serving import serve_file
+
+
+class Command(BaseCommand):
+    help = "Compare assets.serving.serve_file with django.views.static.serve"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=2 * 1024 * 1024, help="Test file size in bytes")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+
+    def run(self, view, root, count, **headers):
+        factory = RequestFactory()
+        total = 0
+        start = time.perf_counter()
+        for _ in range(count):
+            request = factory.get("/media/image.jpg", **headers)
+            response = view(request, "image.jpg", root)
+            content = response.streaming_content if response.streaming else [response.content]
+            for chunk in content:
+                total += len(chunk)
+            response.close()
+        elapsed = time.perf_counter() - start
+        return count / elapsed, total / elapsed / 1024 / 1024, response.status_code
+
+    def handle(self, *args, **options):
+        count = options["requests"]
+        root = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(root, "image.jpg"), "wb") as f:
+                f.write(os.urandom(options["size"]))
+
+            def ours(request, path, document_root):
+                return serve_file(request, path, document_root)
+
+            etag = ours(RequestFactory().get("/"), "image.jpg", root)["ETag"]
+            scenarios = [
+                ("full file", {}),
+                ("revalidate", {"HTTP_IF_NONE_MATCH": etag}),
+                ("range 1 MiB", {"HTTP_RANGE": "bytes=0-1048575"}),
+            ]
+
+            self.stdout.write(f"{'scenario':14} {'view':8} {'status':>6} {'req/s':>9} {'MiB/s':>9}")
+            for label, headers in scenarios:
+                for name, view in (("dev", dev_serve), ("assets", ours)):
+                    rate, throughput, status = self.run(view, root, count, **headers)
+                    self.stdout.write(f"{label:14} {name:8} {status:>6} {rate:9.0f} {throughput:9.1f}")
+        finally:
+            shutil.rmtree(root)
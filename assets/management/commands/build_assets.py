@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from assets.bundles import BundleError, build_bundles, precompress
+
+
+class Command(BaseCommand):
+    help = "Bundle and minify static assets, collect them with hashed names and precompress them"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--no-minify", action="store_true", help="Concatenate only")
+        parser.add_argument("--no-collect", action="store_true", help="Only write the bundles")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = build_bundles(minified=not options["no_minify"])
+        except BundleError as e:
+            raise CommandError(str(e))
+        for name, size in sizes.items():
+            self.stdout.write(f"  {name}: {size} bytes")
+        if options["no_collect"]:
+            return
+
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+        hashed_names = staticfiles_storage.hashed_files
+        written = precompress(settings.STATIC_ROOT, hashed_names.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Built {len(sizes)} bundles, collected {len(hashed_names)} files, "
+                f"wrote {written} precompressed variants"
+            )
+        )
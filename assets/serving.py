@@ -0,0 +1,198 @@
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+# ManifestStaticFilesStorage names: style.1a2b3c4d5e6f.css
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[^/]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+RANGE_CHUNK_SIZE = 64 * 1024
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def file_etag(st):
+    """Strong validator from the inode's mtime and size; no need to read the file"""
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single byte range, inclusive; None to send the whole
+    file (no header, or several ranges); False if it can't be satisfied.
+    """
+    match = _RANGE.match(header.replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if start == "":
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return parse_etags(if_range) == [etag]
+    return parse_http_date_safe(if_range) == int(last_modified)
+
+
+def accepted_encodings(header):
+    """Content codings of an Accept-Encoding header with their q-values"""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def _precompressed(request, path):
+    """The variant with the highest q-value the client accepts; q=0 refuses a coding"""
+    accepted = accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+    candidates = []
+    for preference, (encoding, suffix) in enumerate(ENCODINGS):
+        quality = accepted.get(encoding, accepted.get("*", 0))
+        if quality > 0 and os.path.isfile(path + suffix):
+            candidates.append((-quality, preference, encoding, path + suffix))
+    if candidates:
+        _, _, encoding, variant = min(candidates)
+        return encoding, variant
+    return None, path
+
+
+def _iter_range(f, start, length):
+    try:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def serve_file(request, path, document_root, max_age=0, precompressed=False, immutable=False):
+    """
+    Serve a file below document_root with strong ETags, Last-Modified,
+    single byte ranges and, optionally, a .br/.gz variant written by
+    build_assets. Whole files go out as FileResponse, so WSGI servers can
+    use sendfile via wsgi.file_wrapper.
+
+    An `immutable` file is cached for a year; anything else gets `max_age`
+    and is revalidated with the ETag.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponse(status=405, headers={"Allow": "GET, HEAD"})
+
+    try:
+        fullpath = safe_join(document_root, path)
+    except SuspiciousFileOperation:
+        raise Http404("Invalid path")
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or "application/octet-stream"
+
+    content_encoding = None
+    range_header = request.META.get("HTTP_RANGE")
+    if precompressed and not range_header and not encoding:
+        content_encoding, fullpath = _precompressed(request, fullpath)
+
+    try:
+        st = os.stat(fullpath)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404(f"{path} not found")
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404(f"{path} not found")
+
+    etag = file_etag(st)
+    if content_encoding:
+        # A different representation needs its own validator
+        etag = f'{etag[:-1]}-{content_encoding}"'
+    last_modified = st.st_mtime
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(last_modified),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": (
+            IMMUTABLE_CACHE_CONTROL if immutable else f"public, max-age={max_age}"
+        ),
+    }
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if not_modified is not None:
+        for header in ("ETag", "Last-Modified", "Cache-Control"):
+            not_modified[header] = headers[header]
+        return not_modified
+
+    byte_range = None
+    if range_header and _if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(range_header, st.st_size)
+        if byte_range is False:
+            headers["Content-Range"] = f"bytes */{st.st_size}"
+            return HttpResponse(status=416, headers=headers)
+
+    f = open(fullpath, "rb")
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _iter_range(f, start, length), status=206, content_type=content_type
+        )
+        response["Content-Length"] = length
+        response["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+    else:
+        response = FileResponse(f, content_type=content_type)
+
+    for header, value in headers.items():
+        response[header] = value
+    if content_encoding:
+        response["Content-Encoding"] = content_encoding
+    if precompressed:
+        patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+def serve_media(request, path):
+    """Uploads in MEDIA_PUBLIC_DIRS only; anything else stored under MEDIA_ROOT stays private"""
+    if path.split("/", 1)[0] not in settings.MEDIA_PUBLIC_DIRS:
+        raise Http404(f"{path} not found")
+    return serve_file(request, path, settings.MEDIA_ROOT, max_age=settings.MEDIA_CACHE_MAX_AGE)
+
+
+def serve_static(request, path):
+    # Only collected static files are named by their content; an upload can be replaced under its name
+    return serve_file(
+        request, path, settings.STATIC_ROOT, precompressed=True, immutable=bool(HASHED_NAME.search(path))
+    )
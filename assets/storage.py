@@ -0,0 +1,14 @@
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+class BundleManifestStorage(ManifestStaticFilesStorage):
+    """
+    Content-hashed names from staticfiles.json once `build_assets` has run;
+    plain names before that, so development and tests work without a build.
+    """
+    manifest_strict = False
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
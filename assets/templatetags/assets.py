@@ -0,0 +1,34 @@
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from assets.bundles import bundle_path
+
+register = template.Library()
+
+
+def _is_built(path):
+    # Only the manifest storage knows about hashed names
+    hashed_files = getattr(staticfiles_storage, "hashed_files", None)
+    return bool(hashed_files) and path in hashed_files
+
+
+@register.simple_tag
+def bundle(name):
+    """
+    One tag for a configured bundle; the individual source files in DEBUG
+    or when the bundle hasn't been built yet.
+    """
+    path = bundle_path(name)
+    if not settings.DEBUG and _is_built(path):
+        paths = [path]
+    else:
+        paths = settings.ASSET_BUNDLES[name]
+
+    if name.endswith(".css"):
+        tag = '<link rel="stylesheet" href="{}">'
+    else:
+        tag = '<script src="{}"></script>'
+    return format_html_join("\n    ", tag, ((static(p),) for p in paths))
@@ -0,0 +1,163 @@
+import gzip
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.http import Http404
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from .bundles import build_bundle, strip_css, strip_js
+from .serving import serve_file, serve_media, serve_static
+
+
+class MinifyTests(SimpleTestCase):
+    def test_strip_js_keeps_template_literals(self):
+        source = (
+            "// helper\n"
+            "function card(name) {\n"
+            "    /* multi\n"
+            "       line */\n"
+            "    const url = 'http://example.com'; // trailing `tick`\n"
+            "    return `\n"
+            "        <div>\n"
+            "            ${name}\n"
+            "        </div>`;\n"
+            "}\n"
+        )
+        self.assertEqual(
+            strip_js(source),
+            "function card(name) {\n"
+            "const url = 'http://example.com'; // trailing `tick`\n"
+            "return `\n"
+            "        <div>\n"
+            "            ${name}\n"
+            "        </div>`;\n"
+            "}",
+        )
+
+    def test_strip_css(self):
+        self.assertEqual(
+            strip_css("/* c */\n.a > .b ,\n.c {\n  color: red;\n  margin: 0 auto;\n}\n"),
+            ".a>.b , .c{color: red;margin: 0 auto}",
+        )
+
+    def test_site_bundle_is_valid_js(self):
+        try:
+            result = subprocess.run(
+                ["node", "--check", "-"],
+                input=build_bundle("site.js", settings.ASSET_BUNDLES["site.js"]).encode(),
+                capture_output=True,
+            )
+        except FileNotFoundError:
+            self.skipTest("node is not installed")
+        self.assertEqual(result.returncode, 0, result.stderr.decode())
+
+@override_settings(DEBUG=False)
+class BundleTagTests(SimpleTestCase):
+    def render(self, built):
+        with mock.patch("assets.templatetags.assets._is_built", return_value=built):
+            return Template("{% load assets %}{% bundle 'site.js' %}").render(Context())
+
+    def test_built_bundle_is_one_request(self):
+        html = self.render(built=True)
+        self.assertEqual(html.count("<script"), 1)
+        self.assertIn("/static/bundles/site.", html)
+
+    def test_unbuilt_bundle_falls_back_to_sources(self):
+        html = self.render(built=False)
+        self.assertEqual(html.count("<script"), 8)
+        self.assertIn("/static/js/common.", html)
+
+
+class ServeFileTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.data = bytes(range(256)) * 8
+        with open(os.path.join(self.root, "photo.jpg"), "wb") as f:
+            f.write(self.data)
+        with open(os.path.join(self.root, "site.0123456789ab.js"), "wb") as f:
+            f.write(b"var a = 1;")
+        with open(os.path.join(self.root, "site.0123456789ab.js.gz"), "wb") as f:
+            f.write(gzip.compress(b"var a = 1;"))
+        self.factory = RequestFactory()
+
+    def get(self, path, precompressed=False, **headers):
+        request = self.factory.get("/" + path, **headers)
+        return serve_file(request, path, self.root, max_age=60, precompressed=precompressed)
+
+    def test_full_file(self):
+        response = self.get("photo.jpg")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.data)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Cache-Control"], "public, max-age=60")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+    def test_not_modified(self):
+        etag = self.get("photo.jpg")["ETag"]
+        self.assertEqual(self.get("photo.jpg", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.get("photo.jpg", HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.data[10:20])
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.data)}")
+
+        response = self.get("photo.jpg", HTTP_RANGE="bytes=-5")
+        self.assertEqual(b"".join(response.streaming_content), self.data[-5:])
+
+        response = self.get("photo.jpg", HTTP_RANGE="bytes=5000-")
+        self.assertEqual(response.status_code, 416)
+
+    def test_stale_if_range_sends_whole_file(self):
+        response = self.get("photo.jpg", HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_hashed_name_is_immutable_and_precompressed(self):
+        with self.settings(STATIC_ROOT=self.root):
+            request = self.factory.get("/", HTTP_ACCEPT_ENCODING="gzip, br")
+            response = serve_static(request, "site.0123456789ab.js")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), b"var a = 1;")
+
+    def test_refused_codings_are_not_sent(self):
+        path = "site.0123456789ab.js"
+        for header, encoding in (
+            ("gzip;q=0, br", None),
+            ("br, gzip; q=0.5", "gzip"),
+            ("*", "gzip"),
+            ("*, gzip;q=0", None),
+            ("identity", None),
+        ):
+            with self.subTest(header=header):
+                response = self.get(path, precompressed=True, HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(response.get("Content-Encoding"), encoding)
+
+    def test_only_public_media_is_served(self):
+        os.makedirs(os.path.join(self.root, "products"))
+        os.makedirs(os.path.join(self.root, "imports"))
+        for name in ("products/photo.jpg", "imports/catalog.csv"):
+            with open(os.path.join(self.root, name), "wb") as f:
+                f.write(b"data")
+        with self.settings(MEDIA_ROOT=self.root, MEDIA_PUBLIC_DIRS=["products"]):
+            self.assertEqual(serve_media(self.factory.get("/"), "products/photo.jpg").status_code, 200)
+            with self.assertRaises(Http404):
+                serve_media(self.factory.get("/"), "imports/catalog.csv")
+
+    def test_uploads_are_never_immutable(self):
+        os.makedirs(os.path.join(self.root, "products"))
+        with open(os.path.join(self.root, "products", "photo.0123456789ab.jpg"), "wb") as f:
+            f.write(b"data")
+        with self.settings(MEDIA_ROOT=self.root, MEDIA_PUBLIC_DIRS=["products"], MEDIA_CACHE_MAX_AGE=60):
+            response = serve_media(self.factory.get("/"), "products/photo.0123456789ab.jpg")
+        self.assertEqual(response["Cache-Control"], "public, max-age=60")
+
+    def test_path_outside_root(self):
+        with self.assertRaises(Http404):
+            self.get("../etc/passwd")
@@ -0,0 +1,147 @@
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from orders.outbox import emit
+
+from .models import BargainRequest, BargainMessage
+
+BARGAIN_LIFETIME = timedelta(days=7)  # 7 days to respond
+ACTIVE_STATUSES = ["pending", "countered"]
+
+
+class BargainError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+def parse_price(value, error_message="Invalid offer amount"):
+    try:
+        price = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise BargainError(error_message)
+    if not price.is_finite() or price <= 0:
+        raise BargainError(error_message)
+    return price
+
+
+def create_bargain(buyer, product, offered_price, message="", quantity=1):
+    if not product.allow_bargaining:
+        raise BargainError("Bargaining not allowed for this product")
+
+    if product.seller_id == buyer.id:
+        raise BargainError("You cannot bargain on your own product")
+
+    # Check if user already has a pending bargain for this product
+    if BargainRequest.objects.filter(
+        buyer=buyer, product=product, status="pending"
+    ).exists():
+        raise BargainError("You already have a pending bargain for this product")
+
+    offered_price = parse_price(offered_price)
+
+    bargain = BargainRequest.objects.create(
+        buyer=buyer,
+        seller_id=product.seller_id,
+        product=product,
+        original_price=product.price,
+        requested_price=offered_price,
+        current_offer=offered_price,
+        message=message,
+        quantity=quantity,
+        expires_at=timezone.now() + BARGAIN_LIFETIME,
+    )
+
+    # Create initial message
+    if message:
+        BargainMessage.objects.create(
+            bargain_request=bargain,
+            sender=buyer,
+            message=message,
+            offered_price=offered_price,
+            is_counter_offer=False,
+        )
+
+    return bargain
+
+
+@transaction.atomic
+def respond_to_bargain(bargain, user, action, counter_offer=None, message=""):
+    """Accept, reject or counter a bargain as its buyer or seller"""
+    if user.id not in (bargain.seller_id, bargain.buyer_id):
+        raise BargainError("You are not authorized to respond to this bargain")
+
+    if bargain.status not in ACTIVE_STATUSES:
+        raise BargainError("Bargain is no longer active")
+
+    if action == "accept":
+        # Check if product still has enough stock
+        if bargain.quantity > bargain.product.stock_quantity:
+            raise BargainError(
+                f"Sorry, only {bargain.product.stock_quantity} items are available in stock."
+            )
+
+        bargain.status = "accepted"
+        bargain.responded_at = timezone.now()
+        bargain.save()
+
+        offer_price = bargain.current_offer or bargain.requested_price
+        reply = BargainMessage.objects.create(
+            bargain_request=bargain,
+            sender=user,
+            message=message or f"Offer accepted at ৳{offer_price}",
+            is_counter_offer=False,
+        )
+
+    elif action == "reject":
+        bargain.status = "rejected"
+        bargain.responded_at = timezone.now()
+        bargain.save()
+
+        reply = BargainMessage.objects.create(
+            bargain_request=bargain,
+            sender=user,
+            message=message or "Offer rejected",
+            is_counter_offer=False,
+        )
+
+    elif action == "counter":
+        if not counter_offer:
+            raise BargainError("Counter offer amount is required")
+        counter_offer = parse_price(counter_offer, "Invalid counter offer amount")
+
+        bargain.status = "countered"
+        bargain.current_offer = counter_offer
+        bargain.responded_at = timezone.now()
+        bargain.save()
+
+        reply = BargainMessage.objects.create(
+            bargain_request=bargain,
+            sender=user,
+            message=message or f"Counter offer: ৳{counter_offer}",
+            offered_price=counter_offer,
+            is_counter_offer=True,
+        )
+
+    else:
+        raise BargainError("Invalid action")
+
+    emit(
+        f"bargain.{bargain.status}",
+        f"bargain:{bargain.id}",
+        f"bargain.{bargain.status}:{reply.id}",
+        {
+            "bargain_id": bargain.id,
+            "product_id": bargain.product_id,
+            "buyer_id": bargain.buyer_id,
+            "seller_id": bargain.seller_id,
+            "responded_by": user.id,
+            "status": bargain.status,
+            "offer": bargain.current_offer or bargain.requested_price,
+            "quantity": bargain.quantity,
+        },
+    )
+    return bargain
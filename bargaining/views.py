@@ -3,14 +3,20 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
 from django.core.paginator import Paginator
+from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
 from django.db import transaction
 from decimal import Decimal
 from .models import BargainRequest, BargainMessage, BargainSettings
+from .services import BargainError, create_bargain
+from .services import respond_to_bargain as respond_to_bargain_service
 from products.models import Product
 from orders.models import Order, OrderItem, Payment
+from orders.services import address_kwargs, shipping_from_user
 from accounts.models import User
+from crazycart.replicas import primary_required
+from orders.idempotency import idempotent
 
 
 @login_required
@@ -23,51 +29,10 @@ def create_bargain_request(request):
 
         product = get_object_or_404(Product, id=product_id, is_active=True)
 
-        if not product.allow_bargaining:
-            return JsonResponse(
-                {"success": False, "message": "Bargaining not allowed for this product"}
-            )
-
-        if product.seller == request.user:
-            return JsonResponse(
-                {"success": False, "message": "You cannot bargain on your own product"}
-            )
-
-        # Check if user already has a pending bargain for this product
-        existing_bargain = BargainRequest.objects.filter(
-            buyer=request.user, product=product, status="pending"
-        ).first()
-
-        if existing_bargain:
-            return JsonResponse(
-                {
-                    "success": False,
-                    "message": "You already have a pending bargain for this product",
-                }
-            )
-
-        # Create bargain request
-        bargain_request = BargainRequest.objects.create(
-            buyer=request.user,
-            seller=product.seller,
-            product=product,
-            original_price=product.price,
-            requested_price=offered_price,
-            current_offer=offered_price,
-            message=message,
-            quantity=quantity,
-            expires_at=timezone.now() + timedelta(days=7),  # 7 days to respond
-        )
-
-        # Create initial message
-        if message:
-            BargainMessage.objects.create(
-                bargain_request=bargain_request,
-                sender=request.user,
-                message=message,
-                offered_price=offered_price,
-                is_counter_offer=False,
-            )
+        try:
+            create_bargain(request.user, product, offered_price, message, quantity)
+        except BargainError as e:
+            return JsonResponse({"success": False, "message": e.message})
 
         return JsonResponse(
             {"success": True, "message": "Bargain request sent successfully!"}
@@ -148,177 +113,60 @@ def respond_to_bargain(request, bargain_id):
 
     logger = logging.getLogger(__name__)
 
-    logger.info(f"respond_to_bargain called with bargain_id: {bargain_id}")
-    logger.info(f"Request method: {request.method}")
-    logger.info(f"Request user: {request.user}")
-    logger.info(f"POST data: {request.POST}")
-
     if request.method != "POST":
         return JsonResponse({"success": False, "message": "Invalid request method"})
 
     # Allow both seller and buyer to respond
-    bargain = get_object_or_404(BargainRequest, id=bargain_id)
-    logger.info(f"Bargain found: {bargain}")
-    logger.info(f"Bargain status: {bargain.status}")
-    logger.info(f"Bargain buyer: {bargain.buyer}")
-    logger.info(f"Bargain seller: {bargain.seller}")
-
-    # Check if user is either the seller or buyer
-    if request.user != bargain.seller and request.user != bargain.buyer:
-        logger.warning(f"User {request.user} not authorized for bargain {bargain_id}")
-        return JsonResponse(
-            {
-                "success": False,
-                "message": "You are not authorized to respond to this bargain",
-            }
-        )
-
-    # Allow responses for pending and countered status
-    if bargain.status not in ["pending", "countered"]:
-        logger.warning(f"Bargain {bargain_id} status {bargain.status} not active")
-        return JsonResponse(
-            {"success": False, "message": "Bargain is no longer active"}
-        )
+    bargain = get_object_or_404(
+        BargainRequest.objects.select_related("product"), id=bargain_id
+    )
 
     action = request.POST.get("action")
     counter_offer = request.POST.get("counter_offer")
     message = request.POST.get("message", "")
 
-    logger.info(f"Action: {action}, Counter offer: {counter_offer}, Message: {message}")
-
-    if action == "accept":
-        try:
-            # Check if product still has enough stock
-            if bargain.quantity > bargain.product.stock_quantity:
-                return JsonResponse(
-                    {
-                        "success": False,
-                        "message": f"Sorry, only {bargain.product.stock_quantity} items are available in stock.",
-                    }
-                )
-
-            bargain.status = "accepted"
-            bargain.responded_at = timezone.now()
-            bargain.save()
-
-            # Add message
-            offer_price = bargain.current_offer or bargain.requested_price
-            BargainMessage.objects.create(
-                bargain_request=bargain,
-                sender=request.user,
-                message=message or f"Offer accepted at ৳{offer_price}",
-                is_counter_offer=False,
-            )
-
-            logger.info(f"Bargain {bargain_id} accepted by {request.user}")
-            logger.info(f"Agreed price: ৳{offer_price}, Quantity: {bargain.quantity}")
-
-            # Provide different messages based on who accepted
-            if request.user == bargain.seller:
-                success_message = "Bargain accepted! The buyer will be notified and can add the item to their cart at the agreed price."
-                # Redirect seller back to received bargains
-                from django.urls import reverse
-
-                redirect_url = reverse("bargaining:received_bargains")
-            else:
-                success_message = "Counter offer accepted! You can now add the item to your cart at the agreed price."
-                # Redirect buyer to bargain detail to see the "Add to Cart" button
-                redirect_url = reverse("bargaining:bargain_detail", args=[bargain.id])
-
-            return JsonResponse(
-                {
-                    "success": True,
-                    "message": success_message,
-                    "redirect_url": redirect_url,
-                    "agreed_price": str(offer_price),
-                    "quantity": bargain.quantity,
-                }
-            )
-        except Exception as e:
-            logger.error(f"Error accepting bargain {bargain_id}: {str(e)}")
-            return JsonResponse(
-                {
-                    "success": False,
-                    "message": "Failed to accept offer. Please try again.",
-                }
-            )
+    logger.info(f"Bargain {bargain_id}: {action} by {request.user}")
 
-    elif action == "reject":
-        try:
-            bargain.status = "rejected"
-            bargain.responded_at = timezone.now()
-            bargain.save()
-
-            # Add message
-            BargainMessage.objects.create(
-                bargain_request=bargain,
-                sender=request.user,
-                message=message or "Offer rejected",
-                is_counter_offer=False,
-            )
-
-            logger.info(f"Bargain {bargain_id} rejected by {request.user}")
-            return JsonResponse({"success": True, "message": "Offer rejected"})
-        except Exception as e:
-            logger.error(f"Error rejecting bargain {bargain_id}: {str(e)}")
-            return JsonResponse(
-                {
-                    "success": False,
-                    "message": "Failed to reject offer. Please try again.",
-                }
-            )
-
-    elif action == "counter" and counter_offer:
-        try:
-            # Validate counter_offer is a valid decimal
-            from decimal import Decimal, InvalidOperation
-
-            counter_offer_decimal = Decimal(str(counter_offer))
-            logger.info(f"Counter offer decimal: {counter_offer_decimal}")
-
-            bargain.status = "countered"
-            bargain.current_offer = counter_offer_decimal
-            bargain.responded_at = timezone.now()
-            bargain.save()
-
-            # Add counter offer message
-            BargainMessage.objects.create(
-                bargain_request=bargain,
-                sender=request.user,
-                message=message or f"Counter offer: ৳{counter_offer}",
-                offered_price=counter_offer_decimal,
-                is_counter_offer=True,
-            )
-
-            logger.info(
-                f"Counter offer sent for bargain {bargain_id} by {request.user}"
-            )
-            return JsonResponse({"success": True, "message": "Counter offer sent!"})
+    try:
+        respond_to_bargain_service(
+            bargain, request.user, action, counter_offer=counter_offer, message=message
+        )
+    except BargainError as e:
+        logger.warning(f"Bargain {bargain_id} {action} rejected: {e.message}")
+        return JsonResponse({"success": False, "message": e.message})
+    except Exception as e:
+        logger.error(f"Error handling {action} for bargain {bargain_id}: {str(e)}")
+        return JsonResponse(
+            {"success": False, "message": "Failed to respond. Please try again."}
+        )
 
-        except (InvalidOperation, ValueError) as e:
-            logger.error(f"Invalid counter offer amount: {counter_offer}, error: {e}")
-            return JsonResponse(
-                {"success": False, "message": "Invalid counter offer amount"}
-            )
-        except Exception as e:
-            logger.error(
-                f"Error sending counter offer for bargain {bargain_id}: {str(e)}"
-            )
-            return JsonResponse(
-                {
-                    "success": False,
-                    "message": "Failed to send counter offer. Please try again.",
-                }
-            )
+    if action == "accept":
+        offer_price = bargain.current_offer or bargain.requested_price
+
+        # Provide different messages based on who accepted
+        if request.user == bargain.seller:
+            success_message = "Bargain accepted! The buyer will be notified and can add the item to their cart at the agreed price."
+            # Redirect seller back to received bargains
+            redirect_url = reverse("bargaining:received_bargains")
+        else:
+            success_message = "Counter offer accepted! You can now add the item to your cart at the agreed price."
+            # Redirect buyer to bargain detail to see the "Add to Cart" button
+            redirect_url = reverse("bargaining:bargain_detail", args=[bargain.id])
 
-    elif action == "counter" and not counter_offer:
-        logger.warning(f"Counter action without counter_offer for bargain {bargain_id}")
         return JsonResponse(
-            {"success": False, "message": "Counter offer amount is required"}
+            {
+                "success": True,
+                "message": success_message,
+                "redirect_url": redirect_url,
+                "agreed_price": str(offer_price),
+                "quantity": bargain.quantity,
+            }
         )
 
-    logger.warning(f"Invalid action '{action}' for bargain {bargain_id}")
-    return JsonResponse({"success": False, "message": "Invalid action"})
+    if action == "reject":
+        return JsonResponse({"success": True, "message": "Offer rejected"})
+
+    return JsonResponse({"success": True, "message": "Counter offer sent!"})
 
 
 @login_required
@@ -379,7 +227,9 @@ def bargain_settings_view(request):
     return render(request, "bargaining/bargain_settings.html", {"settings": settings})
 
 
+@primary_required
 @login_required
+@idempotent
 def process_payment(request, bargain_id):
     """Process payment for an accepted bargain"""
     if request.method != "POST":
@@ -410,24 +260,8 @@ def process_payment(request, bargain_id):
                 user=request.user,
                 subtotal=total_amount,
                 total_amount=total_amount,
-                # Shipping details (you can get these from user profile or ask for them)
-                shipping_name=request.user.get_full_name() or request.user.username,
-                shipping_email=request.user.email,
-                shipping_phone=getattr(request.user, "phone_number", "") or "",
-                shipping_address=getattr(request.user, "address", "") or "",
-                shipping_city=getattr(request.user, "city", "") or "",
-                shipping_state=getattr(request.user, "state", "") or "",
-                shipping_postal_code=getattr(request.user, "postal_code", "") or "",
-                shipping_country=getattr(request.user, "country", "") or "USA",
-                # Same for billing
-                billing_name=request.user.get_full_name() or request.user.username,
-                billing_email=request.user.email,
-                billing_phone=getattr(request.user, "phone_number", "") or "",
-                billing_address=getattr(request.user, "address", "") or "",
-                billing_city=getattr(request.user, "city", "") or "",
-                billing_state=getattr(request.user, "state", "") or "",
-                billing_postal_code=getattr(request.user, "postal_code", "") or "",
-                billing_country=getattr(request.user, "country", "") or "USA",
+                # Ship to the buyer's default address
+                **address_kwargs(request.user, shipping_from_user(request.user, "USA")),
             )
 
             # Create order item
@@ -512,6 +346,7 @@ def process_payment(request, bargain_id):
         return JsonResponse({"success": False, "error": str(e)})
 
 
+@primary_required
 @login_required
 def online_payment(request, bargain_id):
     """Handle online payment (redirect to payment gateway)"""
@@ -530,22 +365,7 @@ def online_payment(request, bargain_id):
             user=request.user,
             subtotal=total_amount,
             total_amount=total_amount,
-            shipping_name=request.user.get_full_name() or request.user.username,
-            shipping_email=request.user.email,
-            shipping_phone=getattr(request.user, "phone_number", "") or "",
-            shipping_address=getattr(request.user, "address", "") or "",
-            shipping_city=getattr(request.user, "city", "") or "",
-            shipping_state=getattr(request.user, "state", "") or "",
-            shipping_postal_code=getattr(request.user, "postal_code", "") or "",
-            shipping_country=getattr(request.user, "country", "") or "USA",
-            billing_name=request.user.get_full_name() or request.user.username,
-            billing_email=request.user.email,
-            billing_phone=getattr(request.user, "phone_number", "") or "",
-            billing_address=getattr(request.user, "address", "") or "",
-            billing_city=getattr(request.user, "city", "") or "",
-            billing_state=getattr(request.user, "state", "") or "",
-            billing_postal_code=getattr(request.user, "postal_code", "") or "",
-            billing_country=getattr(request.user, "country", "") or "USA",
+            **address_kwargs(request.user, shipping_from_user(request.user, "USA")),
         )
 
         OrderItem.objects.create(
@@ -574,6 +394,7 @@ def online_payment(request, bargain_id):
     return render(request, "bargaining/online_payment.html", context)
 
 
+@primary_required
 @login_required
 def add_money_to_wallet(request):
     """Add money to user's CrazyCart wallet"""
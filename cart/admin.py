@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cart, CartItem, AppliedDiscount
+from .models import Cart, CartItem, AppliedDiscount, GuestCart, GuestCartItem
 # Register your models here.
 
 @admin.register(CartItem)
@@ -20,4 +20,16 @@ class AppliedDiscountAdmin(admin.ModelAdmin):
 
     
     def has_add_permission(self, request):
-        return False
\ No newline at end of file
+        return False
+
+class GuestCartItemInline(admin.TabularInline):
+    model = GuestCartItem
+    extra = 0
+    raw_id_fields = ('product',)
+
+
+@admin.register(GuestCart)
+class GuestCartAdmin(admin.ModelAdmin):
+    list_display = ('key', 'created_at', 'updated_at')
+    list_filter = ('updated_at',)
+    inlines = [GuestCartItemInline]
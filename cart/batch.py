@@ -0,0 +1,146 @@
+"""
+Several cart changes in one request, for the cart page.
+
+    {"operations": [
+        {"op": "add", "product_id": 3, "quantity": 1},
+        {"op": "update", "cart_item_id": 12, "quantity": 4},
+        {"op": "remove", "cart_item_id": 13}
+    ]}
+
+Operations apply in order. Either all of them are applied, in one
+transaction, or none is and every problem is reported with the index of
+its operation. Stock is checked on the final quantities, against one
+query for all the products involved.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from products.models import Product
+
+MAX_OPERATIONS = 50
+OPERATIONS = ("add", "update", "remove")
+
+
+class CartBatchError(Exception):
+    def __init__(self, errors):
+        super().__init__("; ".join(error["message"] for error in errors))
+        self.errors = errors
+
+
+def _quantity(operation, default=None):
+    value = operation.get("quantity", default)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def apply_cart_operations(cart, item_model, operations):
+    """
+    Apply `operations` to `cart` (a Cart or GuestCart whose items are
+    `item_model` rows) and return the cart's new totals.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise CartBatchError([{"index": None, "message": "No operations given"}])
+    if len(operations) > MAX_OPERATIONS:
+        raise CartBatchError([{"index": None, "message": f"At most {MAX_OPERATIONS} operations per request"}])
+
+    items = {item.id: item for item in cart.items.all()}
+    by_product = {item.product_id: item for item in items.values()}
+    quantities = {item.product_id: item.quantity for item in items.values()}
+    errors = []
+
+    def fail(index, message):
+        errors.append({"index": index, "message": message})
+
+    # Work out the final quantity of every product before touching anything
+    added = set()
+    touched = {}
+    for index, operation in enumerate(operations):
+        op = operation.get("op") if isinstance(operation, dict) else None
+        if op not in OPERATIONS:
+            fail(index, f"Unknown operation {op!r}")
+            continue
+
+        if op == "add":
+            quantity = _quantity(operation, 1)
+            try:
+                product_id = int(operation.get("product_id"))
+            except (TypeError, ValueError):
+                fail(index, "Product not specified")
+                continue
+            if quantity is None or quantity <= 0:
+                fail(index, "Invalid quantity")
+                continue
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+            added.add(product_id)
+        else:
+            try:
+                item = items.get(int(operation.get("cart_item_id")))
+            except (TypeError, ValueError):
+                item = None
+            if item is None:
+                fail(index, "Cart item not found")
+                continue
+            quantity = 0 if op == "remove" else _quantity(operation)
+            if quantity is None or quantity < 0:
+                fail(index, "Invalid quantity")
+                continue
+            quantities[item.product_id] = quantity
+        touched.setdefault(product_id if op == "add" else item.product_id, index)
+
+    products = Product.objects.filter(id__in=touched).only(
+        "id", "name", "price", "stock_quantity", "is_active", "seller_id"
+    ).in_bulk()
+    for product_id, index in touched.items():
+        product = products.get(product_id)
+        if product is None or (product_id in added and not product.is_active):
+            fail(index, "Product is not available")
+        elif quantities[product_id] > product.stock_quantity:
+            fail(index, f"Not enough stock for {product.name}")
+    if errors:
+        raise CartBatchError(sorted(errors, key=lambda error: error["index"]))
+
+    now = timezone.now()
+    created, changed, removed = [], [], []
+    for product_id in touched:
+        quantity = quantities[product_id]
+        item = by_product.get(product_id)
+        if item is None:
+            if quantity:
+                product = products[product_id]
+                created.append(
+                    item_model(cart=cart, product=product, quantity=quantity, price_at_time=product.price)
+                )
+        elif quantity == 0:
+            removed.append(item.id)
+            del items[item.id]
+        elif quantity != item.quantity:
+            item.quantity = quantity
+            item.updated_at = now
+            changed.append(item)
+
+    with transaction.atomic():
+        item_model.objects.filter(id__in=removed).delete()
+        item_model.objects.bulk_update(changed, ["quantity", "updated_at"])
+        item_model.objects.bulk_create(created)
+
+    final = list(items.values()) + created
+    subtotal = sum(item.total_price for item in final)
+    discount = cart.discount_on(subtotal)
+    return {
+        "items": [
+            {
+                "id": item.id,
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "total_price": str(item.total_price),
+            }
+            for item in sorted(final, key=lambda item: item.id)
+        ],
+        "removed": removed,
+        "total_items": sum(item.quantity for item in final),
+        "subtotal": str(subtotal),
+        "discount": str(discount),
+        "total": str(max(0, subtotal - discount)),
+    }
@@ -0,0 +1,23 @@
+from django.db.models import Count, Max, Sum
+
+from crazycart.cache import CacheNamespace
+
+from .models import CartItem
+
+# Per-user header summary; entries are deleted by cart.signals on every change
+cart_cache = CacheNamespace("cart", timeout=60 * 60)
+
+
+def get_cart_summary(user):
+    def compute():
+        summary = CartItem.objects.filter(cart__user=user).aggregate(
+            lines=Count("id"), total_items=Sum("quantity"), changed=Max("updated_at")
+        )
+        summary["total_items"] = summary["total_items"] or 0
+        return summary
+
+    return cart_cache.get_or_set(user.pk, compute)
+
+
+def forget_cart_summary(user_id):
+    cart_cache.delete(user_id)
@@ -0,0 +1,13 @@
+from .cache import get_cart_summary
+from .guest import get_guest_cart_summary, guest_cart_key
+
+
+def cart_summary(request):
+    """Item count for the header cart badge, cached per user or guest cart"""
+    user = getattr(request, "user", None)
+    if user is None:
+        return {}
+    if user.is_authenticated:
+        return {"cart_summary": get_cart_summary(user)}
+    key = guest_cart_key(request)
+    return {"cart_summary": get_guest_cart_summary(key)} if key else {}
@@ -0,0 +1,109 @@
+"""
+Carts for visitors who are not signed in.
+
+The cart lives in GuestCart/GuestCartItem; the browser only holds its key
+in a signed cookie. On login the items are merged into the user's Cart
+(see cart.signals) and the guest cart is deleted. Carts left untouched for
+GUEST_CART_MAX_AGE are removed by the expire_guest_carts command.
+"""
+import secrets
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+
+from .cache import cart_cache, forget_cart_summary
+from .models import Cart, CartItem, GuestCart, GuestCartItem
+
+GUEST_CART_COOKIE = "guest_cart"
+GUEST_CART_SALT = "cart.guest"
+
+
+def guest_cart_key(request):
+    return request.get_signed_cookie(GUEST_CART_COOKIE, default=None, salt=GUEST_CART_SALT)
+
+
+def get_guest_cart(request, create=False):
+    key = guest_cart_key(request)
+    cart = GuestCart.objects.filter(key=key).first() if key else None
+    if cart is None and create:
+        cart = GuestCart.objects.create(key=secrets.token_hex(16))
+    return cart
+
+
+def remember_guest_cart(response, cart):
+    response.set_signed_cookie(
+        GUEST_CART_COOKIE,
+        cart.key,
+        salt=GUEST_CART_SALT,
+        max_age=settings.GUEST_CART_MAX_AGE,
+        httponly=True,
+        samesite="Lax",
+    )
+    return response
+
+
+def add_guest_item(cart, product, quantity):
+    item, created = GuestCartItem.objects.get_or_create(
+        cart=cart, product=product, defaults={"quantity": quantity, "price_at_time": product.price}
+    )
+    if not created:
+        item.quantity = min(item.quantity + quantity, product.stock_quantity)
+        item.save()
+    return item
+
+
+def get_guest_cart_summary(key):
+    """Same shape as cart.cache.get_cart_summary, for the header badge"""
+
+    def compute():
+        summary = GuestCartItem.objects.filter(cart__key=key).aggregate(
+            lines=Count("id"), total_items=Sum("quantity"), changed=Max("updated_at")
+        )
+        summary["total_items"] = summary["total_items"] or 0
+        return summary
+
+    return cart_cache.get_or_set(("guest", key), compute)
+
+
+def forget_guest_cart_summary(key):
+    cart_cache.delete("guest", key)
+
+
+def merge_guest_cart(guest_cart, user):
+    """
+    Move the guest's items into the user's cart with one upsert. Quantities
+    of products already in the cart are added up (capped by stock) and the
+    cart keeps its own price, which may be a bargained one.
+    """
+    items = list(guest_cart.items.select_related("product"))
+    if items:
+        cart, created = Cart.objects.get_or_create(user=user)
+        existing = {} if created else {item.product_id: item for item in cart.items.all()}
+        merged = []
+        for item in items:
+            product = item.product
+            if not product.is_active or product.seller_id == user.pk:
+                continue
+            current = existing.get(product.id)
+            quantity = item.quantity + (current.quantity if current else 0)
+            quantity = min(quantity, product.stock_quantity)
+            if quantity <= 0:
+                continue
+            merged.append(
+                CartItem(
+                    cart=cart,
+                    product=product,
+                    quantity=quantity,
+                    price_at_time=current.price_at_time if current else item.price_at_time,
+                )
+            )
+        CartItem.objects.bulk_create(
+            merged,
+            update_conflicts=True,
+            unique_fields=["cart", "product"],
+            update_fields=["quantity", "price_at_time", "updated_at"],
+        )
+        # bulk_create sends no post_save
+        forget_cart_summary(user.pk)
+    guest_cart.delete()
+    return len(items)
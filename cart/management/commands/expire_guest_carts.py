@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cart.models import GuestCart, GuestCartItem
+
+
+class Command(BaseCommand):
+    help = "Delete guest carts nobody has touched for GUEST_CART_MAX_AGE"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--days", type=int, help="Override GUEST_CART_MAX_AGE")
+
+    def handle(self, *args, **options):
+        age = timedelta(days=options["days"]) if options["days"] is not None else timedelta(
+            seconds=settings.GUEST_CART_MAX_AGE
+        )
+        cutoff = timezone.now() - age
+        carts = 0
+        while True:
+            ids = list(
+                GuestCart.objects.filter(updated_at__lt=cutoff).values_list("id", flat=True)[: options["batch_size"]]
+            )
+            if not ids:
+                break
+            # Two plain DELETEs per batch; nobody is looking at these carts, so skip the item signals
+            GuestCartItem.objects.filter(cart_id__in=ids)._raw_delete(GuestCartItem.objects.db)
+            carts += GuestCart.objects.filter(id__in=ids)._raw_delete(GuestCart.objects.db)
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {carts} abandoned guest carts"))
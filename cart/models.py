@@ -18,20 +18,23 @@ class Cart(models.Model):
     def subtotal(self):
         return sum(item.total_price for item in self.items.all())
     
-    @property
-    def total_price(self):
-        subtotal = self.subtotal
+    def discount_on(self, subtotal):
+        """The applied discount's amount for a given subtotal"""
         if hasattr(self, 'applied_discount') and self.applied_discount:
-            applied_discount = self.applied_discount
-            discount = applied_discount.discount
+            discount = self.applied_discount.discount
             if discount.discount_type == 'percentage':
                 discount_amount = subtotal * (discount.discount_value / 100)
                 if discount.maximum_discount_amount:
                     discount_amount = min(discount_amount, discount.maximum_discount_amount)
             else:
                 discount_amount = discount.discount_value
-            return max(0, subtotal - discount_amount)
-        return subtotal
+            return discount_amount
+        return 0
+
+    @property
+    def total_price(self):
+        subtotal = self.subtotal
+        return max(0, subtotal - self.discount_on(subtotal))
     
     @property
     def total_amount(self):
@@ -40,18 +43,7 @@ class Cart(models.Model):
     
     @property
     def discount_amount(self):
-        subtotal = self.subtotal
-        if hasattr(self, 'applied_discount') and self.applied_discount:
-            applied_discount = self.applied_discount
-            discount = applied_discount.discount
-            if discount.discount_type == 'percentage':
-                discount_amount = subtotal * (discount.discount_value / 100)
-                if discount.maximum_discount_amount:
-                    discount_amount = min(discount_amount, discount.maximum_discount_amount)
-            else:
-                discount_amount = discount.discount_value
-            return discount_amount
-        return 0
+        return self.discount_on(self.subtotal)
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
@@ -83,3 +75,52 @@ class AppliedDiscount(models.Model):
     
     def __str__(self):
         return f"Discount {self.discount.code} applied to {self.cart.user.username}'s cart"
+
+
+class GuestCart(models.Model):
+    """A cart for a visitor who is not signed in, found by the key in their signed cookie"""
+    key = models.CharField(max_length=32, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Guest cart {self.key}"
+
+    @property
+    def total_items(self):
+        return sum(item.quantity for item in self.items.all())
+
+    @property
+    def subtotal(self):
+        return sum(item.total_price for item in self.items.all())
+
+    def discount_on(self, subtotal):
+        # Discounts need an account
+        return 0
+
+    @property
+    def total_price(self):
+        return self.subtotal
+
+    @property
+    def discount_amount(self):
+        return 0
+
+
+class GuestCartItem(models.Model):
+    cart = models.ForeignKey(GuestCart, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+    price_at_time = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('cart', 'product')
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name} in guest cart {self.cart.key}"
+
+    @property
+    def total_price(self):
+        return self.quantity * self.price_at_time
@@ -0,0 +1,49 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import forget_cart_summary
+from .guest import forget_guest_cart_summary, get_guest_cart, merge_guest_cart
+from .models import Cart, CartItem, GuestCart, GuestCartItem
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def cart_item_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    try:
+        cart = instance.cart
+    except Cart.DoesNotExist:
+        # Deleted along with its cart
+        return
+    forget_cart_summary(cart.user_id)
+
+
+@receiver(post_delete, sender=Cart)
+def cart_deleted(sender, instance, **kwargs):
+    forget_cart_summary(instance.user_id)
+
+
+@receiver(post_save, sender=GuestCartItem)
+@receiver(post_delete, sender=GuestCartItem)
+def guest_cart_item_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    try:
+        cart = instance.cart
+    except GuestCart.DoesNotExist:
+        return
+    forget_guest_cart_summary(cart.key)
+    # Keeps the cart out of expire_guest_carts while it is in use
+    GuestCart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+
+
+@receiver(user_logged_in)
+def merge_guest_cart_on_login(sender, request, user, **kwargs):
+    if request is None:
+        return
+    guest_cart = get_guest_cart(request)
+    if guest_cart is not None:
+        merge_guest_cart(guest_cart, user)
@@ -1,3 +1,154 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import User
+from products.models import Category, Product
+
+from .guest import GUEST_CART_COOKIE
+from .models import Cart, CartItem, GuestCart, GuestCartItem
+
+
+class GuestCartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller", password="pass1234", user_type="seller")
+        self.buyer = User.objects.create_user("buyer", password="pass1234")
+        category = Category.objects.create(name="Phones")
+        self.phone, self.case = (
+            Product.objects.create(
+                seller=self.seller,
+                category=category,
+                name=name,
+                description="Test product",
+                price=Decimal("10.00"),
+                stock_quantity=5,
+            )
+            for name in ("Phone", "Case")
+        )
+
+    def add(self, product, quantity=1):
+        return self.client.post(
+            "/cart/add/", {"product_id": product.id, "quantity": quantity}, content_type="application/json"
+        )
+
+    def test_guest_can_add_update_and_remove(self):
+        response = self.add(self.phone, 2)
+        self.assertEqual(response.json()["cart_count"], 2)
+        self.assertIn(GUEST_CART_COOKIE, response.cookies)
+        self.add(self.case)
+
+        item = GuestCartItem.objects.get(product=self.phone)
+        self.client.post("/cart/update/", {"cart_item_id": item.id, "quantity": 4})
+        self.client.post("/cart/remove/", {"cart_item_id": GuestCartItem.objects.get(product=self.case).id})
+
+        response = self.client.get("/cart/")
+        self.assertEqual([item.quantity for item in response.context["cart_items"]], [4])
+        self.assertContains(response, "Log in to Checkout")
+        self.assertEqual(response.context["cart_summary"]["total_items"], 4)
+
+    def test_other_guests_items_are_not_reachable(self):
+        self.add(self.phone)
+        item = GuestCartItem.objects.get()
+        self.client.cookies.clear()
+        response = self.client.post("/cart/update/", {"cart_item_id": item.id, "quantity": 3})
+        self.assertEqual(response.status_code, 404)
+
+    def test_login_merges_into_user_cart(self):
+        cart = Cart.objects.create(user=self.buyer)
+        CartItem.objects.create(cart=cart, product=self.phone, quantity=2, price_at_time=Decimal("8.00"))
+        self.add(self.phone, 4)
+        self.add(self.case, 1)
+
+        self.client.post("/accounts/login/", {"username": "buyer", "password": "pass1234"})
+
+        items = {item.product_id: item for item in cart.items.all()}
+        # Capped by stock, and the bargained price is kept
+        self.assertEqual((items[self.phone.id].quantity, items[self.phone.id].price_at_time), (5, Decimal("8.00")))
+        self.assertEqual(items[self.case.id].quantity, 1)
+        self.assertFalse(GuestCart.objects.exists())
+        self.assertEqual(self.client.get("/cart/").context["cart_summary"]["total_items"], 6)
+
+    def test_expire_abandoned_carts(self):
+        self.add(self.phone)
+        self.add(self.case)
+        fresh = GuestCart.objects.create(key="fresh")
+        GuestCart.objects.exclude(id=fresh.id).update(updated_at=timezone.now() - timedelta(days=40))
+
+        out = StringIO()
+        call_command("expire_guest_carts", stdout=out)
+        self.assertIn("Deleted 1 abandoned guest carts", out.getvalue())
+        self.assertEqual(list(GuestCart.objects.values_list("key", flat=True)), ["fresh"])
+        self.assertFalse(GuestCartItem.objects.exists())
+
+
+class BatchCartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller", password="pass1234", user_type="seller")
+        self.buyer = User.objects.create_user("buyer", password="pass1234")
+        category = Category.objects.create(name="Phones")
+        self.products = [
+            Product.objects.create(
+                seller=self.seller,
+                category=category,
+                name=f"Product {number}",
+                description="Test product",
+                price=Decimal("10.00"),
+                stock_quantity=5,
+            )
+            for number in range(4)
+        ]
+        self.cart = Cart.objects.create(user=self.buyer)
+        self.items = [
+            CartItem.objects.create(cart=self.cart, product=product, quantity=1, price_at_time=product.price)
+            for product in self.products[:3]
+        ]
+        self.client.force_login(self.buyer)
+
+    def batch(self, *operations):
+        return self.client.post("/cart/batch/", {"operations": list(operations)}, content_type="application/json")
+
+    def test_applies_all_operations_and_returns_totals(self):
+        new, kept = self.products[3], self.items[2]
+        with CaptureQueriesContext(connection) as queries:
+            data = self.batch(
+                {"op": "update", "cart_item_id": self.items[0].id, "quantity": 3},
+                {"op": "remove", "cart_item_id": self.items[1].id},
+                {"op": "add", "product_id": new.id, "quantity": 2},
+            ).json()
+        self.assertTrue(data["success"], data)
+        self.assertLess(len(queries), 20)
+        self.assertEqual((data["total_items"], data["subtotal"], data["total"]), (6, "60.00", "60.00"))
+        self.assertEqual(data["removed"], [self.items[1].id])
+        self.assertEqual(
+            dict(self.cart.items.values_list("product_id", "quantity")),
+            {self.products[0].id: 3, kept.product_id: 1, new.id: 2},
+        )
+        self.assertEqual(self.client.get("/cart/").context["cart_summary"]["total_items"], 6)
+
+    def test_nothing_changes_when_an_operation_fails(self):
+        data = self.batch(
+            {"op": "update", "cart_item_id": self.items[0].id, "quantity": 2},
+            {"op": "add", "product_id": self.products[1].id, "quantity": 5},
+            {"op": "remove", "cart_item_id": 999999},
+        ).json()
+        self.assertFalse(data["success"])
+        self.assertEqual([error["index"] for error in data["errors"]], [1, 2])
+        self.assertEqual(sorted(self.cart.items.values_list("quantity", flat=True)), [1, 1, 1])
 
-# Create your tests here.
+    def test_guest_batch(self):
+        self.client.logout()
+        data = self.batch({"op": "add", "product_id": self.products[0].id, "quantity": 2}).json()
+        self.assertEqual(data["total_items"], 2)
+        item_id = data["items"][0]["id"]
+        data = self.batch({"op": "update", "cart_item_id": item_id, "quantity": 4}).json()
+        self.assertEqual((data["total_items"], data["total"]), (4, "40.00"))
+        self.assertEqual(GuestCartItem.objects.get().quantity, 4)
@@ -7,6 +7,7 @@ urlpatterns = [
     path('', views.cart_view, name='cart'),
     path('add/', views.add_to_cart, name='add_to_cart'),
     path('update/', views.update_cart_item, name='update_cart_item'),
+    path('batch/', views.batch_update_cart, name='batch_update_cart'),
     path('remove/', views.remove_from_cart, name='remove_from_cart'),
     path('clear/', views.clear_cart, name='clear_cart'),
     path('checkout/', views.checkout_view, name='checkout'),
@@ -1,14 +1,39 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-from .models import Cart, CartItem
+from crazycart.replicas import primary_required
+from .cache import forget_cart_summary
+from .guest import (
+    add_guest_item,
+    forget_guest_cart_summary,
+    get_guest_cart,
+    guest_cart_key,
+    remember_guest_cart,
+)
+from .models import Cart, CartItem, GuestCart, GuestCartItem
 from products.models import Product, Discount
 
 
-@login_required
+def _cart_items(request):
+    """Items of the signed-in user's cart or of the visitor's guest cart"""
+    if request.user.is_authenticated:
+        return CartItem.objects.filter(cart__user=request.user)
+    key = guest_cart_key(request)
+    return GuestCartItem.objects.filter(cart__key=key) if key else GuestCartItem.objects.none()
+
+
 def cart_view(request):
+    if not request.user.is_authenticated:
+        cart = get_guest_cart(request)
+        context = {
+            "cart": cart,
+            "cart_items": cart.items.select_related("product") if cart else [],
+        }
+        return render(request, "cart/cart.html", context)
+
     cart, created = Cart.objects.get_or_create(user=request.user)
     cart_items = cart.items.select_related("product").all()
 
@@ -20,13 +45,14 @@ def cart_view(request):
     return render(request, "cart/cart.html", context)
 
 
-@login_required
 def add_to_cart(request):
     import json
     from decimal import Decimal
 
     # Handle GET requests (for regular product additions and bargained items)
     if request.method == "GET":
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
         product_id = request.GET.get("product_id")
         quantity = int(request.GET.get("quantity", 1))
         custom_price = request.GET.get("price")  # For bargaining agreed price
@@ -127,6 +153,18 @@ def add_to_cart(request):
                 {"success": False, "message": "Not enough stock available"}
             )
 
+        if not request.user.is_authenticated:
+            guest_cart = get_guest_cart(request, create=True)
+            add_guest_item(guest_cart, product, quantity)
+            response = JsonResponse(
+                {
+                    "success": True,
+                    "message": "Product added to cart",
+                    "cart_count": guest_cart.total_items,
+                }
+            )
+            return remember_guest_cart(response, guest_cart)
+
         cart, created = Cart.objects.get_or_create(user=request.user)
 
         cart_item, item_created = CartItem.objects.get_or_create(
@@ -151,7 +189,6 @@ def add_to_cart(request):
         )
 
 
-@login_required
 @require_POST
 def update_cart_item(request):
     import json
@@ -165,7 +202,7 @@ def update_cart_item(request):
         cart_item_id = request.POST.get("cart_item_id")
         quantity = int(request.POST.get("quantity", 1))
 
-    cart_item = get_object_or_404(CartItem, id=cart_item_id, cart__user=request.user)
+    cart_item = get_object_or_404(_cart_items(request), id=cart_item_id)
 
     if quantity <= 0:
         cart_item.delete()
@@ -180,44 +217,93 @@ def update_cart_item(request):
     return JsonResponse({"success": True, "message": "Cart updated"})
 
 
-@login_required
+@require_POST
+def batch_update_cart(request):
+    """Several add/update/remove operations in one round-trip; see cart.batch"""
+    import json
+    from django.utils import timezone
+    from .batch import CartBatchError, apply_cart_operations
+
+    try:
+        operations = json.loads(request.body).get("operations")
+    except (ValueError, AttributeError):
+        return JsonResponse({"success": False, "message": "Invalid request"})
+
+    if request.user.is_authenticated:
+        cart, created = Cart.objects.get_or_create(user=request.user)
+        item_model = CartItem
+    else:
+        cart = get_guest_cart(request, create=True)
+        item_model = GuestCartItem
+
+    try:
+        totals = apply_cart_operations(cart, item_model, operations)
+    except CartBatchError as e:
+        return JsonResponse({"success": False, "message": str(e), "errors": e.errors})
+
+    # Bulk writes send no signals
+    if request.user.is_authenticated:
+        forget_cart_summary(request.user.pk)
+    else:
+        forget_guest_cart_summary(cart.key)
+        GuestCart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+
+    response = JsonResponse({"success": True, "message": "Cart updated", **totals})
+    if not request.user.is_authenticated:
+        remember_guest_cart(response, cart)
+    return response
+
+
 @require_POST
 def remove_from_cart(request):
     cart_item_id = request.POST.get("cart_item_id")
-    cart_item = get_object_or_404(CartItem, id=cart_item_id, cart__user=request.user)
+    cart_item = get_object_or_404(_cart_items(request), id=cart_item_id)
     cart_item.delete()
 
     messages.success(request, "Item removed from cart")
     return redirect("cart:cart")
 
 
-@login_required
 @require_POST
 def clear_cart(request):
-    cart = get_object_or_404(Cart, user=request.user)
-    cart.items.all().delete()
+    if request.user.is_authenticated:
+        cart = get_object_or_404(Cart, user=request.user)
+        cart.items.all().delete()
+    else:
+        _cart_items(request).delete()
 
     messages.success(request, "Cart cleared")
     return redirect("cart:cart")
 
 
+@primary_required
 @login_required
 def checkout_view(request):
+    from accounts.addresses import saved_addresses
+    from orders.services import ADDRESS_FIELDS, shipping_from_user, validate_cart
+
     cart = get_object_or_404(Cart, user=request.user)
 
-    if not cart.items.exists():
-        messages.error(request, "Your cart is empty")
+    check = validate_cart(cart)
+    if not check.ok:
+        for problem in check.errors:
+            messages.error(request, problem.message)
         return redirect("cart:cart")
+    for problem in check.warnings:
+        messages.warning(request, problem.message)
 
-    # Check stock availability
-    for item in cart.items.all():
-        if item.quantity > item.product.stock_quantity:
-            messages.error(request, f"Not enough stock for {item.product.name}")
-            return redirect("cart:cart")
-
+    # Prefill from the address book
+    addresses = list(saved_addresses(request.user)[:10])
     context = {
         "cart": cart,
-        "cart_items": cart.items.select_related("product").all(),
+        "checkout": check,
+        "cart_items": check.items,
+        "shipping": shipping_from_user(request.user),
+        "saved_addresses": addresses,
+        "saved_address_data": [
+            {field: getattr(address, field) for field in ADDRESS_FIELDS}
+            for address in addresses
+        ],
     }
 
     return render(request, "cart/checkout.html", context)
@@ -312,6 +398,7 @@ def buy_now_view(request):
     )
 
 
+@primary_required
 @login_required
 def buy_now_checkout_view(request):
     """Checkout view for buy now items"""
@@ -344,54 +431,61 @@ def buy_now_checkout_view(request):
     return render(request, "cart/buy_now_checkout.html", context)
 
 
+@primary_required
 @login_required
 def online_checkout_view(request):
     """Handle online payment for cart checkout"""
     if request.method != "POST":
         return redirect("cart:checkout")
 
+    from orders.models import Order, OrderItem, Payment
+    from orders.outbox import emit_order_event
+    from orders.reservations import release_order, reserve_order
+    from orders.services import (
+        ADDRESS_FIELDS,
+        CheckoutError,
+        address_kwargs,
+        missing_shipping_fields,
+        validate_cart,
+    )
+    from django.db import transaction
+
     cart = get_object_or_404(Cart, user=request.user)
-    cart_items = cart.items.select_related("product").all()
 
-    if not cart_items:
-        messages.error(request, "Your cart is empty")
+    # Coming back from the payment page: let go of the stock held for the earlier attempt
+    pending_order = Order.objects.filter(
+        id=request.session.get("pending_order_id"), user=request.user
+    ).first()
+    if pending_order:
+        release_order(pending_order)
+
+    check = validate_cart(cart)
+    if not check.ok:
+        for problem in check.errors:
+            messages.error(request, problem.message)
         return redirect("cart:cart")
+    cart_items = check.items
 
-    # Validate stock again
-    for item in cart_items:
-        if item.quantity > item.product.stock_quantity:
-            messages.error(request, f"Not enough stock for {item.product.name}")
-            return redirect("cart:cart")
-
-    # Create order with shipping information from the form
-    from orders.models import Order, OrderItem, Payment
-    from django.db import transaction
+    shipping = {
+        field: request.POST.get(f"shipping_{field}", "") for field in ADDRESS_FIELDS
+    }
+    missing_fields = missing_shipping_fields(shipping)
+    if missing_fields:
+        messages.error(
+            request,
+            f'Please fill in all required fields: {", ".join(missing_fields)}',
+        )
+        return redirect("cart:checkout")
 
     try:
         with transaction.atomic():
             # Create order
             order = Order.objects.create(
                 user=request.user,
-                subtotal=cart.subtotal,
-                total_amount=cart.total_price,
-                # Shipping details from form
-                shipping_name=request.POST.get("shipping_name"),
-                shipping_email=request.POST.get("shipping_email"),
-                shipping_phone=request.POST.get("shipping_phone"),
-                shipping_address=request.POST.get("shipping_address"),
-                shipping_city=request.POST.get("shipping_city"),
-                shipping_state=request.POST.get("shipping_state", ""),
-                shipping_postal_code=request.POST.get("shipping_postal_code", ""),
-                shipping_country=request.POST.get("shipping_country"),
-                # Billing (same as shipping for now)
-                billing_name=request.POST.get("shipping_name"),
-                billing_email=request.POST.get("shipping_email"),
-                billing_phone=request.POST.get("shipping_phone"),
-                billing_address=request.POST.get("shipping_address"),
-                billing_city=request.POST.get("shipping_city"),
-                billing_state=request.POST.get("shipping_state", ""),
-                billing_postal_code=request.POST.get("shipping_postal_code", ""),
-                billing_country=request.POST.get("shipping_country"),
+                subtotal=check.subtotal,
+                total_amount=check.total_price,
+                # Shipping details from the form; billing is the same for now
+                **address_kwargs(request.user, shipping),
             )
 
             # Create order items
@@ -399,7 +493,7 @@ def online_checkout_view(request):
                 OrderItem.objects.create(
                     order=order,
                     product=item.product,
-                    seller=item.product.seller,
+                    seller_id=item.product.seller_id,
                     quantity=item.quantity,
                     price_at_time=item.price_at_time,
                     total_price=item.total_price,
@@ -413,9 +507,16 @@ def online_checkout_view(request):
                 status="pending",
             )
 
+            # Hold the stock while the buyer pays
+            reserved_until = reserve_order(order)
+            emit_order_event("order.created", order, payment_method="online")
+
             # Store order ID in session for payment page
             request.session["pending_order_id"] = order.id
 
+    except CheckoutError as e:
+        messages.error(request, e.message)
+        return redirect("cart:cart")
     except Exception as e:
         messages.error(request, f"Error creating order: {str(e)}")
         return redirect("cart:checkout")
@@ -425,5 +526,6 @@ def online_checkout_view(request):
         "order": order,
         "cart_items": cart_items,
         "amount": float(order.total_amount),
+        "reserved_until": reserved_until,
     }
     return render(request, "cart/online_payment.html", context)
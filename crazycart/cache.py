@@ -0,0 +1,212 @@
+"""
+Cache configuration from the environment, and namespaced caching helpers.
+
+    CACHE_BACKEND     locmem (default), file, redis, memcached or dummy
+    CACHE_LOCATION    directory, redis:// URL or host:port list
+    CACHE_TIMEOUT     default timeout in seconds (default 300)
+
+Redis and memcached fall back to locmem when their client library is not
+installed. Locmem is per process, so use a shared backend in production.
+"""
+import hashlib
+import math
+import os
+import random
+import time
+import warnings
+from collections import Counter
+from threading import Lock
+
+from django.core.cache import caches
+
+BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", None),
+    "file": ("django.core.cache.backends.filebased.FileBasedCache", None),
+    "redis": ("django.core.cache.backends.redis.RedisCache", "redis"),
+    "memcached": ("django.core.cache.backends.memcached.PyMemcacheCache", "pymemcache"),
+    "dummy": ("django.core.cache.backends.dummy.DummyCache", None),
+}
+
+
+def _importable(module):
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+def cache_config(base_dir, environ=None):
+    environ = os.environ if environ is None else environ
+    name = environ.get("CACHE_BACKEND", "locmem").lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unsupported CACHE_BACKEND {name!r}; use one of {', '.join(BACKENDS)}")
+
+    backend, requirement = BACKENDS[name]
+    if requirement and not _importable(requirement):
+        warnings.warn(f"CACHE_BACKEND={name} needs the {requirement} package; using locmem")
+        name, (backend, requirement) = "locmem", BACKENDS["locmem"]
+
+    location = environ.get("CACHE_LOCATION", "")
+    if name == "file":
+        location = location or str(base_dir / "cache")
+    elif name == "redis":
+        location = location or "redis://127.0.0.1:6379/1"
+    elif name == "memcached":
+        location = [entry.strip() for entry in (location or "127.0.0.1:11211").split(",")]
+    elif name == "locmem":
+        location = location or "crazycart"
+
+    return {
+        "BACKEND": backend,
+        "LOCATION": location,
+        "TIMEOUT": int(environ.get("CACHE_TIMEOUT", 300)),
+        "KEY_PREFIX": "crazycart",
+    }
+
+
+# Stored in place of None so a cached "nothing there" is not a miss
+_NOTHING = "__cache_nothing__"
+# Fraction of `timeout` a value is kept past its expiry, to serve while one worker recomputes
+STALE_GRACE = 0.5
+LOCK_TIMEOUT = 30
+STATS_FLUSH_EVERY = 100
+STATS_KEY = "cache-stats:{namespace}:{event}"
+STATS_EVENTS = ("hit", "miss", "stale", "negative_hit")
+
+
+class CacheNamespace:
+    """
+    A group of keys that share a version and timeouts.
+
+    Keys are `<name>:v<version>:<parts>`; invalidate() bumps the version so
+    every key of the namespace is abandoned at once. `version_func` lets a
+    namespace follow a version kept elsewhere (e.g. the catalog counter in
+    the database) instead of the one stored in the cache.
+
+    get_or_set() protects against stampedes: values are recomputed a little
+    before they expire (probabilistic early expiration), by the one worker
+    that gets the lock, while others keep serving the old value.
+    """
+
+    registry = {}
+
+    def __init__(self, name, timeout=300, negative_timeout=60, version_func=None, alias="default"):
+        self.name = name
+        self.timeout = timeout
+        self.negative_timeout = negative_timeout
+        self.version_func = version_func
+        self.alias = alias
+        self.stats = Counter()
+        self._stats_lock = Lock()
+        CacheNamespace.registry[name] = self
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def version(self):
+        if self.version_func:
+            return self.version_func()
+        key = f"ns-version:{self.name}"
+        version = self.cache.get(key)
+        if version is None:
+            # Start from the clock, so a lost or cleared version key never brings back old entries
+            self.cache.add(key, int(time.time() * 1000), None)
+            version = self.cache.get(key)
+        return version
+
+    def invalidate(self):
+        if self.version_func:
+            raise TypeError(f"Namespace {self.name} is versioned by {self.version_func.__name__}")
+        key = f"ns-version:{self.name}"
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, int(time.time() * 1000), None)
+
+    def key(self, *parts):
+        raw = ":".join(str(part) for part in parts)
+        if len(raw) > 100:
+            raw = hashlib.md5(raw.encode()).hexdigest()
+        return f"{self.name}:v{self.version()}:{raw}"
+
+    def delete(self, *parts):
+        self.cache.delete(self.key(*parts))
+
+    def get_or_set(self, parts, compute, timeout=None, negative_timeout=None):
+        """
+        The cached value for `parts`, computing and storing it on a miss.
+        A None result is cached for `negative_timeout`.
+        """
+        parts = parts if isinstance(parts, (list, tuple)) else (parts,)
+        key = self.key(*parts)
+        lock_key = f"{key}:lock"
+        locked = False
+        entry = self.cache.get(key)
+
+        if entry is not None:
+            value, expires, cost = entry
+            # Expire early with a probability that grows as expiry nears and with compute cost
+            fresh = time.time() - cost * math.log(random.random() or 1e-12) < expires
+            if not fresh:
+                locked = self.cache.add(lock_key, 1, LOCK_TIMEOUT)
+            if fresh or not locked:
+                # Fresh, or due with another worker already recomputing it
+                self.record("hit" if fresh else "stale")
+                if value == _NOTHING:
+                    self.record("negative_hit")
+                    return None
+                return value
+
+        self.record("miss")
+        try:
+            started = time.time()
+            value = compute()
+            cost = time.time() - started
+        finally:
+            if locked:
+                self.cache.delete(lock_key)
+
+        if value is None:
+            ttl = self.negative_timeout if negative_timeout is None else negative_timeout
+            stored = _NOTHING
+        else:
+            ttl = self.timeout if timeout is None else timeout
+            stored = value
+        self.cache.set(key, (stored, time.time() + ttl, cost), ttl + int(ttl * STALE_GRACE))
+        return value
+
+    def record(self, event):
+        with self._stats_lock:
+            self.stats[event] += 1
+            if sum(self.stats.values()) < STATS_FLUSH_EVERY:
+                return
+            pending, self.stats = self.stats, Counter()
+        self.flush_stats(pending)
+
+    def flush_stats(self, pending=None):
+        if pending is None:
+            with self._stats_lock:
+                pending, self.stats = self.stats, Counter()
+        for event, count in pending.items():
+            key = STATS_KEY.format(namespace=self.name, event=event)
+            if not self.cache.add(key, count, None):
+                try:
+                    self.cache.incr(key, count)
+                except ValueError:
+                    self.cache.set(key, count, None)
+
+
+def cache_stats():
+    """{namespace: {event counts, hit_ratio}}, shared through the cache backend"""
+    stats = {}
+    for name, namespace in CacheNamespace.registry.items():
+        namespace.flush_stats()
+        keys = {event: STATS_KEY.format(namespace=name, event=event) for event in STATS_EVENTS}
+        values = namespace.cache.get_many(keys.values())
+        counts = {event: values.get(key, 0) for event, key in keys.items()}
+        lookups = counts["hit"] + counts["stale"] + counts["miss"]
+        counts["hit_ratio"] = (counts["hit"] + counts["stale"]) / lookups if lookups else None
+        stats[name] = counts
+    return stats
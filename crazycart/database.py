@@ -0,0 +1,120 @@
+"""
+Database configuration from the environment.
+
+    DB_ENGINE             sqlite (default) or postgres
+    DB_NAME               database name, or the SQLite file path
+    DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+    DB_CONN_MAX_AGE       seconds to keep connections open (postgres, default 60)
+    DB_POOL_MAX_SIZE      use psycopg's connection pool of this size instead
+    DB_POOL_MIN_SIZE      pool connections kept open (default 2)
+    DB_POOL_TIMEOUT       seconds to wait for a pooled connection (default 10)
+    DB_SQLITE_JOURNAL     journal_mode for SQLite (default WAL)
+    DB_REPLICAS           comma-separated read replicas: host[:port] for
+                          postgres, file paths for sqlite
+
+SQLite connections are tuned with PRAGMAs from the connection_created
+signal; see SQLITE_PRAGMAS.
+"""
+import os
+
+from django.db.backends.signals import connection_created
+
+# WAL lets readers run alongside the single writer; busy_timeout makes a
+# writer wait for the lock instead of failing with "database is locked";
+# synchronous=NORMAL is durable in WAL mode except on power loss.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "busy_timeout": 5000,
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -20000,  # KiB
+    "temp_store": "MEMORY",
+}
+
+
+def _int(environ, name, default):
+    value = environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def sqlite_config(environ, base_dir):
+    pragmas = dict(SQLITE_PRAGMAS)
+    pragmas["journal_mode"] = environ.get("DB_SQLITE_JOURNAL", pragmas["journal_mode"])
+    return {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": environ.get("DB_NAME") or base_dir / "db.sqlite3",
+        "OPTIONS": {
+            # Take the write lock when a transaction starts, so two checkouts
+            # never deadlock upgrading read locks (busy_timeout can't help there)
+            "transaction_mode": "IMMEDIATE",
+            "timeout": pragmas["busy_timeout"] / 1000,
+        },
+        "PRAGMAS": pragmas,
+    }
+
+
+def postgres_config(environ):
+    config = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": environ.get("DB_NAME", "crazycart"),
+        "USER": environ.get("DB_USER", ""),
+        "PASSWORD": environ.get("DB_PASSWORD", ""),
+        "HOST": environ.get("DB_HOST", ""),
+        "PORT": environ.get("DB_PORT", ""),
+        "CONN_MAX_AGE": _int(environ, "DB_CONN_MAX_AGE", 60),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
+    }
+    pool_size = _int(environ, "DB_POOL_MAX_SIZE", 0)
+    if pool_size:
+        # psycopg 3 pool; Django requires persistent connections to be off with it
+        config["CONN_MAX_AGE"] = 0
+        config["OPTIONS"]["pool"] = {
+            "min_size": min(_int(environ, "DB_POOL_MIN_SIZE", 2), pool_size),
+            "max_size": pool_size,
+            "timeout": _int(environ, "DB_POOL_TIMEOUT", 10),
+        }
+    return config
+
+
+def database_config(base_dir, environ=None):
+    environ = os.environ if environ is None else environ
+    engine = environ.get("DB_ENGINE", "sqlite").lower()
+    if engine in ("postgres", "postgresql"):
+        return postgres_config(environ)
+    if engine == "sqlite":
+        return sqlite_config(environ, base_dir)
+    raise ValueError(f"Unsupported DB_ENGINE {engine!r}; use sqlite or postgres")
+
+
+def replica_configs(base_dir, environ=None):
+    """
+    {alias: settings} for each replica in DB_REPLICAS, copied from the
+    primary's settings. Under test they mirror the primary.
+    """
+    environ = os.environ if environ is None else environ
+    primary = database_config(base_dir, environ)
+    configs = {}
+    entries = [entry.strip() for entry in environ.get("DB_REPLICAS", "").split(",") if entry.strip()]
+    for number, entry in enumerate(entries, start=1):
+        config = dict(primary, TEST={"MIRROR": "default"})
+        if primary["ENGINE"] == "django.db.backends.sqlite3":
+            config["NAME"] = entry
+        else:
+            host, _, port = entry.partition(":")
+            config["HOST"] = host
+            config["PORT"] = port or primary["PORT"]
+        configs[f"replica_{number}"] = config
+    return configs
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    pragmas = connection.settings_dict.get("PRAGMAS") or {}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+connection_created.connect(apply_sqlite_pragmas, dispatch_uid="crazycart.sqlite_pragmas")
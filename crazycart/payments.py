@@ -0,0 +1,57 @@
+"""
+Payment provider configuration from the environment.
+
+    PAYMENT_BACKEND              simulator (default) or a dotted path to a
+                                 orders.payments.PaymentGateway subclass
+    PAYMENT_WEBHOOK_SECRET       key that signs webhook bodies (default
+                                 derived from SECRET_KEY)
+
+Simulator options, for tests and load tests:
+
+    PAYMENT_SIM_LATENCY_MS       time each charge takes (default 0)
+    PAYMENT_SIM_FAILURE_RATE     share of charges declined, 0-1 (default 0)
+    PAYMENT_SIM_WEBHOOKS         off (default: answer at once), inline or
+                                 thread (answer "pending", confirm by webhook)
+    PAYMENT_SIM_WEBHOOK_DELAY_MS how long a thread webhook waits (default 500)
+    PAYMENT_SIM_DUPLICATE_RATE   share of webhooks delivered twice (default 0)
+    PAYMENT_SIM_WEBHOOK_URL      POST webhooks here instead of applying them
+                                 in-process, e.g. to a running server
+"""
+import hashlib
+import os
+
+BACKENDS = {
+    "simulator": "orders.payments.SimulatedGateway",
+}
+WEBHOOK_MODES = ("off", "inline", "thread")
+
+
+def _float(environ, name, default):
+    value = environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+def payment_gateway_config(secret_key, environ=None):
+    environ = os.environ if environ is None else environ
+    name = environ.get("PAYMENT_BACKEND", "simulator")
+    config = {
+        "BACKEND": BACKENDS.get(name, name),
+        "WEBHOOK_SECRET": environ.get("PAYMENT_WEBHOOK_SECRET")
+        or hashlib.sha256(f"payment-webhooks:{secret_key}".encode()).hexdigest(),
+        "OPTIONS": {},
+    }
+    if name != "simulator":
+        return config
+
+    webhooks = environ.get("PAYMENT_SIM_WEBHOOKS", "off").lower()
+    if webhooks not in WEBHOOK_MODES:
+        raise ValueError(f"Unsupported PAYMENT_SIM_WEBHOOKS {webhooks!r}; use one of {', '.join(WEBHOOK_MODES)}")
+    config["OPTIONS"] = {
+        "latency_ms": _float(environ, "PAYMENT_SIM_LATENCY_MS", 0),
+        "failure_rate": _float(environ, "PAYMENT_SIM_FAILURE_RATE", 0),
+        "webhooks": webhooks,
+        "webhook_delay_ms": _float(environ, "PAYMENT_SIM_WEBHOOK_DELAY_MS", 500),
+        "duplicate_rate": _float(environ, "PAYMENT_SIM_DUPLICATE_RATE", 0),
+        "webhook_url": environ.get("PAYMENT_SIM_WEBHOOK_URL", ""),
+    }
+    return config
@@ -0,0 +1,109 @@
+"""
+Read replicas: reads go to one of settings.DATABASE_REPLICAS, everything
+else to the primary ("default").
+
+Reads stay on the primary when:
+- they run inside a transaction on the primary,
+- the code runs under `use_primary()` / `@primary_required` (checkout and
+  payments), or
+- the browser wrote something in the last REPLICA_PIN_SECONDS, so the
+  page after a POST (e.g. order_detail after create_order) never shows
+  stale replica data.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = "primary_pin"
+# Always read from the primary: sessions and tokens are read right after they are written
+PRIMARY_ONLY_APPS = {"sessions", "authtoken"}
+
+_pinned = ContextVar("pinned_to_primary", default=False)
+_wrote = ContextVar("wrote_to_primary", default=False)
+
+
+def replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def pinned_to_primary():
+    return _pinned.get()
+
+
+@contextmanager
+def use_primary():
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def primary_required(view):
+    """Run a view (checkout, payments) entirely against the primary"""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with use_primary():
+            return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if not aliases or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        if _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaPinMiddleware:
+    """
+    Pins a request to the primary if its browser wrote recently, and starts
+    the pin window after any request that writes (or is not GET/HEAD).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replicas():
+            return self.get_response(request)
+
+        try:
+            pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+
+        pinned = _pinned.set(pinned_until > time.time())
+        wrote = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get() or request.method not in ("GET", "HEAD", "OPTIONS"):
+                seconds = settings.REPLICA_PIN_SECONDS
+                response.set_cookie(
+                    PIN_COOKIE, str(time.time() + seconds), max_age=seconds, httponly=True, samesite="Lax"
+                )
+        finally:
+            _pinned.reset(pinned)
+            _wrote.reset(wrote)
+        return response
@@ -0,0 +1,128 @@
+"""
+Session engine from the environment, and a compact serializer.
+
+    SESSION_BACKEND   cached_db (default), db, cache or signed_cookies
+
+cached_db reads sessions from the cache and writes through to the
+database, so a page view no longer costs a django_session SELECT. It
+needs a shared cache: with a per-process cache (locmem) another worker
+keeps serving its cached copy after a login, logout or cart change, so
+without one the default is db.
+
+signed_cookies keeps no server-side state at all. The whole session
+(buy_now_item included) travels in the cookie, so it must stay small,
+and a logout cannot revoke a copied cookie before it expires.
+
+cache alone loses sessions whenever the cache is cleared or evicts them;
+it too is only offered for shared caches (redis, memcached, file).
+"""
+import os
+import warnings
+
+from django.core import signing
+
+ENGINES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "cache": "django.contrib.sessions.backends.cache",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}
+# Caches that every worker sees the same copy of; see crazycart/cache.py
+LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+# Short names for the keys this site stores in every session. Aliases start
+# with "~"; a real key starting with "~" is stored with a second "~".
+KEY_ALIASES = {
+    "_auth_user_id": "u",
+    "_auth_user_backend": "b",
+    "_auth_user_hash": "h",
+    "buy_now_item": "bn",
+    "pending_order_id": "po",
+    "product_id": "pi",
+    "product_name": "pn",
+    "product_price": "pp",
+    "quantity": "q",
+    "total_price": "tp",
+    "seller_id": "si",
+    "seller_name": "sn",
+}
+BACKEND_ALIASES = {
+    "django.contrib.auth.backends.ModelBackend": "m",
+}
+ALIAS = "~"
+
+_KEYS = {name: ALIAS + alias for name, alias in KEY_ALIASES.items()}
+_NAMES = {alias: name for name, alias in _KEYS.items()}
+_BACKENDS = {name: ALIAS + alias for name, alias in BACKEND_ALIASES.items()}
+_BACKEND_NAMES = {alias: name for name, alias in _BACKENDS.items()}
+
+
+def session_engine(environ=None, cache=None):
+    """
+    The SESSION_ENGINE to use. `cache` is the default cache's settings; the
+    cache-backed engines fall back to db unless it is shared between workers.
+    """
+    environ = os.environ if environ is None else environ
+    requested = environ.get("SESSION_BACKEND", "")
+    name = (requested or "cached_db").lower()
+    if name not in ENGINES:
+        raise ValueError(f"Unsupported SESSION_BACKEND {name!r}; use one of {', '.join(ENGINES)}")
+    if cache is None:
+        shared = environ.get("CACHE_BACKEND", "locmem").lower() not in ("locmem", "dummy")
+    else:
+        shared = cache["BACKEND"] not in LOCAL_CACHES
+    if name in ("cache", "cached_db") and not shared:
+        if requested:
+            warnings.warn(f"SESSION_BACKEND={name} needs a shared CACHE_BACKEND; using db")
+        name = "db"
+    return ENGINES[name]
+
+
+def _shorten(value):
+    if isinstance(value, dict):
+        compact = {}
+        for key, item in value.items():
+            if key == "_auth_user_backend":
+                item = _BACKENDS.get(item, item)
+            if key in _KEYS:
+                key = _KEYS[key]
+            elif isinstance(key, str) and key.startswith(ALIAS):
+                key = ALIAS + key
+            compact[key] = _shorten(item)
+        return compact
+    if isinstance(value, list):
+        return [_shorten(item) for item in value]
+    return value
+
+
+def _expand(value):
+    if isinstance(value, dict):
+        full = {}
+        for key, item in value.items():
+            if key.startswith(ALIAS + ALIAS):
+                key = key[1:]
+            elif key.startswith(ALIAS):
+                key = _NAMES.get(key, key)
+            if key == "_auth_user_backend":
+                item = _BACKEND_NAMES.get(item, item)
+            full[key] = _expand(item)
+        return full
+    if isinstance(value, list):
+        return [_expand(item) for item in value]
+    return value
+
+
+class CompactJSONSerializer(signing.JSONSerializer):
+    """
+    JSON with the site's well-known keys shortened. Sessions written by the
+    plain JSONSerializer load unchanged, so switching needs no migration.
+    """
+
+    def dumps(self, obj):
+        return super().dumps(_shorten(obj))
+
+    def loads(self, data):
+        return _expand(super().loads(data))
@@ -10,8 +10,14 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .cache import cache_config
+from .database import database_config, replica_configs
+from .payments import payment_gateway_config
+from .sessions import session_engine
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -38,17 +44,20 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'rest_framework.authtoken',
     # 'corsheaders',  # Temporarily disabled
     'accounts',
     'products',
     'orders',
     'cart',
     'bargaining',
+    'assets',
 ]
 
 MIDDLEWARE = [
     # 'corsheaders.middleware.CorsMiddleware',  # Temporarily disabled
     'django.middleware.security.SecurityMiddleware',
+    'crazycart.replicas.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -69,6 +78,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'cart.context_processors.cart_summary',
             ],
         },
     },
@@ -79,15 +89,61 @@ WSGI_APPLICATION = 'crazycart.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# Set DB_ENGINE=postgres and friends to leave SQLite; see crazycart/database.py
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR),
+    **replica_configs(BASE_DIR),
+}
+
+# Reads go to a replica unless pinned to the primary; see crazycart/replicas.py
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['crazycart.replicas.ReplicaRouter']
+# How long a browser keeps reading from the primary after it wrote something
+REPLICA_PIN_SECONDS = 10
+
+
+# Cache
+# Set CACHE_BACKEND=redis (or memcached/file) to share it between processes; see crazycart/cache.py
+
+CACHES = {
+    'default': cache_config(BASE_DIR),
 }
 
 
+# Sessions
+# cached_db with a shared cache, otherwise db. Set SESSION_BACKEND=signed_cookies (or db/cache)
+# to change engines; see crazycart/sessions.py
+
+SESSION_ENGINE = session_engine(cache=CACHES['default'])
+SESSION_SERIALIZER = 'crazycart.sessions.CompactJSONSerializer'
+
+
+# Cart and checkout
+
+# Carts of visitors who never sign in are removed after this long; see cart/guest.py
+GUEST_CART_MAX_AGE = 60 * 60 * 24 * 30
+
+# How long stock is held for an order waiting on its online payment; see orders/reservations.py
+STOCK_RESERVATION_SECONDS = 15 * 60
+
+# Payment retries with the same Idempotency-Key get the stored response; see orders/idempotency.py
+IDEMPOTENCY_LOCK_SECONDS = 30
+IDEMPOTENCY_KEY_MAX_AGE = 60 * 60 * 24
+
+# Who charges online payments; set PAYMENT_SIM_* to add latency, declines and webhooks.
+# See crazycart/payments.py and orders/payments.py
+PAYMENT_GATEWAY = payment_gateway_config(SECRET_KEY)
+
+# Key carriers sign tracking webhooks with, and how long after shipping a
+# delivery is expected when the carrier gives no estimate; see orders/tracking.py
+CARRIER_WEBHOOK_SECRET = os.environ.get("CARRIER_WEBHOOK_SECRET") or f"carrier-webhooks:{SECRET_KEY}"
+DELIVERY_ESTIMATE_DAYS = 5
+
+# Finished orders unchanged for this long move to the order archive; see orders/archive.py
+ORDER_ARCHIVE_AFTER_DAYS = 180
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -122,12 +178,60 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
-STATICFILES_DIRS = [BASE_DIR / 'static']
+# build_assets writes bundles to ASSET_BUILD_DIR; collectstatic picks them up from there
+ASSET_BUILD_DIR = BASE_DIR / 'build'
+STATICFILES_DIRS = [BASE_DIR / 'static', ASSET_BUILD_DIR]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Hashed file names in STATIC_ROOT can be served with
+# "Cache-Control: public, max-age=31536000, immutable" and, with
+# gzip_static/brotli_static, from the precompressed variants
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'assets.storage.BundleManifestStorage',
+    },
+    # Seller catalogs waiting for run_product_imports; never served
+    'product_imports': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {'location': BASE_DIR / 'private'},
+    },
+}
+
+# Per-page entry points, in load order; see `{% bundle %}` and build_assets
+ASSET_BUNDLES = {
+    'site.css': ['css/style.css'],
+    'site.js': [
+        'js/common.js',
+        'js/ui.js',
+        'js/cart.js',
+        'js/wishlist.js',
+        'js/product.js',
+        'js/search.js',
+        'js/bargaining.js',
+        'js/main-new.js',
+    ],
+    'product-detail.js': ['js/product-detail.js'],
+    'checkout.js': ['js/checkout.js'],
+    'buy-now-checkout.js': ['js/buy_now_checkout.js'],
+}
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Upload names can be reused after a delete, so media is revalidated rather than immutable
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24
+# Upload directories /media/ serves; front-end servers should expose only these as well
+MEDIA_PUBLIC_DIRS = ['products', 'categories', 'avatars']
+
+# Local image references in bulk product imports are resolved inside this directory
+PRODUCT_IMPORT_IMAGE_ROOT = BASE_DIR / 'private' / 'imports' / 'images'
+# Image URLs in imports are only fetched from public addresses; set domains here to also limit the hosts
+PRODUCT_IMPORT_IMAGE_HOSTS = []
+# run_product_imports fails imports still "running" after this many seconds; their worker is gone
+PRODUCT_IMPORT_STALE_AFTER = 60 * 60
 
 # Email settings (for order confirmation)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
@@ -147,6 +251,11 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.URLPathVersioning',
+    'ALLOWED_VERSIONS': ['v1'],
+    'DEFAULT_VERSION': 'v1',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.CreatedAtCursorPagination',
+    'PAGE_SIZE': 20,
 }
 
 # Login/Logout URLs
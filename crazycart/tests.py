@@ -0,0 +1,243 @@
+from datetime import timedelta
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.sessions.models import Session
+from django.core import signing
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import transaction
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from products.models import Product
+
+from .cache import CacheNamespace, cache_config, cache_stats
+from .database import database_config, replica_configs
+from .replicas import PIN_COOKIE, ReplicaPinMiddleware, ReplicaRouter, pinned_to_primary, use_primary
+from .sessions import CompactJSONSerializer, session_engine
+
+
+class DatabaseConfigTests(SimpleTestCase):
+    def test_sqlite_default(self):
+        config = database_config(Path("/srv"), {})
+        self.assertEqual(config["NAME"], Path("/srv/db.sqlite3"))
+        self.assertEqual(config["PRAGMAS"]["journal_mode"], "WAL")
+
+    def test_sqlite_from_environment(self):
+        config = database_config(Path("/srv"), {"DB_NAME": "/data/shop.sqlite3", "DB_SQLITE_JOURNAL": "DELETE"})
+        self.assertEqual(config["NAME"], "/data/shop.sqlite3")
+        self.assertEqual(config["PRAGMAS"]["journal_mode"], "DELETE")
+        self.assertEqual(config["OPTIONS"]["transaction_mode"], "IMMEDIATE")
+        self.assertEqual(config["OPTIONS"]["timeout"], 5)
+
+    def test_postgres_from_environment(self):
+        environ = {
+            "DB_ENGINE": "PostgreSQL",
+            "DB_NAME": "shop",
+            "DB_USER": "cart",
+            "DB_HOST": "db",
+            "DB_PORT": "5433",
+            "DB_CONN_MAX_AGE": "",
+        }
+        config = database_config(Path("/srv"), environ)
+        self.assertEqual(config["ENGINE"], "django.db.backends.postgresql")
+        self.assertEqual(
+            (config["NAME"], config["USER"], config["HOST"], config["PORT"]), ("shop", "cart", "db", "5433")
+        )
+        self.assertEqual(config["CONN_MAX_AGE"], 60)
+        self.assertTrue(config["CONN_HEALTH_CHECKS"])
+        self.assertNotIn("pool", config["OPTIONS"])
+
+    def test_postgres_pool(self):
+        config = database_config(Path("/srv"), {"DB_ENGINE": "postgres", "DB_POOL_MAX_SIZE": "10"})
+        self.assertEqual(config["CONN_MAX_AGE"], 0)
+        self.assertEqual(config["OPTIONS"]["pool"]["max_size"], 10)
+
+    def test_replicas(self):
+        configs = replica_configs(
+            Path("/srv"), {"DB_ENGINE": "postgres", "DB_HOST": "primary", "DB_REPLICAS": "r1, r2:6432"}
+        )
+        self.assertEqual(list(configs), ["replica_1", "replica_2"])
+        self.assertEqual((configs["replica_2"]["HOST"], configs["replica_2"]["PORT"]), ("r2", "6432"))
+        self.assertEqual(configs["replica_1"]["TEST"], {"MIRROR": "default"})
+
+    def test_sqlite_replicas_are_files(self):
+        configs = replica_configs(Path("/srv"), {"DB_REPLICAS": "/replicas/a.sqlite3"})
+        self.assertEqual(configs["replica_1"]["NAME"], "/replicas/a.sqlite3")
+        self.assertEqual(configs["replica_1"]["PRAGMAS"]["journal_mode"], "WAL")
+
+    def test_pool_keeps_fewer_connections_than_its_size(self):
+        config = database_config(Path("/srv"), {"DB_ENGINE": "postgres", "DB_POOL_MAX_SIZE": "1"})
+        self.assertEqual(config["OPTIONS"]["pool"], {"min_size": 1, "max_size": 1, "timeout": 10})
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            database_config(Path("/srv"), {"DB_ENGINE": "mysql"})
+
+
+class SQLitePragmaTests(SimpleTestCase):
+    def pragmas(self, environ):
+        with tempfile.TemporaryDirectory() as directory:
+            config = database_config(Path(directory), environ)
+            connection = ConnectionHandler({"default": {}, "pragmas": config})["pragmas"]
+            try:
+                with connection.cursor() as cursor:
+                    values = {}
+                    for name in ("journal_mode", "busy_timeout", "synchronous", "temp_store", "cache_size"):
+                        cursor.execute(f"PRAGMA {name}")
+                        values[name] = cursor.fetchone()[0]
+                    return values
+            finally:
+                connection.close()
+
+    def test_new_connections_are_tuned(self):
+        self.assertEqual(
+            self.pragmas({}),
+            # synchronous NORMAL is 1, temp_store MEMORY is 2
+            {"journal_mode": "wal", "busy_timeout": 5000, "synchronous": 1, "temp_store": 2, "cache_size": -20000},
+        )
+
+    def test_journal_mode_from_environment(self):
+        self.assertEqual(self.pragmas({"DB_SQLITE_JOURNAL": "TRUNCATE"})["journal_mode"], "truncate")
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1"], REPLICA_PIN_SECONDS=10)
+class ReplicaRouterTests(TransactionTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(Product), "replica_1")
+        self.assertEqual(self.router.db_for_write(Product), "default")
+        self.assertEqual(self.router.db_for_read(Session), "default")
+
+    def test_pinned_reads_stay_on_primary(self):
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(Product), "default")
+        self.assertEqual(self.router.db_for_read(Product), "replica_1")
+
+    def test_transaction_reads_stay_on_primary(self):
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(Product), "default")
+
+    def test_write_pins_following_requests(self):
+        middleware = ReplicaPinMiddleware(lambda request: HttpResponse(str(pinned_to_primary())))
+        factory = RequestFactory()
+
+        response = middleware(factory.get("/"))
+        self.assertEqual(response.content, b"False")
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        response = middleware(factory.post("/orders/create/"))
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertEqual(cookie["max-age"], 10)
+
+        request = factory.get("/orders/")
+        request.COOKIES[PIN_COOKIE] = cookie.value
+        self.assertEqual(middleware(request).content, b"True")
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests"}})
+class CacheNamespaceTests(SimpleTestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.namespace = CacheNamespace("test", timeout=60, negative_timeout=5)
+        self.calls = 0
+
+    def compute(self, value="value"):
+        def compute():
+            self.calls += 1
+            return value
+        return compute
+
+    def test_get_or_set_and_invalidate(self):
+        self.assertEqual(self.namespace.get_or_set("a", self.compute()), "value")
+        self.assertEqual(self.namespace.get_or_set("a", self.compute()), "value")
+        self.assertEqual(self.calls, 1)
+
+        self.namespace.invalidate()
+        self.namespace.get_or_set("a", self.compute())
+        self.assertEqual(self.calls, 2)
+
+    def test_negative_caching(self):
+        self.assertIsNone(self.namespace.get_or_set("missing", self.compute(None)))
+        self.assertIsNone(self.namespace.get_or_set("missing", self.compute(None)))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.namespace.stats["negative_hit"], 1)
+
+    def test_expired_value_is_served_while_another_worker_recomputes(self):
+        self.namespace.get_or_set("a", self.compute("old"))
+        key = self.namespace.key("a")
+        value, expires, cost = caches["default"].get(key)
+        caches["default"].set(key, (value, 0, cost))
+        caches["default"].add(f"{key}:lock", 1)
+
+        self.assertEqual(self.namespace.get_or_set("a", self.compute("new")), "old")
+        self.assertEqual(self.namespace.stats["stale"], 1)
+
+        caches["default"].delete(f"{key}:lock")
+        self.assertEqual(self.namespace.get_or_set("a", self.compute("new")), "new")
+
+    def test_stats_are_shared(self):
+        self.namespace.get_or_set("a", self.compute())
+        self.namespace.get_or_set("a", self.compute())
+        stats = cache_stats()["test"]
+        self.assertEqual((stats["hit"], stats["miss"], stats["hit_ratio"]), (1, 1, 0.5))
+
+
+class SessionTests(SimpleTestCase):
+    session = {
+        "_auth_user_id": "3",
+        "_auth_user_backend": "django.contrib.auth.backends.ModelBackend",
+        "buy_now_item": {"product_id": 7, "quantity": 2, "total_price": "20.00"},
+        "~odd": 1,
+        "_messages": [{"product_id": "kept as a value"}],
+    }
+
+    def test_compact_round_trip(self):
+        serializer = CompactJSONSerializer()
+        data = serializer.dumps(self.session)
+        self.assertLess(len(data), len(signing.JSONSerializer().dumps(self.session)))
+        self.assertNotIn(b"ModelBackend", data)
+        self.assertEqual(serializer.loads(data), self.session)
+
+    def test_reads_plain_json_sessions(self):
+        data = signing.JSONSerializer().dumps({"_auth_user_id": "3", "pending_order_id": 9})
+        self.assertEqual(CompactJSONSerializer().loads(data), {"_auth_user_id": "3", "pending_order_id": 9})
+
+    def test_engine_from_environment(self):
+        self.assertTrue(session_engine({"CACHE_BACKEND": "redis"}).endswith(".cached_db"))
+        self.assertTrue(session_engine({"SESSION_BACKEND": "signed_cookies"}).endswith(".signed_cookies"))
+        with self.assertRaises(ValueError):
+            session_engine({"SESSION_BACKEND": "files"})
+
+    def test_cache_engines_need_a_shared_cache(self):
+        self.assertTrue(session_engine({}).endswith(".db"))
+        for name in ("cache", "cached_db"):
+            with self.assertWarns(UserWarning):
+                self.assertTrue(session_engine({"SESSION_BACKEND": name}).endswith(".db"))
+
+    def test_engine_follows_the_configured_cache(self):
+        # CACHE_BACKEND=redis without the redis package ends up on locmem
+        locmem = cache_config(Path("/srv"), {"CACHE_BACKEND": "locmem"})
+        self.assertTrue(session_engine({"CACHE_BACKEND": "redis"}, cache=locmem).endswith(".db"))
+        shared = cache_config(Path("/srv"), {"CACHE_BACKEND": "file"})
+        self.assertTrue(session_engine({}, cache=shared).endswith(".cached_db"))
+
+
+@override_settings(SESSION_ENGINE="django.contrib.sessions.backends.db")
+class PurgeSessionsTests(TestCase):
+    def test_deletes_only_expired_sessions_in_batches(self):
+        now = timezone.now()
+        for number in range(5):
+            Session.objects.create(session_key=f"old{number}", session_data="", expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key="live", session_data="", expire_date=now + timedelta(days=1))
+
+        out = StringIO()
+        call_command("purge_sessions", batch_size=2, stdout=out)
+        self.assertIn("Deleted 5 expired sessions", out.getvalue())
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), ["live"])
@@ -1,7 +1,11 @@
 from django.shortcuts import render
 from products.models import Product, Category
+from products.rankings import get_ranked_products
+from products.conditional import catalog_conditional
+from products.categories import get_category_tree
 from django.db.models import Q, Count
 
+@catalog_conditional()
 def home_view(request):
     """
     Home page view that displays featured products and categories
@@ -13,11 +17,17 @@ def home_view(request):
     ).select_related('category', 'seller').order_by('-created_at')[:6]
     
     # Get categories for the category section
-    categories = Category.objects.filter(is_active=True)[:8]
+    categories = get_category_tree().roots[:8]
+    
+    # Precomputed by the rank_products job
+    trending_products = get_ranked_products('trending', limit=6)
+    best_sellers = get_ranked_products('best_seller', limit=6)
     
     context = {
         'featured_products': featured_products,
         'categories': categories,
+        'trending_products': trending_products,
+        'best_sellers': best_sellers,
     }
     
     return render(request, 'index.html', context)
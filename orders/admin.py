@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from orders.models import Order
+from orders.models import ArchivedOrder, IdempotencyKey, Order, OutboxEvent, PaymentEvent, StockReservation
 
 # Register your models here.
 
@@ -9,4 +9,36 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "created_at", "updated_at", "status")
     list_filter = ("status", "created_at", "updated_at")
     search_fields = ("user__username", "id")
-    ordering = ("-created_at",)
\ No newline at end of file
+    ordering = ("-created_at",)
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ("order", "product", "quantity", "expires_at")
+    list_filter = ("expires_at",)
+    raw_id_fields = ("order", "product")
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ("key", "user", "status_code", "created_at", "completed_at")
+    search_fields = ("key", "user__username")
+    raw_id_fields = ("user",)
+
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(admin.ModelAdmin):
+    list_display = ("event_id", "provider", "event_type", "outcome", "payment", "received_at")
+    list_filter = ("provider", "event_type", "outcome")
+    search_fields = ("event_id", "payment__transaction_id")
+    raw_id_fields = ("payment",)
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "topic", "stream", "attempts", "created_at", "delivered_at")
+    list_filter = ("topic", "delivered_at")
+    search_fields = ("key", "stream")
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ("order_number", "user", "status", "total_amount", "created_at", "archived_at")
+    list_filter = ("status", "archived_at")
+    search_fields = ("order_number", "user__username")
+    raw_id_fields = ("user",)
@@ -0,0 +1,143 @@
+"""
+Archival of finished orders.
+
+Delivered, cancelled and refunded orders that have not changed for
+ORDER_ARCHIVE_AFTER_DAYS are moved, a batch at a time, from the live
+order tables into ArchivedOrder, so the tables that order listings and
+checkout work on only hold orders that can still change. An archived
+order keeps everything the buyer saw (items, payment, tracking) in one
+JSON snapshot. The buyer's order and tracking pages and the seller's
+order pages and export fall back to it, finding a seller's archived
+orders through ArchivedOrder.sellers. Product rankings and related
+product lists only count live orders: an archived sale is at least
+ORDER_ARCHIVE_AFTER_DAYS old, past what either is meant to reflect.
+Run it with the archive_orders command.
+"""
+from django.db import transaction
+
+from accounts.addresses import ADDRESS_FIELDS
+from accounts.models import Address, User
+from products.models import Product
+
+from .models import ArchivedOrder, Order, OrderItem, OrderTracking, Payment
+
+ARCHIVE_STATUSES = ("delivered", "cancelled", "refunded")
+
+
+def _row(instance):
+    return {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+
+
+def _instance(model, row):
+    """An unsaved `model` from a snapshot row, with its values converted back"""
+    return model(
+        **{
+            field.attname: field.to_python(row[field.attname])
+            for field in model._meta.concrete_fields
+            if field.attname in row
+        }
+    )
+
+
+def snapshot(order):
+    """Everything worth keeping about an order, as JSON-ready data"""
+    items = []
+    for item in order.items.all():
+        row = _row(item)
+        row["product"] = {"name": item.product.name, "slug": item.product.slug, "sku": item.product.sku}
+        row["seller"] = {"username": item.seller.username}
+        items.append(row)
+    try:
+        payment = _row(order.payment)
+    except Payment.DoesNotExist:
+        payment = None
+    return {
+        "order": _row(order),
+        "shipping": {field: getattr(order.shipping, field) for field in ADDRESS_FIELDS},
+        "billing": {field: getattr(order.billing, field) for field in ADDRESS_FIELDS},
+        "items": items,
+        "payment": payment,
+        "tracking": [_row(entry) for entry in order.tracking_updates.all()],
+    }
+
+
+def unpack(archived):
+    """(order, items, tracking entries) rebuilt from an archived order, for display only"""
+    data = archived.data
+    order = _instance(Order, data["order"])
+    for kind in ("shipping", "billing"):
+        # Orders archived before addresses moved out of Order kept them as columns
+        fields = data.get(kind) or {field: data["order"].get(f"{kind}_{field}", "") for field in ADDRESS_FIELDS}
+        setattr(order, kind, Address(**fields))
+    items = []
+    for row in data["items"]:
+        item = _instance(OrderItem, row)
+        item.product = Product(id=row["product_id"], **row["product"])
+        item.seller = User(id=row["seller_id"], **row["seller"])
+        items.append(item)
+    tracking = [_instance(OrderTracking, row) for row in data["tracking"]]
+    return order, items, tracking
+
+
+def unpack_for_seller(archived, seller):
+    """(order, the seller's items, all items) from an archived order, for display only"""
+    order, items, _ = unpack(archived)
+    order.user = archived.user
+    for item in items:
+        item.order = order
+    return order, [item for item in items if item.seller_id == seller.id], items
+
+
+def archivable(older_than):
+    return Order.objects.filter(status__in=ARCHIVE_STATUSES, updated_at__lt=older_than)
+
+
+def archive_batch(older_than, batch_size=500):
+    """Archive up to `batch_size` of the oldest archivable orders; returns how many"""
+    with transaction.atomic():
+        orders = list(
+            archivable(older_than)
+            .select_for_update(of=("self",))
+            .select_related("shipping", "billing")
+            .order_by("id")
+            .prefetch_related("items__product", "items__seller", "payment", "tracking_updates")[:batch_size]
+        )
+        if not orders:
+            return 0
+        ArchivedOrder.objects.bulk_create(
+            ArchivedOrder(
+                order_number=order.order_number,
+                user_id=order.user_id,
+                status=order.status,
+                total_amount=order.total_amount,
+                created_at=order.created_at,
+                data=snapshot(order),
+            )
+            for order in orders
+        )
+        archived_ids = dict(
+            ArchivedOrder.objects.filter(order_number__in=[order.order_number for order in orders]).values_list(
+                "order_number", "id"
+            )
+        )
+        Sellers = ArchivedOrder.sellers.through
+        Sellers.objects.bulk_create(
+            Sellers(archivedorder_id=archived_ids[order.order_number], user_id=seller_id)
+            for order in orders
+            for seller_id in {item.seller_id for item in order.items.all()}
+        )
+        # Items, payments, tracking and reservations go with their order
+        Order.objects.filter(id__in=[order.id for order in orders]).delete()
+    return len(orders)
+
+
+def archive_orders(older_than, batch_size=500, max_batches=None):
+    """Archive batch after batch until no order is left to archive; returns the count"""
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(older_than, batch_size)
+        if not count:
+            break
+        archived += count
+        batches += 1
+    return archived
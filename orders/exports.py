@@ -0,0 +1,140 @@
+import csv
+import heapq
+import json
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import ArchivedOrder, Order, OrderItem
+
+# Column name -> OrderItem lookup, in export order
+EXPORT_COLUMNS = [
+    ("order_number", "order__order_number"),
+    ("product", "product__name"),
+    ("sku", "product__sku"),
+    ("quantity", "quantity"),
+    ("price", "price_at_time"),
+    ("total_price", "total_price"),
+    ("status", "status"),
+    ("tracking_number", "tracking_number"),
+    ("created_at", "created_at"),
+    ("updated_at", "updated_at"),
+    ("shipped_at", "shipped_at"),
+    ("delivered_at", "delivered_at"),
+]
+
+EXPORT_FORMATS = ("csv", "jsonl")
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object that returns what is written instead of buffering it"""
+
+    def write(self, value):
+        return value
+
+
+def parse_export_date(value, end_of_day=False):
+    """Parse a date or datetime string into an aware datetime, or None"""
+    if not value:
+        return None
+
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        parsed = datetime.combine(day, time.max if end_of_day else time.min)
+
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def seller_export_queryset(seller, status=None, date_from=None, date_to=None):
+    """
+    Flat rows of a seller's order items, ordered to match the
+    (seller, status, created_at) / (seller, created_at) indexes.
+    """
+    items = OrderItem.objects.filter(seller=seller)
+
+    if status:
+        valid_statuses = [choice[0] for choice in Order.STATUS_CHOICES]
+        if status not in valid_statuses:
+            raise ValueError(f"Invalid status: {status}")
+        items = items.filter(status=status)
+    if date_from:
+        items = items.filter(created_at__gte=date_from)
+    if date_to:
+        items = items.filter(created_at__lte=date_to)
+
+    return items.order_by("created_at", "id").values_list(
+        *[lookup for _, lookup in EXPORT_COLUMNS]
+    )
+
+
+def _lookup(item, lookup):
+    value = item
+    for name in lookup.split("__"):
+        value = getattr(value, name)
+    return value
+
+
+def archived_export_rows(seller, status=None, date_from=None, date_to=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """The seller's items in archived orders, as seller_export_queryset rows"""
+    from .archive import unpack_for_seller
+
+    archived_orders = ArchivedOrder.objects.filter(sellers=seller).select_related("user").order_by("created_at", "id")
+    for archived in archived_orders.iterator(chunk_size=chunk_size):
+        _, items, _ = unpack_for_seller(archived, seller)
+        for item in sorted(items, key=lambda item: (item.created_at, item.id)):
+            if status and item.status != status:
+                continue
+            if (date_from and item.created_at < date_from) or (date_to and item.created_at > date_to):
+                continue
+            yield tuple(_lookup(item, lookup) for _, lookup in EXPORT_COLUMNS)
+
+
+def seller_export_rows(seller, status=None, date_from=None, date_to=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Live and archived export rows for a seller, merged oldest first"""
+    live = seller_export_queryset(seller, status, date_from, date_to).iterator(chunk_size=chunk_size)
+    archived = archived_export_rows(seller, status, date_from, date_to, chunk_size)
+    created_at = [name for name, _ in EXPORT_COLUMNS].index("created_at")
+    return heapq.merge(archived, live, key=lambda row: row[created_at])
+
+
+def _format_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def iter_csv(rows):
+    """Yield CSV lines (header first) without holding the result set in memory"""
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow([_format_value(value) for value in row])
+
+
+def iter_jsonl(rows):
+    """Yield one JSON object per line"""
+    names = [name for name, _ in EXPORT_COLUMNS]
+    for row in rows:
+        record = {
+            name: (value if value is None or isinstance(value, int) else _format_value(value))
+            for name, value in zip(names, row)
+        }
+        yield json.dumps(record) + "\n"
+
+
+def iter_export(rows, export_format):
+    if export_format == "csv":
+        return iter_csv(rows)
+    if export_format == "jsonl":
+        return iter_jsonl(rows)
+    raise ValueError(f"Unsupported export format: {export_format}")
@@ -0,0 +1,12 @@
+"""Handlers for outbox events; see orders.outbox"""
+import logging
+
+from .outbox import handler
+
+logger = logging.getLogger(__name__)
+
+
+@handler("*")
+def log_events(events):
+    for event in events:
+        logger.info("%s %s %s", event.topic, event.stream, event.payload)
@@ -0,0 +1,145 @@
+"""
+Idempotency keys for checkout and payment endpoints.
+
+The client sends a key it generated for one purchase attempt, in the
+Idempotency-Key header or an `idempotency_key` form/JSON field, and sends
+the same key again when it retries. For each (user, key):
+
+- the first request runs the view, holding a lock on the key while it
+  runs; a duplicate arriving meanwhile gets 409 instead of a second order;
+- a successful response is stored, and retries get it back unchanged
+  without running the view again;
+- a failed attempt (an error status or `"success": false`) is not stored,
+  so the buyer can fix the problem and retry with the same key.
+
+Requests without a key behave as before.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+FIELD = "idempotency_key"
+MAX_KEY_LENGTH = 100
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def request_key(request):
+    key = request.headers.get(HEADER) or request.POST.get(FIELD)
+    if not key and request.content_type == "application/json":
+        try:
+            body = json.loads(request.body)
+        except ValueError:
+            body = None
+        if isinstance(body, dict):
+            key = body.get(FIELD)
+    return str(key).strip()[:MAX_KEY_LENGTH] if key else None
+
+
+def request_fingerprint(request):
+    digest = hashlib.md5()
+    for part in (request.method.encode(), request.path.encode(), request.body):
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _refusal(message, status):
+    # The wrapped views report failures as either "message" or "error"
+    return JsonResponse({"success": False, "message": message, "error": message}, status=status)
+
+
+def _succeeded(response):
+    if response.status_code >= 400 or response.streaming:
+        return False
+    if response.get("Content-Type", "").startswith("application/json"):
+        try:
+            return json.loads(response.content).get("success") is not False
+        except (ValueError, AttributeError):
+            return False
+    return True
+
+
+def _claim(request, key, fingerprint):
+    """The key's record if this request may run the view, else a response to return"""
+    now = timezone.now()
+    lock_until = now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+    try:
+        record, created = IdempotencyKey.objects.get_or_create(
+            user=request.user,
+            key=key,
+            defaults={"fingerprint": fingerprint, "locked_until": lock_until},
+        )
+    except IntegrityError:
+        # Lost a race with a duplicate that created the key first
+        return _refusal("This request is already being processed", 409)
+    if created:
+        return record
+
+    if record.fingerprint != fingerprint:
+        return _refusal("This idempotency key was already used for a different request", 422)
+    if record.completed_at:
+        response = HttpResponse(
+            record.content, status=record.status_code, content_type=record.content_type
+        )
+        response[REPLAYED_HEADER] = "true"
+        return response
+    # Take over a key whose request died without finishing or giving it back
+    taken = IdempotencyKey.objects.filter(
+        id=record.id, completed_at=None, locked_until__lt=now
+    ).update(locked_until=lock_until)
+    if not taken:
+        return _refusal("This request is already being processed", 409)
+    return record
+
+
+def idempotent(view):
+    """Deduplicate POSTs to `view` that carry the same idempotency key"""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != "POST" or not request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        # Read the raw body before request.POST consumes it
+        fingerprint = request_fingerprint(request)
+        key = request_key(request)
+        if not key:
+            return view(request, *args, **kwargs)
+
+        claimed = _claim(request, key, fingerprint)
+        if not isinstance(claimed, IdempotencyKey):
+            return claimed
+
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            claimed.delete()
+            raise
+
+        if _succeeded(response):
+            IdempotencyKey.objects.filter(id=claimed.id).update(
+                status_code=response.status_code,
+                content_type=response.get("Content-Type", ""),
+                content=response.content.decode(response.charset or "utf-8"),
+                locked_until=None,
+                completed_at=timezone.now(),
+            )
+        else:
+            # Let the buyer retry once they fixed the problem
+            claimed.delete()
+        return response
+
+    return wrapper
+
+
+def purge_keys(older_than):
+    """Delete keys created before `older_than`; returns the count"""
+    return IdempotencyKey.objects.filter(created_at__lt=older_than).delete()[0]
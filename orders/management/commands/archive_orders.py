@@ -0,0 +1,33 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.archive import archivable, archive_orders
+
+
+class Command(BaseCommand):
+    help = "Move delivered, cancelled and refunded orders unchanged for --days into the order archive, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS)
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--max-batches", type=int, help="Stop after this many batches")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the orders that would move")
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(days=options["days"])
+        if options["dry_run"]:
+            self.stdout.write(f"{archivable(older_than).count()} orders would be archived")
+            return
+
+        start = time.perf_counter()
+        archived = archive_orders(older_than, options["batch_size"], options["max_batches"])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {archived} orders in {elapsed:.1f}s ({archived / elapsed if elapsed else 0:.0f}/s)"
+            )
+        )
@@ -0,0 +1,177 @@
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+
+from accounts.models import User
+from cart.models import Cart, CartItem
+from orders.models import Order, PaymentEvent
+from products.models import Category, Product
+
+SHIPPING = {
+    "shipping_name": "Bench Buyer",
+    "shipping_email": "bench@example.com",
+    "shipping_phone": "0100000000",
+    "shipping_address": "Road 1",
+    "shipping_city": "Dhaka",
+    "shipping_country": "Bangladesh",
+}
+
+
+def percentile(values, share):
+    return values[max(int(len(values) * share) - 1, 0)] if values else 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Run whole online checkouts through the views (payment page, charge, webhook) "
+        "against the payment simulator and report latency and outcomes. "
+        "Creates and removes its own buyers and product; use a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyers", type=int, default=50)
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--latency-ms", type=float, default=150, help="Time each charge takes")
+        parser.add_argument("--failure-rate", type=float, default=0.05, help="Share of charges declined")
+        parser.add_argument("--webhooks", choices=("off", "inline", "thread"), default="thread")
+        parser.add_argument("--webhook-delay-ms", type=float, default=200)
+        parser.add_argument("--duplicate-rate", type=float, default=0.1, help="Share of webhooks sent twice")
+        parser.add_argument("--settle-timeout", type=float, default=10, help="Seconds to wait for a webhook")
+
+    def setup(self, count):
+        tag = uuid.uuid4().hex[:8]
+        seller = User.objects.create_user(f"bench-seller-{tag}", user_type="seller")
+        category, _ = Category.objects.get_or_create(name="Bench")
+        product = Product.objects.create(
+            seller=seller,
+            category=category,
+            name=f"Bench product {tag}",
+            description="Created by bench_checkout",
+            price=Decimal("10.00"),
+            stock_quantity=count * 10,
+        )
+        buyers = []
+        for number in range(count):
+            buyer = User.objects.create_user(f"bench-buyer-{tag}-{number}")
+            cart = Cart.objects.create(user=buyer)
+            CartItem.objects.create(cart=cart, product=product, quantity=1, price_at_time=product.price)
+            buyers.append(buyer)
+        return seller, product, buyers
+
+    def checkout(self, buyer, timeout):
+        """Returns (outcome, {stage: ms})"""
+        client = Client()
+        client.force_login(buyer)
+        start = time.perf_counter()
+        response = client.post("/cart/online-checkout/", SHIPPING)
+        order = Order.objects.filter(user=buyer).order_by("-id").first()
+        if response.status_code != 200 or order is None:
+            return "checkout_failed", {}
+        paying = time.perf_counter()
+
+        data = client.post(
+            "/orders/complete-cart-payment/",
+            {"order_id": order.id, "payment_method": "credit_card"},
+            content_type="application/json",
+            headers={"Idempotency-Key": uuid.uuid4().hex},
+        ).json()
+        charged = time.perf_counter()
+        timings = {"checkout": (paying - start) * 1000, "charge": (charged - paying) * 1000}
+        if not data["success"]:
+            return ("failed" if "declined" in data["error"] else "error"), timings
+
+        status = {"payment_status": "paid"}
+        while data.get("pending"):
+            status = client.get(data["status_url"]).json()
+            if status["payment_status"] != "pending":
+                break
+            if time.perf_counter() - charged > timeout:
+                return "timeout", timings
+            time.sleep(0.05)
+        timings["settle"] = (time.perf_counter() - paying) * 1000
+        return status["payment_status"], timings
+
+    def worker(self, buyers, timeout, outcomes, timings):
+        try:
+            while True:
+                with self.lock:
+                    if not buyers:
+                        return
+                    buyer = buyers.pop()
+                outcome, stages = self.checkout(buyer, timeout)
+                with self.lock:
+                    outcomes[outcome] += 1
+                    for stage, ms in stages.items():
+                        timings.setdefault(stage, []).append(ms)
+        finally:
+            connections.close_all()
+
+    def handle(self, *args, **options):
+        self.lock = threading.Lock()
+        gateway = dict(
+            settings.PAYMENT_GATEWAY,
+            BACKEND="orders.payments.SimulatedGateway",
+            OPTIONS={
+                "latency_ms": options["latency_ms"],
+                "failure_rate": options["failure_rate"],
+                "webhooks": options["webhooks"],
+                "webhook_delay_ms": options["webhook_delay_ms"],
+                "duplicate_rate": options["duplicate_rate"],
+            },
+        )
+        seller, product, buyers = self.setup(options["buyers"])
+        stock = product.stock_quantity
+        outcomes, timings = Counter(), {}
+        try:
+            with override_settings(PAYMENT_GATEWAY=gateway, ALLOWED_HOSTS=["testserver"]):
+                queue = list(buyers)
+                threads = [
+                    threading.Thread(
+                        target=self.worker, args=(queue, options["settle_timeout"], outcomes, timings)
+                    )
+                    for _ in range(options["concurrency"])
+                ]
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+                # Let webhooks still in flight land before counting
+                time.sleep(options["webhook_delay_ms"] / 1000 + 0.5)
+
+            orders = Order.objects.filter(user__in=buyers)
+            paid = orders.filter(payment_status="paid").count()
+            events = PaymentEvent.objects.filter(payment__order__in=orders)
+            product.refresh_from_db()
+
+            self.stdout.write(f"{options['buyers']} checkouts in {elapsed:.1f}s ({options['buyers'] / elapsed:.1f}/s)")
+            self.stdout.write(f"{'stage':10} {'mean ms':>9} {'p95 ms':>9}")
+            for stage in ("checkout", "charge", "settle"):
+                values = sorted(timings.get(stage, []))
+                if values:
+                    self.stdout.write(f"{stage:10} {statistics.mean(values):9.1f} {percentile(values, 0.95):9.1f}")
+            self.stdout.write("Outcomes: " + ", ".join(f"{name} {count}" for name, count in sorted(outcomes.items())))
+            self.stdout.write(
+                f"Webhook events applied: {events.count()} "
+                f"({events.filter(outcome='paid').count()} confirmed payments)"
+            )
+            if stock - product.stock_quantity == paid and outcomes["paid"] <= paid:
+                self.stdout.write(self.style.SUCCESS(f"{paid} orders paid, stock taken exactly once for each"))
+            else:
+                self.stdout.write(
+                    self.style.ERROR(f"{paid} orders paid but stock went down by {stock - product.stock_quantity}")
+                )
+        finally:
+            Order.objects.filter(user__in=buyers).delete()
+            User.objects.filter(id__in=[buyer.id for buyer in buyers]).delete()
+            product.delete()
+            seller.delete()
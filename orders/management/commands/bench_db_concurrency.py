@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+from crazycart.database import SQLITE_PRAGMAS
+
+BENCH_ALIAS = "bench"
+
+SETUP_SQL = [
+    "DROP TABLE IF EXISTS bench_stock",
+    "DROP TABLE IF EXISTS bench_order",
+    "CREATE TABLE bench_stock (id INTEGER PRIMARY KEY, quantity INTEGER NOT NULL)",
+    "CREATE TABLE bench_order (id INTEGER PRIMARY KEY, product_id INTEGER NOT NULL, quantity INTEGER NOT NULL)",
+]
+TEARDOWN_SQL = ["DROP TABLE bench_stock", "DROP TABLE bench_order"]
+
+
+def sqlite_modes(path):
+    base = {"ENGINE": "django.db.backends.sqlite3", "NAME": path}
+    return [
+        ("sqlite rollback journal", dict(base, PRAGMAS={"journal_mode": "DELETE"})),
+        (
+            "sqlite WAL + pragmas",
+            dict(base, PRAGMAS=SQLITE_PRAGMAS, OPTIONS={"timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000}),
+        ),
+        (
+            "sqlite WAL + IMMEDIATE",
+            dict(
+                base,
+                PRAGMAS=SQLITE_PRAGMAS,
+                OPTIONS={"timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000, "transaction_mode": "IMMEDIATE"},
+            ),
+        ),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent checkout-like write transactions (stock decrement + order insert) "
+        "alongside readers and report throughput and lock errors per database mode"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=8)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--transactions", type=int, default=200, help="Per writer")
+        parser.add_argument(
+            "--default", action="store_true", help="Also run against DATABASES['default'] (e.g. Postgres)"
+        )
+
+    def use(self, settings_dict):
+        connections.close_all()
+        connections.settings[BENCH_ALIAS] = settings_dict
+        connections.configure_settings(connections.settings)
+        if hasattr(connections._connections, BENCH_ALIAS):
+            delattr(connections._connections, BENCH_ALIAS)
+
+    def writer(self, count, totals):
+        stats = Counter()
+        connection = connections[BENCH_ALIAS]
+        for i in range(count):
+            try:
+                with transaction.atomic(using=BENCH_ALIAS):
+                    with connection.cursor() as cursor:
+                        # Read first, as checkout does; upgrading that read lock is where
+                        # deferred SQLite transactions deadlock
+                        cursor.execute("SELECT quantity FROM bench_stock WHERE id = %s", [i % 10])
+                        cursor.execute("UPDATE bench_stock SET quantity = quantity - 1 WHERE id = %s", [i % 10])
+                        cursor.execute("INSERT INTO bench_order (product_id, quantity) VALUES (%s, 1)", [i % 10])
+                stats["committed"] += 1
+            except OperationalError:
+                stats["errors"] += 1
+        connection.close()
+        with self.lock:
+            totals.update(stats)
+
+    def reader(self, stop, totals):
+        stats = Counter()
+        connection = connections[BENCH_ALIAS]
+        while not stop.is_set():
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT COUNT(*), SUM(quantity) FROM bench_order")
+                    cursor.fetchone()
+                stats["reads"] += 1
+            except OperationalError:
+                stats["read_errors"] += 1
+        connection.close()
+        with self.lock:
+            totals.update(stats)
+
+    def run(self, label, settings_dict, options):
+        self.use(settings_dict)
+        with connections[BENCH_ALIAS].cursor() as cursor:
+            for sql in SETUP_SQL:
+                cursor.execute(sql)
+            cursor.executemany(
+                "INSERT INTO bench_stock (id, quantity) VALUES (%s, %s)", [(i, 10**6) for i in range(10)]
+            )
+        connections[BENCH_ALIAS].close()
+
+        stats = Counter()
+        stop = threading.Event()
+        readers = [threading.Thread(target=self.reader, args=(stop, stats)) for _ in range(options["readers"])]
+        writers = [
+            threading.Thread(target=self.writer, args=(options["transactions"], stats))
+            for _ in range(options["writers"])
+        ]
+        start = time.perf_counter()
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        for thread in readers:
+            thread.join()
+
+        with connections[BENCH_ALIAS].cursor() as cursor:
+            for sql in TEARDOWN_SQL:
+                cursor.execute(sql)
+        connections[BENCH_ALIAS].close()
+
+        self.stdout.write(
+            f"{label:26} {stats['committed'] / elapsed:9.0f} {stats['committed']:9} "
+            f"{stats['errors']:7} {stats['reads'] / elapsed:9.0f} {stats['read_errors']:7}"
+        )
+
+    def handle(self, *args, **options):
+        self.lock = threading.Lock()
+        self.stdout.write(
+            f"{'mode':26} {'commits/s':>9} {'commits':>9} {'locked':>7} {'reads/s':>9} {'r-err':>7}"
+        )
+        tmpdir = tempfile.mkdtemp()
+        try:
+            for label, settings_dict in sqlite_modes(os.path.join(tmpdir, "bench.sqlite3")):
+                self.run(label, settings_dict, options)
+                for suffix in ("", "-wal", "-shm"):
+                    path = os.path.join(tmpdir, "bench.sqlite3" + suffix)
+                    if os.path.exists(path):
+                        os.remove(path)
+            if options["default"]:
+                default = connections["default"].settings_dict
+                self.run(f"default ({connections['default'].vendor})", dict(default), options)
+        finally:
+            connections.close_all()
+            shutil.rmtree(tmpdir)
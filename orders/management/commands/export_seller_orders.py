@@ -0,0 +1,56 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from orders.exports import (
+    seller_export_rows,
+    iter_export,
+    parse_export_date,
+    EXPORT_FORMATS,
+    DEFAULT_CHUNK_SIZE,
+)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Export a seller's order items as CSV or JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("seller", help="Seller username")
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+        parser.add_argument("--status", help="Only export items with this status")
+        parser.add_argument("--from", dest="date_from", help="Start date (YYYY-MM-DD)")
+        parser.add_argument("--to", dest="date_to", help="End date (YYYY-MM-DD)")
+        parser.add_argument("--output", "-o", help="Output file (defaults to stdout)")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            seller = User.objects.get(username=options["seller"], user_type="seller")
+        except User.DoesNotExist:
+            raise CommandError(f"Seller '{options['seller']}' not found")
+
+        try:
+            rows = seller_export_rows(
+                seller,
+                status=options["status"],
+                date_from=parse_export_date(options["date_from"]),
+                date_to=parse_export_date(options["date_to"], end_of_day=True),
+                chunk_size=options["chunk_size"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        lines = iter_export(rows, options["format"])
+
+        if options["output"]:
+            count = 0
+            with open(options["output"], "w", newline="", encoding="utf-8") as f:
+                for line in lines:
+                    f.write(line)
+                    count += 1
+            self.stderr.write(f"Wrote {count} lines to {options['output']}")
+        else:
+            for line in lines:
+                sys.stdout.write(line)
@@ -0,0 +1,67 @@
+import json
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.tracking import CHUNK_SIZE, ingest_updates
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply carrier tracking updates from JSON-lines files (one update per line). "
+        "Directories are scanned for *.jsonl; each file is renamed to *.jsonl.done once applied."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+")
+        parser.add_argument("--carrier", default="local")
+        parser.add_argument("--keep", action="store_true", help="Leave files in place")
+
+    def files(self, paths):
+        for path in map(Path, paths):
+            if path.is_dir():
+                yield from sorted(path.glob("*.jsonl"))
+            elif path.exists():
+                yield path
+            else:
+                raise CommandError(f"{path} does not exist")
+
+    def ingest_file(self, path, carrier):
+        stats, chunk = Counter(), []
+        with path.open() as lines:
+            for number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    chunk.append(json.loads(line))
+                except ValueError:
+                    self.stderr.write(f"{path}:{number}: not valid JSON, skipped")
+                    stats["invalid"] += 1
+                    continue
+                if len(chunk) == CHUNK_SIZE:
+                    stats.update(ingest_updates(chunk, carrier))
+                    chunk = []
+        stats.update(ingest_updates(chunk, carrier))
+        return stats
+
+    def handle(self, *args, **options):
+        total, start = Counter(), time.perf_counter()
+        for path in self.files(options["paths"]):
+            stats = self.ingest_file(path, options["carrier"])
+            total.update(stats)
+            if not options["keep"]:
+                path.rename(path.with_name(path.name + ".done"))
+            self.stdout.write(f"{path}: {stats['applied']} applied, {stats['duplicates']} already seen")
+
+        elapsed = time.perf_counter() - start
+        received = total["received"]
+        self.stdout.write(
+            f"{received} updates in {elapsed:.1f}s ({received / elapsed * 60 if elapsed else 0:.0f}/min): "
+            f"{total['applied']} applied, {total['duplicates']} duplicates, "
+            f"{total['unmatched']} unknown tracking numbers, {total['invalid']} invalid; "
+            f"{total['items_shipped']} items shipped, {total['items_delivered']} delivered, "
+            f"{total['orders_changed']} orders changed status"
+        )
+        self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,15 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.idempotency import purge_keys
+
+
+class Command(BaseCommand):
+    help = "Delete idempotency keys older than IDEMPOTENCY_KEY_MAX_AGE"
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_MAX_AGE)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {purge_keys(older_than)} idempotency keys"))
@@ -0,0 +1,64 @@
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.outbox import backlog, purge_delivered, relay
+
+
+class Command(BaseCommand):
+    help = "Deliver outbox events to their handlers, in order and in batches, and report throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--once", action="store_true", help="Deliver what is due and exit")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds to wait when idle")
+        parser.add_argument("--report-every", type=float, default=60.0, help="Seconds between metric lines")
+        parser.add_argument(
+            "--keep-days", type=int, default=7, help="Delete events delivered longer ago (0 keeps them)"
+        )
+
+    def report(self, stats, elapsed):
+        pending, age = backlog()
+        delivered = stats["delivered"]
+        self.stdout.write(
+            f"delivered {delivered} ({delivered / elapsed if elapsed else 0:.0f}/s) in {stats['batches']} batches, "
+            f"failed {stats['failed']}, gave up {stats['dead']}, held {stats['held']}, "
+            f"mean lag {stats['lag_ms'] / delivered if delivered else 0:.0f} ms, "
+            f"backlog {pending} (oldest {age:.0f}s)"
+        )
+
+    def purge(self, keep_days):
+        if keep_days:
+            deleted = purge_delivered(timezone.now() - timedelta(days=keep_days))
+            if deleted:
+                self.stdout.write(f"Deleted {deleted} delivered events")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if options["once"]:
+            start = time.perf_counter()
+            stats = relay(batch_size)
+            self.report(stats, time.perf_counter() - start)
+            self.purge(options["keep_days"])
+            return
+
+        stats, started = Counter(), time.perf_counter()
+        purged = started
+        try:
+            while True:
+                batch = relay(batch_size, max_batches=10)
+                stats.update(batch)
+                now = time.perf_counter()
+                if now - started >= options["report_every"]:
+                    self.report(stats, now - started)
+                    stats, started = Counter(), now
+                if now - purged >= 3600:
+                    self.purge(options["keep_days"])
+                    purged = now
+                if not batch["delivered"]:
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.report(stats, time.perf_counter() - started)
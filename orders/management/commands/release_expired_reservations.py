@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.reservations import cancel_abandoned_orders, release_expired
+
+
+class Command(BaseCommand):
+    help = "Release expired stock reservations and cancel the unpaid orders that held them"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        released, cancelled = release_expired(batch_size=options["batch_size"])
+        # Pending orders that never held stock, left over from before reservations
+        older_than = timezone.now() - timedelta(seconds=settings.STOCK_RESERVATION_SECONDS)
+        abandoned = cancel_abandoned_orders(older_than, batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Released {released} reservations and cancelled {cancelled + abandoned} unpaid orders"
+            )
+        )
@@ -0,0 +1,149 @@
+import json
+import time
+import uuid
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.addresses import address_for
+from accounts.models import User
+from orders.models import Order, OrderItem
+from orders.tracking import CHUNK_SIZE, TRACKED_ORDER_STATUSES, LocalCarrier, ingest_updates
+from products.models import Category, Product
+
+ADDRESS = {
+    "name": "Carrier Buyer",
+    "email": "carrier@example.com",
+    "phone": "0100000000",
+    "address": "Road 1",
+    "city": "Chattogram",
+    "state": "",
+    "postal_code": "4000",
+    "country": "Bangladesh",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Play a local carrier: generate the scans of parcels with tracking numbers and apply them "
+        "in-process (reporting throughput), write them for the ingest_tracking file drop, or POST "
+        "them to a tracking webhook. --create makes scratch shipped orders first; use a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=1000, help="Parcels to track")
+        parser.add_argument("--create", type=int, default=0, help="Create this many shipped orders to track")
+        parser.add_argument("--output", help="Write the updates to this JSON-lines file instead")
+        parser.add_argument("--url", help="POST the updates to this tracking webhook instead")
+        parser.add_argument("--batch-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument("--transit-days", type=float, default=3)
+        parser.add_argument("--exception-rate", type=float, default=0.02)
+        parser.add_argument("--resend", action="store_true", help="Send every update twice, as carriers do")
+
+    def create(self, count):
+        tag = uuid.uuid4().hex[:8]
+        seller = User.objects.create_user(f"carrier-seller-{tag}", user_type="seller")
+        buyer = User.objects.create_user(f"carrier-buyer-{tag}")
+        category, _ = Category.objects.get_or_create(name="Bench")
+        product = Product.objects.create(
+            seller=seller,
+            category=category,
+            name=f"Carrier product {tag}",
+            description="Created by simulate_carrier",
+            price=Decimal("10.00"),
+            stock_quantity=0,
+        )
+        now = timezone.now()
+        address = address_for(buyer, ADDRESS)
+        Order.objects.bulk_create(
+            Order(
+                order_number=f"SIM{tag}{number:07d}".upper(),
+                user=buyer,
+                status="shipped",
+                payment_status="paid",
+                subtotal=product.price,
+                total_amount=product.price,
+                shipped_at=now,
+                shipping=address,
+                billing=address,
+            )
+            for number in range(count)
+        )
+        orders = Order.objects.filter(user=buyer).order_by("id")
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order,
+                product=product,
+                seller=seller,
+                quantity=1,
+                price_at_time=product.price,
+                total_price=product.price,
+                status="shipped",
+                tracking_number=f"SIM-{tag}-{number}",
+                shipped_at=now,
+            )
+            for number, order in enumerate(orders)
+        )
+        return [seller, buyer]
+
+    def parcels(self, limit):
+        rows = (
+            OrderItem.objects.filter(order__status__in=TRACKED_ORDER_STATUSES)
+            .exclude(tracking_number__isnull=True)
+            .exclude(tracking_number="")
+            .values_list("tracking_number", "order__shipping__city", "shipped_at")
+            .order_by("-id")
+        )
+        parcels = {}
+        for number, city, shipped_at in rows.iterator():
+            parcels.setdefault(number, (city, shipped_at or timezone.now()))
+            if len(parcels) == limit:
+                break
+        return parcels
+
+    def handle(self, *args, **options):
+        scratch = self.create(options["create"]) if options["create"] else []
+        try:
+            carrier = LocalCarrier(options["transit_days"], options["exception_rate"])
+            updates = [
+                update
+                for number, (city, shipped_at) in self.parcels(options["limit"]).items()
+                for update in carrier.scans(number, city, shipped_at)
+            ]
+            if options["resend"]:
+                updates += updates
+            self.stdout.write(f"{len(updates)} updates for {options['limit']} parcels at most")
+
+            if options["output"]:
+                with open(options["output"], "w") as out:
+                    for update in updates:
+                        out.write(json.dumps(update) + "\n")
+                self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+                return
+
+            # Carriers batch by time, so the scans of one parcel arrive in different batches
+            updates.sort(key=lambda update: update["occurred_at"])
+            stats, start = Counter(), time.perf_counter()
+            for offset in range(0, len(updates), options["batch_size"]):
+                batch = updates[offset : offset + options["batch_size"]]
+                if options["url"]:
+                    result = carrier.send(options["url"], batch)
+                    stats.update({key: value for key, value in result.items() if type(value) is int})
+                else:
+                    stats.update(ingest_updates(batch, carrier.name))
+            elapsed = time.perf_counter() - start
+
+            self.stdout.write(
+                f"{len(updates)} updates in {elapsed:.1f}s ({len(updates) / elapsed * 60 if elapsed else 0:.0f}/min): "
+                f"{stats['applied']} applied, {stats['duplicates']} duplicates, {stats['unmatched']} unmatched; "
+                f"{stats['items_delivered']} items delivered, {stats['orders_changed']} orders changed status"
+            )
+            self.stdout.write(self.style.SUCCESS("Done"))
+        finally:
+            # Orders written out for the file drop stay for ingest_tracking to find
+            if scratch and not options["output"]:
+                Order.objects.filter(user__in=scratch).delete()
+                Product.objects.filter(seller__in=scratch).delete()
+                User.objects.filter(id__in=[user.id for user in scratch]).delete()
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-19 04:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_update_paypal_to_bkash_data'),
+        ('products', '0003_remove_category_durum'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['seller', 'created_at'], name='orders_orde_seller__d8f1ea_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['seller', 'status', 'created_at'], name='orders_orde_seller__c0297a_idx'),
+        ),
+    ]
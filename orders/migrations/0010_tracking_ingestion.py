@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_outbox_event'),
+        ('products', '0008_category_tree'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ordertracking',
+            name='carrier_event_id',
+            field=models.CharField(blank=True, max_length=150, null=True),
+        ),
+        migrations.AddField(
+            model_name='ordertracking',
+            name='occurred_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['tracking_number'], name='orders_orde_trackin_454eef_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordertracking',
+            index=models.Index(fields=['order', 'created_at'], name='orders_orde_order_i_9dbc81_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ordertracking',
+            constraint=models.UniqueConstraint(fields=('carrier_event_id', 'order'), name='unique_carrier_event'),
+        ),
+    ]
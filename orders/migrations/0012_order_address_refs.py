@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_address'),
+        ('orders', '0011_order_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='billing',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='+', to='accounts.address'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='shipping',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='+', to='accounts.address'),
+        ),
+    ]
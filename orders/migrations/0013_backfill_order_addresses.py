@@ -0,0 +1,79 @@
+# Point existing orders at deduplicated Address rows built from their
+# shipping_*/billing_* columns, a batch of orders at a time
+
+import hashlib
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+# Copied from accounts.addresses as of this migration, so later changes there
+# cannot change what it does
+ADDRESS_FIELDS = ["name", "email", "phone", "address", "city", "state", "postal_code", "country"]
+MAX_LENGTHS = {"name": 100, "phone": 15, "city": 100, "state": 100, "postal_code": 10, "country": 100}
+
+
+def clean_address(data):
+    cleaned = {}
+    for field in ADDRESS_FIELDS:
+        value = (data.get(field) or "").strip()
+        cleaned[field] = value[: MAX_LENGTHS[field]] if field in MAX_LENGTHS else value
+    return cleaned
+
+
+def address_hash(data):
+    normalized = "\x1f".join(" ".join((data.get(field) or "").split()).casefold() for field in ADDRESS_FIELDS)
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def backfill_addresses(apps, schema_editor):
+    Address = apps.get_model("accounts", "Address")
+    Order = apps.get_model("orders", "Order")
+
+    last_id = 0
+    while True:
+        orders = list(Order.objects.filter(id__gt=last_id, shipping__isnull=True).order_by("id")[:BATCH_SIZE])
+        if not orders:
+            break
+        last_id = orders[-1].id
+
+        wanted, refs = {}, []
+        for order in orders:
+            keys = []
+            for kind in ("shipping", "billing"):
+                cleaned = clean_address({field: getattr(order, f"{kind}_{field}") for field in ADDRESS_FIELDS})
+                key = (order.user_id, address_hash(cleaned))
+                if key not in wanted or order.created_at > wanted[key][1]:
+                    wanted[key] = (cleaned, order.created_at)
+                keys.append(key)
+            refs.append((order, keys))
+
+        Address.objects.bulk_create(
+            [
+                Address(user_id=user_id, content_hash=content_hash, last_used_at=used_at, **cleaned)
+                for (user_id, content_hash), (cleaned, used_at) in wanted.items()
+            ],
+            ignore_conflicts=True,
+        )
+        ids = {
+            (user_id, content_hash): address_id
+            for address_id, user_id, content_hash in Address.objects.filter(
+                user_id__in={user_id for user_id, _ in wanted},
+                content_hash__in={content_hash for _, content_hash in wanted},
+            ).values_list("id", "user_id", "content_hash")
+        }
+        for order, (shipping, billing) in refs:
+            order.shipping_id = ids[shipping]
+            order.billing_id = ids[billing]
+        Order.objects.bulk_update([order for order, _ in refs], ["shipping", "billing"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0012_order_address_refs"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_addresses, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_address'),
+        ('orders', '0013_backfill_order_addresses'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='order',
+            name='billing_address',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='billing_city',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='billing_country',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='billing_email',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='billing_name',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='billing_phone',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='billing_postal_code',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='billing_state',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='shipping_address',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='shipping_city',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='shipping_country',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='shipping_email',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='shipping_name',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='shipping_phone',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='shipping_postal_code',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='shipping_state',
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='billing',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, related_name='+', to='accounts.address'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='shipping',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, related_name='+', to='accounts.address'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:19
+#
+# Index orders archived so far by the sellers of their items, read from
+# each snapshot, so the seller views can find them
+
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def backfill_sellers(apps, schema_editor):
+    ArchivedOrder = apps.get_model("orders", "ArchivedOrder")
+    Sellers = ArchivedOrder.sellers.through
+
+    last_id = 0
+    while True:
+        batch = list(ArchivedOrder.objects.filter(id__gt=last_id).order_by("id")[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        Sellers.objects.bulk_create(
+            [
+                Sellers(archivedorder_id=archived.id, user_id=seller_id)
+                for archived in batch
+                for seller_id in {item["seller_id"] for item in archived.data["items"]}
+            ],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0014_drop_order_address_columns'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorder',
+            name='sellers',
+            field=models.ManyToManyField(blank=True, related_name='archived_sales', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_sellers, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 from products.models import Product, Discount
 import uuid
 
@@ -38,25 +40,13 @@ class Order(models.Model):
     shipping_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
 
-    # Shipping Information
-    shipping_name = models.CharField(max_length=100)
-    shipping_email = models.EmailField()
-    shipping_phone = models.CharField(max_length=15)
-    shipping_address = models.TextField()
-    shipping_city = models.CharField(max_length=100)
-    shipping_state = models.CharField(max_length=100)
-    shipping_postal_code = models.CharField(max_length=10)
-    shipping_country = models.CharField(max_length=100)
-
-    # Billing Information (can be same as shipping)
-    billing_name = models.CharField(max_length=100)
-    billing_email = models.EmailField()
-    billing_phone = models.CharField(max_length=15)
-    billing_address = models.TextField()
-    billing_city = models.CharField(max_length=100)
-    billing_state = models.CharField(max_length=100)
-    billing_postal_code = models.CharField(max_length=10)
-    billing_country = models.CharField(max_length=100)
+    # Where it goes and who pays; see accounts/addresses.py
+    shipping = models.ForeignKey(
+        "accounts.Address", on_delete=models.RESTRICT, related_name="+"
+    )
+    billing = models.ForeignKey(
+        "accounts.Address", on_delete=models.RESTRICT, related_name="+"
+    )
 
     # Applied discount
     applied_discount = models.ForeignKey(
@@ -75,6 +65,10 @@ class Order(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Finding finished orders to archive; see orders.archive
+            models.Index(fields=["status", "updated_at"]),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.order_number:
@@ -106,6 +100,15 @@ class OrderItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Seller order listing and export, optionally filtered by status
+            models.Index(fields=["seller", "created_at"]),
+            models.Index(fields=["seller", "status", "created_at"]),
+            # Matching carrier updates to items; see orders.tracking
+            models.Index(fields=["tracking_number"]),
+        ]
+
     def __str__(self):
         return (
             f"{self.quantity} x {self.product.name} - Order #{self.order.order_number}"
@@ -159,10 +162,176 @@ class OrderTracking(models.Model):
     status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
     message = models.TextField()
     location = models.CharField(max_length=200, blank=True, null=True)
+    # "<carrier>:<event id>" for entries from carrier updates, so a resent
+    # update is recognised; see orders.tracking
+    carrier_event_id = models.CharField(max_length=150, blank=True, null=True)
+    # When the carrier saw it, if later reported
+    occurred_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["carrier_event_id", "order"], name="unique_carrier_event"
+            )
+        ]
+        indexes = [models.Index(fields=["order", "created_at"])]
 
     def __str__(self):
         return f"Order #{self.order.order_number} - {self.status} at {self.created_at}"
+
+
+class StockReservation(models.Model):
+    """
+    Stock held for a line of an order that is waiting for its online
+    payment; see orders.reservations.
+    """
+
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name="reservations"
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="reservations"
+    )
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Live holds per product (available-to-sell), and the expiry sweep
+            models.Index(fields=["product", "expires_at"]),
+            models.Index(fields=["expires_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held for order {self.order_id} until {self.expires_at}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    A client-chosen key for a checkout or payment request and the response
+    it produced, so a retry gets that response back; see orders.idempotency.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="idempotency_keys",
+    )
+    key = models.CharField(max_length=100)
+    # md5 of the method, path and body the key was first used with
+    fingerprint = models.CharField(max_length=32)
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    content = models.TextField(blank=True)
+    # Set while the first request runs; duplicates arriving meanwhile are turned away
+    locked_until = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="unique_idempotency_key_per_user"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.user_id})"
+
+
+class PaymentEvent(models.Model):
+    """
+    A webhook event from the payment provider. Each event id is stored
+    once, so a redelivered event is recognised and not applied again; see
+    orders.payments.
+    """
+
+    provider = models.CharField(max_length=50)
+    event_id = models.CharField(max_length=100)
+    event_type = models.CharField(max_length=50)
+    payment = models.ForeignKey(
+        Payment,
+        on_delete=models.SET_NULL,
+        related_name="events",
+        blank=True,
+        null=True,
+    )
+    payload = models.JSONField()
+    # What applying the event did: paid, failed, refunded, ignored, ...
+    outcome = models.CharField(max_length=20, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["provider", "event_id"], name="unique_payment_event"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.event_type} {self.event_id}"
+
+
+class OutboxEvent(models.Model):
+    """
+    Something that happened to an order, payment or bargain, written in the
+    same transaction as the change and delivered to handlers afterwards by
+    the relay_outbox command; see orders.outbox.
+    """
+
+    topic = models.CharField(max_length=50)
+    # Events of one stream (e.g. "order:42") reach handlers in the order written
+    stream = models.CharField(max_length=50)
+    # Writing an event whose key exists is a no-op
+    key = models.CharField(max_length=150, unique=True)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Retries back off until then
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    delivered_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # The relay only ever scans undelivered events, oldest first
+            models.Index(
+                fields=["id"],
+                condition=models.Q(delivered_at__isnull=True),
+                name="outbox_pending_idx",
+            ),
+            models.Index(fields=["delivered_at"], name="outbox_delivered_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} {self.key}"
+
+
+class ArchivedOrder(models.Model):
+    """
+    A finished order moved out of the live tables by the archive_orders
+    command. The columns are what lookups need (`sellers` lets the seller
+    views find it); `data` holds the order with its items, payment and
+    tracking as they were; see orders.archive.
+    """
+
+    order_number = models.CharField(max_length=32, unique=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="archived_orders"
+    )
+    sellers = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name="archived_sales", blank=True)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["user", "created_at"])]
+
+    def __str__(self):
+        return f"Archived order #{self.order_number}"
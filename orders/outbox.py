@@ -0,0 +1,183 @@
+"""
+Transactional outbox for order, payment and bargain events.
+
+State changes call emit() inside their transaction, so an event is stored
+exactly when the change commits. The relay_outbox command then delivers
+undelivered events, oldest first and in batches, to the handlers
+registered for their topic:
+
+    from orders.outbox import handler
+
+    @handler("order.*")
+    def reindex_orders(events):
+        ...
+
+Delivery is at least once. When a handler raises on a batch it gets the
+events again one at a time, and those it still fails on are retried after
+a back-off; handlers may see an event more than once, so they should be
+idempotent (event.key is unique). Later events of the same stream (one
+order, one bargain) wait for a failed one, so every handler sees a
+stream's events in order. Run one relay at a time.
+"""
+import fnmatch
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 10
+MAX_BACKOFF_SECONDS = 300
+
+_handlers = []
+
+
+def handler(pattern):
+    """Register a function to receive lists of events whose topic matches `pattern`"""
+
+    def register(func):
+        _handlers.append((pattern, func))
+        return func
+
+    return register
+
+
+def handlers_for(topic):
+    return [func for pattern, func in _handlers if fnmatch.fnmatchcase(topic, pattern)]
+
+
+def emit_many(topic, events):
+    """
+    Store events of one topic, given as (stream, key, payload); keys that
+    were already written are skipped. Call inside the transaction making
+    the change.
+    """
+    OutboxEvent.objects.bulk_create(
+        [OutboxEvent(topic=topic, stream=stream, key=key, payload=payload) for stream, key, payload in events],
+        ignore_conflicts=True,
+    )
+
+
+def emit(topic, stream, key, payload):
+    emit_many(topic, [(stream, key, payload)])
+
+
+def order_payload(order, **extra):
+    return {
+        "order_id": order.id,
+        "order_number": order.order_number,
+        "user_id": order.user_id,
+        "status": order.status,
+        "payment_status": order.payment_status,
+        "total_amount": order.total_amount,
+        **extra,
+    }
+
+
+def emit_order_event(topic, order, key=None, **extra):
+    emit(topic, f"order:{order.id}", key or f"{topic}:{order.id}", order_payload(order, **extra))
+
+
+def _backoff(attempts):
+    return timedelta(seconds=min(2**attempts, MAX_BACKOFF_SECONDS))
+
+
+def relay_batch(batch_size=100):
+    """Deliver up to `batch_size` due events; returns counts for metrics"""
+    now = timezone.now()
+    stats = Counter()
+    pending = OutboxEvent.objects.filter(delivered_at__isnull=True)
+    # A stream with an event backing off waits for it. The batch is read
+    # past those streams, so a handler failing on some events does not
+    # keep every other stream waiting behind them.
+    backing_off = pending.filter(available_at__gt=now).values("stream")
+    due = list(pending.filter(available_at__lte=now).exclude(stream__in=backing_off).order_by("id")[:batch_size])
+    if not due:
+        return stats
+    stats["batches"] += 1
+
+    batches = {}
+    for event in due:
+        for func in handlers_for(event.topic):
+            batches.setdefault(func, []).append(event)
+    errors = {}
+    for func, batch in batches.items():
+        try:
+            func(batch)
+        except Exception:
+            logger.exception("Outbox handler %s failed on a batch", func.__qualname__)
+            # Find the bad events one at a time, so the other streams go through
+            stopped = set()
+            for event in batch:
+                if event.stream in stopped:
+                    continue
+                try:
+                    func([event])
+                except Exception as e:
+                    errors.setdefault(event.id, f"{func.__module__}.{func.__qualname__}: {e!r}")
+                    stopped.add(event.stream)
+
+    delivered, failed, blocked = [], [], set()
+    for event in due:
+        if event.id in errors:
+            failed.append(event)
+            blocked.add(event.stream)
+        elif event.stream in blocked:
+            # Redelivered after the failed one, to keep the stream in order
+            stats["held"] += 1
+        else:
+            delivered.append(event)
+
+    finished = timezone.now()
+    OutboxEvent.objects.filter(id__in=[event.id for event in delivered]).update(delivered_at=finished)
+    for event in failed:
+        attempts = event.attempts + 1
+        gave_up = attempts >= MAX_ATTEMPTS
+        if gave_up:
+            logger.error("Giving up on outbox event %s after %s attempts", event.key, attempts)
+        OutboxEvent.objects.filter(id=event.id).update(
+            attempts=attempts,
+            last_error=errors[event.id][:2000],
+            available_at=finished + _backoff(attempts),
+            delivered_at=finished if gave_up else None,
+        )
+        stats["dead" if gave_up else "failed"] += 1
+
+    stats["delivered"] += len(delivered)
+    stats["lag_ms"] += sum((finished - event.created_at).total_seconds() * 1000 for event in delivered)
+    return stats
+
+
+def relay(batch_size=100, max_batches=None):
+    """Deliver due events batch after batch until none is left"""
+    stats = Counter()
+    while max_batches is None or stats["batches"] < max_batches:
+        batch = relay_batch(batch_size)
+        stats.update(batch)
+        if not batch["delivered"] and not batch["failed"] and not batch["dead"]:
+            break
+    return stats
+
+
+def backlog():
+    """(undelivered events, age in seconds of the oldest)"""
+    pending = OutboxEvent.objects.filter(delivered_at__isnull=True)
+    oldest = pending.order_by("id").values_list("created_at", flat=True).first()
+    age = (timezone.now() - oldest).total_seconds() if oldest else 0
+    return pending.count(), age
+
+
+def purge_delivered(older_than, batch_size=1000):
+    """Delete events delivered before `older_than`, in batches; returns the count"""
+    deleted = 0
+    while True:
+        ids = list(
+            OutboxEvent.objects.filter(delivered_at__lt=older_than).values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += OutboxEvent.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,277 @@
+"""
+Payment providers for online checkout.
+
+settings.PAYMENT_GATEWAY names the provider class and its options; see
+crazycart/payments.py. A provider charges a Payment and either answers at
+once or answers "pending" and confirms later through a webhook:
+
+    result = get_gateway().charge(payment, "credit_card")
+    result.status    "paid", "failed" or "pending"
+    result.data      recorded on the Payment; data["charge"] names the charge
+
+Webhooks are POSTed to /orders/payment/webhook/, verified by the provider
+and applied by ingest_event(). Every event id is recorded once, so a
+redelivered event changes nothing, and settle_payment() only settles an
+order that is still waiting for its payment, whichever of the checkout
+request and the webhook gets there first. A successful charge for an
+order that a different charge already paid is refunded.
+
+SimulatedGateway stands in for a real provider, with configurable
+latency, declines and asynchronous (optionally duplicated) webhooks.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import random
+import threading
+import time
+import urllib.request
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Order, Payment, PaymentEvent
+from .outbox import emit_order_event
+from .reservations import commit_reservations, release_order
+from .services import CheckoutError
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = "X-Payment-Signature"
+
+
+class GatewayError(Exception):
+    pass
+
+
+class ChargeResult:
+    def __init__(self, status, reference, data=None):
+        self.status = status
+        self.reference = reference
+        self.data = data or {}
+
+
+class PaymentGateway:
+    """Base class for payment providers"""
+
+    name = ""
+
+    def __init__(self, secret):
+        self.secret = secret
+
+    def charge(self, payment, payment_method):
+        """Charge payment.amount; returns a ChargeResult"""
+        raise NotImplementedError
+
+    def refund(self, payment, charge=None):
+        """Give back a charge (by default the one recorded on the payment)"""
+        raise NotImplementedError
+
+    def sign(self, body):
+        return hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+
+    def parse_webhook(self, body, signature):
+        """The event in a webhook body, or GatewayError if it can't be trusted"""
+        if not hmac.compare_digest(self.sign(body), signature or ""):
+            raise GatewayError("Invalid signature")
+        try:
+            event = json.loads(body)
+        except ValueError:
+            raise GatewayError("Malformed event")
+        if not isinstance(event, dict) or not {"id", "type", "reference"} <= event.keys():
+            raise GatewayError("Malformed event")
+        return event
+
+
+class SimulatedGateway(PaymentGateway):
+    """
+    A local provider for tests and load tests. With webhooks "off" a charge
+    is answered at once. Otherwise it answers "pending" and the result
+    follows as a signed webhook once the caller's transaction commits:
+    "inline" right away, "thread" after webhook_delay_ms on a background
+    thread, the way a real provider calls back.
+    """
+
+    name = "simulator"
+
+    def __init__(
+        self,
+        secret,
+        latency_ms=0,
+        failure_rate=0,
+        webhooks="off",
+        webhook_delay_ms=500,
+        duplicate_rate=0,
+        webhook_url="",
+    ):
+        super().__init__(secret)
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.webhooks = webhooks
+        self.webhook_delay_ms = webhook_delay_ms
+        self.duplicate_rate = duplicate_rate
+        self.webhook_url = webhook_url
+
+    def charge(self, payment, payment_method):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        declined = random.random() < self.failure_rate
+        data = {
+            "provider": self.name,
+            "reference": payment.transaction_id,
+            "charge": f"ch_{uuid.uuid4().hex}",
+            "payment_method": payment_method,
+            "amount": str(payment.amount),
+            "status": "failed" if declined else "paid",
+        }
+        if declined:
+            data["decline_code"] = "card_declined"
+        if self.webhooks == "off":
+            return ChargeResult(data["status"], payment.transaction_id, data)
+
+        event = dict(
+            data,
+            id=f"evt_{uuid.uuid4().hex}",
+            type="payment.failed" if declined else "payment.succeeded",
+        )
+        transaction.on_commit(lambda: self.send_webhook(event))
+        return ChargeResult("pending", payment.transaction_id, dict(data, status="pending"))
+
+    def refund(self, payment, charge=None):
+        charge = charge or (payment.gateway_response or {}).get("charge")
+        return ChargeResult(
+            "refunded",
+            payment.transaction_id,
+            {"provider": self.name, "reference": payment.transaction_id, "charge": charge, "status": "refunded"},
+        )
+
+    def send_webhook(self, event):
+        body = json.dumps(event).encode()
+        copies = 2 if random.random() < self.duplicate_rate else 1
+        if self.webhooks == "inline":
+            for _ in range(copies):
+                self.deliver(body)
+        else:
+            timer = threading.Timer(self.webhook_delay_ms / 1000, self._deliver_later, args=(body, copies))
+            timer.daemon = True
+            timer.start()
+
+    def _deliver_later(self, body, copies):
+        try:
+            for _ in range(copies):
+                self.deliver(body)
+        except Exception:
+            logger.exception("Simulated payment webhook failed")
+        finally:
+            connections.close_all()
+
+    def deliver(self, body):
+        signature = self.sign(body)
+        if self.webhook_url:
+            request = urllib.request.Request(
+                self.webhook_url,
+                data=body,
+                headers={"Content-Type": "application/json", SIGNATURE_HEADER: signature},
+            )
+            urllib.request.urlopen(request, timeout=10).close()
+        else:
+            ingest_event(self, self.parse_webhook(body, signature))
+
+
+def get_gateway():
+    config = settings.PAYMENT_GATEWAY
+    return import_string(config["BACKEND"])(config["WEBHOOK_SECRET"], **config.get("OPTIONS", {}))
+
+
+def settle_payment(order, gateway_response=None):
+    """
+    Mark a charged order paid: take its stock, confirm it and take its lines
+    out of the buyer's cart. Returns False if the order was no longer waiting for its
+    payment; raises CheckoutError if its stock is gone.
+    """
+    from cart.models import CartItem
+
+    with transaction.atomic():
+        # The checkout request and the webhook may both try; the row lock picks one
+        locked = Order.objects.select_for_update().get(id=order.id)
+        if locked.status != "pending" or locked.payment_status == "paid":
+            return False
+        commit_reservations(locked)
+        Payment.objects.filter(order_id=order.id).update(
+            status="paid", gateway_response=gateway_response, processed_at=timezone.now()
+        )
+        locked.status = "confirmed"
+        locked.payment_status = "paid"
+        locked.save()
+        # Only what was bought; anything added while paying stays in the cart
+        bought = Q()
+        for product_id, quantity in locked.items.values_list("product_id", "quantity"):
+            bought |= Q(product_id=product_id, quantity=quantity)
+        CartItem.objects.filter(bought, cart__user_id=order.user_id).delete()
+        emit_order_event("order.paid", locked)
+    order.refresh_from_db()
+    return True
+
+
+def refund_payment(gateway, order, charge=None):
+    """Cancel an order that was charged but can't be fulfilled, and refund the charge"""
+    with transaction.atomic():
+        release_order(order)
+        result = gateway.refund(order.payment, charge)
+        Payment.objects.filter(order_id=order.id).update(status="refunded", gateway_response=result.data)
+        Order.objects.filter(id=order.id).update(payment_status="refunded", updated_at=timezone.now())
+        emit_order_event("payment.refunded", order, status="cancelled", payment_status="refunded")
+
+
+def refund_extra_charge(gateway, payment, charge):
+    """Give back a charge for an order that a different charge already paid"""
+    gateway.refund(payment, charge)
+    logger.warning("Refunded extra charge %s for order %s", charge, payment.order_id)
+
+
+def ingest_event(gateway, event):
+    """Apply a verified webhook event once; returns its outcome"""
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                record = PaymentEvent.objects.create(
+                    provider=gateway.name, event_id=event["id"], event_type=event["type"], payload=event
+                )
+        except IntegrityError:
+            return "duplicate"
+
+        payment = Payment.objects.select_related("order").filter(transaction_id=event["reference"]).first()
+        if payment is None:
+            outcome = "unknown"
+        elif event["type"] == "payment.succeeded":
+            try:
+                settled = settle_payment(payment.order, event)
+            except CheckoutError:
+                settled = False
+            paid_by = (payment.gateway_response or {}).get("charge")
+            if settled:
+                outcome = "paid"
+            elif payment.order.payment_status == "paid" and event.get("charge") in (None, paid_by):
+                outcome = "ignored"
+            elif payment.order.payment_status == "paid":
+                refund_extra_charge(gateway, payment, event["charge"])
+                outcome = "refunded"
+            else:
+                # Paid too late: the hold ran out and the order was cancelled
+                refund_payment(gateway, payment.order, event.get("charge"))
+                outcome = "refunded"
+        elif event["type"] == "payment.failed":
+            failed = Payment.objects.filter(id=payment.id, status="pending").update(
+                status="failed", gateway_response=event
+            )
+            outcome = "failed" if failed else "ignored"
+        else:
+            outcome = "ignored"
+
+        PaymentEvent.objects.filter(id=record.id).update(payment=payment, outcome=outcome)
+    return outcome
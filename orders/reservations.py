@@ -0,0 +1,225 @@
+"""
+Stock held for orders waiting on an online payment.
+
+When a buyer reaches the payment page, each line of their pending order
+holds its quantity for settings.STOCK_RESERVATION_SECONDS. While a hold is
+live the units are not available to anyone else. Paying turns the holds
+into a stock decrement; the release_expired_reservations command cancels
+orders whose holds ran out.
+
+Available-to-sell is stock_quantity minus the live holds, summed from the
+(product, expires_at) index.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Order, Payment, StockReservation
+from .outbox import emit_many, emit_order_event
+from .services import CheckoutError, decrement_stock
+
+
+def reserved_quantity(product_ref="pk", now=None, exclude_order=None, exclude_user=None):
+    """
+    Expression for the live held quantity of the product in `product_ref`,
+    to annotate querysets without an extra query per row. A buyer's own
+    holds can be left out, so they don't compete with themselves.
+    """
+    holds = StockReservation.objects.filter(
+        product_id=OuterRef(product_ref), expires_at__gt=now or timezone.now()
+    )
+    if exclude_order is not None:
+        holds = holds.exclude(order_id=exclude_order.pk)
+    if exclude_user is not None:
+        holds = holds.exclude(order__user_id=exclude_user.pk)
+    total = holds.order_by().values("product_id").annotate(total=Sum("quantity")).values("total")
+    return Coalesce(Subquery(total, output_field=IntegerField()), Value(0))
+
+
+def available_stock(product_ids, exclude_user=None):
+    """{product_id: units that can still be sold} in one query"""
+    from products.models import Product
+
+    rows = Product.objects.filter(id__in=product_ids).annotate(
+        reserved=reserved_quantity(exclude_user=exclude_user)
+    ).values_list("id", "stock_quantity", "reserved")
+    return {product_id: stock - reserved for product_id, stock, reserved in rows}
+
+
+def _locked_shortages(order, exclude_user=None):
+    """
+    Lock the order's products and list the lines that stock, less other
+    orders' live holds, can't cover.
+    """
+    from products.models import Product
+
+    lines = list(order.items.values_list("product_id", "quantity"))
+    # FOR UPDATE serializes concurrent reservations of the same products
+    products = {
+        product_id: (name, stock - reserved)
+        for product_id, name, stock, reserved in Product.objects.select_for_update()
+        .filter(id__in=[product_id for product_id, quantity in lines])
+        .annotate(reserved=reserved_quantity(exclude_order=order, exclude_user=exclude_user))
+        .values_list("id", "name", "stock_quantity", "reserved")
+    }
+    shortages = []
+    for product_id, quantity in lines:
+        name, available = products.get(product_id, ("This product", 0))
+        available = max(available, 0)
+        if quantity > available:
+            shortages.append(
+                {
+                    "code": "insufficient_stock",
+                    "message": f"Not enough stock for {name}. Available: {available}, Requested: {quantity}",
+                    "product_id": product_id,
+                    "available": available,
+                    "requested": quantity,
+                    "blocking": True,
+                }
+            )
+    return shortages
+
+
+def reserve_order(order, seconds=None):
+    """
+    Hold stock for every line of the order. Raises CheckoutError (and
+    holds nothing) if any line can't be covered.
+    """
+    seconds = settings.STOCK_RESERVATION_SECONDS if seconds is None else seconds
+    with transaction.atomic():
+        shortages = _locked_shortages(order)
+        if shortages:
+            raise CheckoutError(shortages[0]["message"], code="cart", problems=shortages)
+
+        expires_at = timezone.now() + timedelta(seconds=seconds)
+        order.reservations.all().delete()
+        StockReservation.objects.bulk_create(
+            StockReservation(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in order.items.values_list("product_id", "quantity")
+        )
+    return expires_at
+
+
+def take_stock(order):
+    """
+    For an order paid without a hold (wallet, cash on delivery): take its
+    quantities out of stock under the product row locks, or raise
+    CheckoutError if stock less other buyers' holds can't cover them. Call
+    inside the order's transaction.
+    """
+    shortages = _locked_shortages(order, exclude_user=order.user)
+    if shortages:
+        raise CheckoutError(shortages[0]["message"], code="cart", problems=shortages)
+    decrement_stock(order)
+
+
+def commit_reservations(order):
+    """
+    On payment: take the order's quantities out of stock and drop its
+    holds. Works after the holds expired too, as long as the units are
+    still free. Call inside the payment transaction.
+    """
+    shortages = _locked_shortages(order)
+    if shortages:
+        raise CheckoutError(
+            f"Your reservation has expired. {shortages[0]['message']}", code="cart", problems=shortages
+        )
+    decrement_stock(order)
+    order.reservations.all().delete()
+
+
+def release_order(order):
+    """Drop the holds of an order that will not be paid, and cancel it"""
+    with transaction.atomic():
+        order.reservations.all().delete()
+        cancelled = Order.objects.filter(
+            id=order.id, status="pending", payment_status="pending"
+        ).update(status="cancelled", payment_status="failed", updated_at=timezone.now())
+        if cancelled:
+            Payment.objects.filter(order_id=order.id, status="pending").update(status="failed")
+            emit_order_event(
+                "order.cancelled", order, status="cancelled", payment_status="failed", reason="not_paid"
+            )
+    return bool(cancelled)
+
+
+def release_expired(batch_size=500, now=None):
+    """
+    Delete expired holds in batches and cancel their orders if still
+    unpaid. Returns (holds released, orders cancelled).
+    """
+    now = now or timezone.now()
+    released = cancelled = 0
+    while True:
+        batch = list(
+            StockReservation.objects.filter(expires_at__lte=now)
+            .order_by("expires_at")
+            .values_list("id", "order_id")[:batch_size]
+        )
+        if not batch:
+            break
+        order_ids = {order_id for reservation_id, order_id in batch}
+        with transaction.atomic():
+            released += StockReservation.objects.filter(id__in=[row[0] for row in batch]).delete()[0]
+            # Orders that still hold other, live lines are left alone
+            stale = Order.objects.filter(
+                id__in=order_ids, status="pending", payment_status="pending"
+            ).exclude(reservations__expires_at__gt=now)
+            stale_ids = list(stale.values_list("id", flat=True))
+            cancelled += Order.objects.filter(id__in=stale_ids).update(
+                status="cancelled", payment_status="failed", updated_at=now
+            )
+            Payment.objects.filter(order_id__in=stale_ids, status="pending").update(status="failed")
+            _emit_cancelled(stale_ids, "reservation_expired")
+    return released, cancelled
+
+
+def cancel_abandoned_orders(older_than, batch_size=500):
+    """
+    Cancel unpaid pending orders created before `older_than` that hold no
+    stock, e.g. from before reservations existed. Returns the count.
+    """
+    cancelled = 0
+    while True:
+        ids = list(
+            Order.objects.filter(
+                status="pending", payment_status="pending", created_at__lt=older_than, reservations=None
+            ).values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        with transaction.atomic():
+            cancelled += Order.objects.filter(id__in=ids).update(
+                status="cancelled", payment_status="failed", updated_at=timezone.now()
+            )
+            Payment.objects.filter(order_id__in=ids, status="pending").update(status="failed")
+            _emit_cancelled(ids, "not_paid")
+    return cancelled
+
+
+def _emit_cancelled(order_ids, reason):
+    emit_many(
+        "order.cancelled",
+        [
+            (
+                f"order:{order_id}",
+                f"order.cancelled:{order_id}",
+                {
+                    "order_id": order_id,
+                    "order_number": order_number,
+                    "user_id": user_id,
+                    "status": "cancelled",
+                    "payment_status": "failed",
+                    "total_amount": total_amount,
+                    "reason": reason,
+                },
+            )
+            for order_id, order_number, user_id, total_amount in Order.objects.filter(
+                id__in=order_ids
+            ).values_list("id", "order_number", "user_id", "total_amount")
+        ],
+    )
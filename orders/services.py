@@ -0,0 +1,339 @@
+from decimal import Decimal
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.addresses import ADDRESS_FIELDS, address_for, default_address
+
+from .models import Order, OrderItem, Payment
+from .outbox import emit_order_event
+
+REQUIRED_SHIPPING_FIELDS = ["name", "email", "phone", "city", "address", "country"]
+
+CART_PAYMENT_METHODS = ["crazycart_wallet", "cash_on_delivery"]
+
+
+class CheckoutError(Exception):
+    """A checkout problem to show the buyer; `code` tells callers where to send them"""
+
+    def __init__(self, message, code="checkout", problems=None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.problems = problems or []
+
+
+class CheckoutProblem:
+    """
+    Something wrong with a cart line, or with the whole cart when `item` is
+    None. Warnings (price changes, a discount that no longer applies) are
+    shown but do not stop the checkout.
+    """
+
+    def __init__(self, code, message, item=None, blocking=True, **details):
+        self.code = code
+        self.message = message
+        self.item = item
+        self.blocking = blocking
+        self.details = details
+
+    def __str__(self):
+        return self.message
+
+    def as_dict(self):
+        return {
+            "code": self.code,
+            "message": self.message,
+            "cart_item_id": self.item.id if self.item else None,
+            "product_id": self.item.product_id if self.item else None,
+            "blocking": self.blocking,
+            **self.details,
+        }
+
+
+class CartCheck:
+    """The cart's lines with their products loaded, the problems found and the totals"""
+
+    def __init__(self, items, problems, discount=None):
+        self.items = items
+        self.problems = problems
+        self.discount = discount
+        self.total_items = sum(item.quantity for item in items)
+        self.subtotal = sum((item.total_price for item in items), Decimal("0"))
+        self.discount_amount = items[0].cart.discount_on(self.subtotal) if discount else 0
+        self.total_price = max(0, self.subtotal - self.discount_amount)
+
+    @property
+    def errors(self):
+        return [problem for problem in self.problems if problem.blocking]
+
+    @property
+    def warnings(self):
+        return [problem for problem in self.problems if not problem.blocking]
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def problems_for(self, item):
+        return [problem for problem in self.problems if problem.item is item]
+
+    def raise_for_errors(self):
+        if self.errors:
+            raise CheckoutError(
+                self.errors[0].message,
+                code="cart",
+                problems=[problem.as_dict() for problem in self.problems],
+            )
+
+
+def validate_cart(cart):
+    """
+    Check every line of the cart for stock (less other buyers' live
+    reservations), availability and price drift, and the applied discount
+    for validity, with one joined query.
+    """
+    from .reservations import reserved_quantity
+
+    items = list(
+        cart.items.select_related("product__seller", "cart__applied_discount__discount")
+        # Units held for other buyers' online payments are not for sale
+        .annotate(reserved=reserved_quantity("product_id", exclude_user=cart.user))
+        .order_by("id")
+    )
+    if not items:
+        return CartCheck([], [CheckoutProblem("empty", "Your cart is empty")])
+
+    problems = []
+    for item in items:
+        product = item.product
+        if not product.is_active:
+            problems.append(
+                CheckoutProblem("inactive", f"{product.name} is no longer available", item)
+            )
+        elif product.seller_id == cart.user_id:
+            problems.append(
+                CheckoutProblem("own_product", f"You cannot buy your own product {product.name}", item)
+            )
+        elif item.quantity > product.stock_quantity - item.reserved:
+            available = max(product.stock_quantity - item.reserved, 0)
+            problems.append(
+                CheckoutProblem(
+                    "out_of_stock" if available <= 0 else "insufficient_stock",
+                    f"Not enough stock for {product.name}. Available: {available}, Requested: {item.quantity}",
+                    item,
+                    available=available,
+                    requested=item.quantity,
+                )
+            )
+        if product.price != item.price_at_time:
+            # The cart keeps the price the item was added (or bargained) at
+            problems.append(
+                CheckoutProblem(
+                    "price_changed",
+                    f"{product.name} is now ৳{product.price}; your cart keeps ৳{item.price_at_time}",
+                    item,
+                    blocking=False,
+                    price=str(product.price),
+                    price_at_time=str(item.price_at_time),
+                )
+            )
+
+    try:
+        discount = items[0].cart.applied_discount.discount
+    except ObjectDoesNotExist:
+        discount = None
+    if discount is not None:
+        subtotal = sum(item.total_price for item in items)
+        if not discount.is_valid:
+            problems.append(
+                CheckoutProblem(
+                    "discount_invalid",
+                    f"Discount code {discount.code} is no longer valid and was not applied",
+                    blocking=False,
+                )
+            )
+            discount = None
+        elif subtotal < discount.minimum_order_amount:
+            problems.append(
+                CheckoutProblem(
+                    "discount_minimum",
+                    f"Discount code {discount.code} needs an order of at least ৳{discount.minimum_order_amount}",
+                    blocking=False,
+                )
+            )
+            discount = None
+
+    return CartCheck(items, problems, discount)
+
+
+def shipping_from_user(user, default_country=""):
+    """Shipping details to start from: the user's address book, else profile fields"""
+    return default_address(user, default_country)
+
+
+def missing_shipping_fields(shipping):
+    return [
+        field.replace("_", " ").title()
+        for field in REQUIRED_SHIPPING_FIELDS
+        if not (shipping.get(field) or "").strip()
+    ]
+
+
+def address_kwargs(user, shipping):
+    """Order shipping/billing kwargs; billing is the same as shipping"""
+    address = address_for(user, shipping)
+    return {"shipping": address, "billing": address}
+
+
+def decrement_stock(order):
+    """
+    Take the ordered quantities out of stock with one UPDATE per line, or
+    raise CheckoutError if a line is no longer in stock; call inside the
+    order's transaction so nothing is taken then. The catalog version is
+    only bumped when a product sells out, so a checkout does not invalidate
+    every catalog page.
+    """
+    from products.conditional import bump_catalog_version
+    from products.models import Product
+
+    now = timezone.now()
+    product_ids = []
+    for product_id, quantity in order.items.values_list("product_id", "quantity"):
+        taken = Product.objects.filter(id=product_id, stock_quantity__gte=quantity).update(
+            stock_quantity=F("stock_quantity") - quantity, stock_changed_at=now
+        )
+        if not taken:
+            name = Product.objects.filter(id=product_id).values_list("name", flat=True).first()
+            raise CheckoutError(f"Not enough stock for {name or 'this product'}", code="cart")
+        product_ids.append(product_id)
+    if Product.objects.filter(id__in=product_ids, stock_quantity__lte=0).exists():
+        bump_catalog_version()
+
+
+def debit_wallet(user, amount):
+    """Atomically deduct from the wallet; False if the balance is too low"""
+    from accounts.models import User
+
+    updated = User.objects.filter(id=user.id, crazycart_balance__gte=amount).update(
+        crazycart_balance=F("crazycart_balance") - amount
+    )
+    if updated:
+        user.refresh_from_db(fields=["crazycart_balance"])
+    return bool(updated)
+
+
+def place_cart_order(user, cart, payment_method, shipping):
+    """
+    Create a confirmed order from the cart, paid from the wallet or as
+    cash on delivery, then update stock and clear the cart. The stock is
+    checked again under a row lock, as for online payments, so two
+    checkouts can't both take the last units.
+    """
+    from .reservations import take_stock
+
+    if payment_method not in CART_PAYMENT_METHODS:
+        raise CheckoutError("Invalid payment method")
+
+    check = validate_cart(cart)
+    check.raise_for_errors()
+    cart_items = check.items
+
+    total_amount = check.total_price
+    if payment_method == "crazycart_wallet" and user.crazycart_balance < total_amount:
+        raise CheckoutError(
+            f"Insufficient wallet balance. Available: ৳{user.crazycart_balance}, Required: ৳{total_amount}"
+        )
+
+    with transaction.atomic():
+        order = Order.objects.create(
+            user=user,
+            subtotal=check.subtotal,
+            total_amount=total_amount,
+            **address_kwargs(user, shipping),
+        )
+
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(
+                    order=order,
+                    product=item.product,
+                    seller_id=item.product.seller_id,
+                    quantity=item.quantity,
+                    price_at_time=item.price_at_time,
+                    total_price=item.total_price,
+                )
+                for item in cart_items
+            ]
+        )
+
+        if payment_method == "crazycart_wallet":
+            if not debit_wallet(user, order.total_amount):
+                # Rolls back the order created above
+                raise CheckoutError("Insufficient wallet balance")
+            payment_status = "paid"
+        else:
+            payment_status = "pending"
+
+        Payment.objects.create(
+            order=order,
+            payment_method=payment_method,
+            amount=order.total_amount,
+            status=payment_status,
+        )
+
+        order.status = "confirmed"
+        order.payment_status = payment_status
+        order.save()
+
+        take_stock(order)
+
+        cart.items.all().delete()
+        cart.save()
+
+        emit_order_event(
+            "order.created",
+            order,
+            payment_method=payment_method,
+            seller_ids=sorted({item.product.seller_id for item in cart_items}),
+        )
+
+    return order
+
+
+def cancel_order(order, user):
+    """Cancel a pending/confirmed order, refunding wallet payments"""
+    from .transitions import can_transition
+
+    if not can_transition(order.status, "cancelled"):
+        raise CheckoutError("Cannot cancel this order.")
+
+    with transaction.atomic():
+        order.status = "cancelled"
+        order.save()
+        # An unpaid online order gives back the stock it was holding
+        order.reservations.all().delete()
+
+        # Refund if payment was made
+        payment = Payment.objects.filter(order=order).first()
+        if payment and payment.status == "paid":
+            from accounts.models import User
+
+            User.objects.filter(id=user.id).update(
+                crazycart_balance=F("crazycart_balance") + order.total_amount
+            )
+            user.refresh_from_db(fields=["crazycart_balance"])
+
+            payment.status = "refunded"
+            payment.save()
+
+        emit_order_event(
+            "order.cancelled",
+            order,
+            reason="cancelled_by_buyer",
+            refunded=bool(payment and payment.status == "refunded"),
+        )
+
+    return order
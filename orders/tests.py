@@ -1,3 +1,945 @@
-from django.test import TestCase
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.conf import settings
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.addresses import ADDRESS_FIELDS, address_for
+from accounts.models import Address, User
+from cart.models import AppliedDiscount, Cart, CartItem
+from products.models import Category, Discount, Product
+
+from .idempotency import request_fingerprint
+from .models import (
+    ArchivedOrder,
+    IdempotencyKey,
+    Order,
+    OrderItem,
+    OrderTracking,
+    OutboxEvent,
+    Payment,
+    PaymentEvent,
+    StockReservation,
+)
+from .outbox import _handlers, emit, handler, relay
+from .payments import SIGNATURE_HEADER, get_gateway
+from .reservations import available_stock, release_order
+from .services import validate_cart
+
+
+class CheckoutValidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller", password="pass1234", user_type="seller")
+        self.buyer = User.objects.create_user(
+            "buyer", password="pass1234", email="buyer@example.com", crazycart_balance=Decimal("1000.00")
+        )
+        category = Category.objects.create(name="Phones")
+        self.products = [
+            Product.objects.create(
+                seller=self.seller,
+                category=category,
+                name=f"Product {number}",
+                description="Test product",
+                price=Decimal("10.00"),
+                stock_quantity=5,
+            )
+            for number in range(4)
+        ]
+        self.cart = Cart.objects.create(user=self.buyer)
+        self.items = [
+            CartItem.objects.create(cart=self.cart, product=product, quantity=2, price_at_time=Decimal("10.00"))
+            for product in self.products
+        ]
+        self.client.force_login(self.buyer)
+
+    def apply_discount(self, **kwargs):
+        now = timezone.now()
+        fields = {
+            "code": "SAVE10",
+            "name": "Ten percent",
+            "discount_type": "percentage",
+            "discount_value": Decimal("10"),
+            "valid_from": now - timedelta(days=1),
+            "valid_until": now + timedelta(days=1),
+            **kwargs,
+        }
+        AppliedDiscount.objects.create(cart=self.cart, discount=Discount.objects.create(**fields))
+
+    def test_whole_cart_in_one_query(self):
+        self.apply_discount()
+        with CaptureQueriesContext(connection) as queries:
+            check = validate_cart(self.cart)
+            names = [item.product.seller.username for item in check.items]
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(names, ["seller"] * 4)
+        self.assertTrue(check.ok)
+        self.assertEqual((check.subtotal, check.discount_amount, check.total_price), (80, 8, 72))
+
+    def test_reports_every_problem_by_line(self):
+        Product.objects.filter(id=self.products[0].id).update(stock_quantity=1)
+        Product.objects.filter(id=self.products[1].id).update(is_active=False)
+        Product.objects.filter(id=self.products[2].id).update(price=Decimal("12.00"))
+        self.apply_discount(valid_until=timezone.now() - timedelta(hours=1))
+
+        check = validate_cart(self.cart)
+        problems = [(problem.code, problem.item.id if problem.item else None) for problem in check.problems]
+        self.assertEqual(
+            problems,
+            [
+                ("insufficient_stock", self.items[0].id),
+                ("inactive", self.items[1].id),
+                ("price_changed", self.items[2].id),
+                ("discount_invalid", None),
+            ],
+        )
+        self.assertEqual([problem.code for problem in check.errors], ["insufficient_stock", "inactive"])
+        self.assertEqual(check.problems_for(check.items[0])[0].as_dict()["available"], 1)
+        self.assertEqual(check.total_price, 80)
+
+    def test_views_share_the_validation(self):
+        Product.objects.filter(id=self.products[0].id).update(stock_quantity=0)
+
+        response = self.client.get("/cart/checkout/", follow=True)
+        self.assertRedirects(response, "/cart/")
+        self.assertContains(response, "Not enough stock for Product 0")
+
+        shipping = {
+            "shipping_name": "Buyer",
+            "shipping_email": "buyer@example.com",
+            "shipping_phone": "123",
+            "shipping_address": "Road 1",
+            "shipping_city": "Dhaka",
+            "shipping_country": "Bangladesh",
+        }
+        response = self.client.post("/orders/create/", {"payment_method": "crazycart_wallet", **shipping})
+        self.assertRedirects(response, "/cart/", fetch_redirect_response=False)
+        response = self.client.post("/cart/online-checkout/", shipping)
+        self.assertRedirects(response, "/cart/", fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+
+    def test_checkout_shows_warnings_and_totals(self):
+        self.apply_discount()
+        Product.objects.filter(id=self.products[3].id).update(price=Decimal("9.00"))
+        response = self.client.get("/cart/checkout/")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Product 3 is now ৳9.00")
+        self.assertEqual(response.context["checkout"].total_price, 72)
+
+
+class StockReservationTests(TestCase):
+    shipping = {
+        "shipping_name": "Buyer",
+        "shipping_email": "buyer@example.com",
+        "shipping_phone": "123",
+        "shipping_address": "Road 1",
+        "shipping_city": "Dhaka",
+        "shipping_country": "Bangladesh",
+    }
+
+    def setUp(self):
+        cache.clear()
+        seller = User.objects.create_user("seller", password="pass1234", user_type="seller")
+        self.product = Product.objects.create(
+            seller=seller,
+            category=Category.objects.create(name="Phones"),
+            name="Last phone",
+            description="Test product",
+            price=Decimal("10.00"),
+            stock_quantity=1,
+        )
+        self.buyers = []
+        for name in ("first", "second"):
+            buyer = User.objects.create_user(name, password="pass1234")
+            cart = Cart.objects.create(user=buyer)
+            CartItem.objects.create(cart=cart, product=self.product, quantity=1, price_at_time=Decimal("10.00"))
+            self.buyers.append(buyer)
+
+    def start_payment(self, buyer):
+        self.client.force_login(buyer)
+        return self.client.post("/cart/online-checkout/", self.shipping)
+
+    def pay(self, order):
+        return self.client.post(
+            "/orders/complete-cart-payment/",
+            {"order_id": order.id, "payment_method": "credit_card"},
+            content_type="application/json",
+        ).json()
+
+    def test_reserved_stock_is_not_sold_twice(self):
+        self.assertEqual(self.start_payment(self.buyers[0]).status_code, 200)
+        self.assertEqual(available_stock([self.product.id]), {self.product.id: 0})
+
+        response = self.start_payment(self.buyers[1])
+        self.assertRedirects(response, "/cart/", fetch_redirect_response=False)
+        self.assertEqual(validate_cart(self.buyers[1].cart).errors[0].code, "out_of_stock")
+
+        self.client.force_login(self.buyers[0])
+        self.assertTrue(self.pay(Order.objects.get(user=self.buyers[0]))["success"])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_starting_again_replaces_the_earlier_hold(self):
+        self.start_payment(self.buyers[0])
+        self.start_payment(self.buyers[0])
+        orders = Order.objects.filter(user=self.buyers[0]).order_by("id")
+        self.assertEqual([order.status for order in orders], ["cancelled", "pending"])
+        self.assertEqual(list(StockReservation.objects.values_list("order_id", flat=True)), [orders[1].id])
+
+    def test_wallet_checkout_rechecks_stock_under_the_lock(self):
+        from .services import CheckoutError, place_cart_order
+
+        buyer = self.buyers[1]
+        # Validated just before another buyer's payment page put a hold on the last unit
+        stale = validate_cart(buyer.cart)
+        self.start_payment(self.buyers[0])
+        with mock.patch("orders.services.validate_cart", return_value=stale):
+            with self.assertRaises(CheckoutError) as raised:
+                place_cart_order(buyer, buyer.cart, "cash_on_delivery", self.shipping)
+        self.assertEqual(raised.exception.code, "cart")
+        self.assertFalse(Order.objects.filter(user=buyer).exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 1)
+
+    def test_buy_now_takes_stock_and_debits_once(self):
+        buyer = self.buyers[0]
+        User.objects.filter(id=buyer.id).update(crazycart_balance=Decimal("25.00"))
+        self.client.force_login(buyer)
+        self.client.post("/cart/buy-now/", {"product_id": self.product.id, "quantity": 1})
+
+        self.assertTrue(self.client.post("/orders/payment/buy-now/").json()["success"])
+        self.assertFalse(self.client.post("/orders/payment/buy-now/").json()["success"])
+        self.product.refresh_from_db()
+        buyer.refresh_from_db()
+        self.assertEqual((self.product.stock_quantity, buyer.crazycart_balance), (0, Decimal("15.00")))
+
+    def test_stock_is_never_taken_below_zero(self):
+        from .services import CheckoutError, decrement_stock
+
+        self.start_payment(self.buyers[0])
+        order = Order.objects.get()
+        order.items.update(quantity=2)
+        with self.assertRaises(CheckoutError):
+            decrement_stock(order)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 1)
+
+    def test_cancelling_gives_back_the_held_stock(self):
+        self.start_payment(self.buyers[0])
+        order = Order.objects.get()
+        self.client.post(f"/orders/{order.order_number}/cancel/")
+        order.refresh_from_db()
+        self.assertEqual(order.status, "cancelled")
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertTrue(validate_cart(self.buyers[1].cart).ok)
+
+    def test_sweeper_releases_expired_holds(self):
+        self.start_payment(self.buyers[0])
+        order = Order.objects.get()
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        out = StringIO()
+        call_command("release_expired_reservations", batch_size=1, stdout=out)
+        self.assertIn("Released 1 reservations and cancelled 1 unpaid orders", out.getvalue())
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.payment.status), ("cancelled", "failed"))
+        self.assertFalse(self.pay(order)["success"])
+        self.assertTrue(validate_cart(self.buyers[1].cart).ok)
+
+
+class AddressBookTests(TestCase):
+    shipping = StockReservationTests.shipping
+
+    def setUp(self):
+        seller = User.objects.create_user("seller", password="pass1234", user_type="seller")
+        product = Product.objects.create(
+            seller=seller,
+            category=Category.objects.create(name="Phones"),
+            name="Phone",
+            description="Test product",
+            price=Decimal("10.00"),
+            stock_quantity=5,
+        )
+        self.buyer = User.objects.create_user("buyer", password="pass1234")
+        CartItem.objects.create(cart=Cart.objects.create(user=self.buyer), product=product, quantity=1)
+        self.client.force_login(self.buyer)
+
+    def test_same_address_is_stored_once(self):
+        self.client.post("/cart/online-checkout/", self.shipping)
+        retyped = {**self.shipping, "shipping_city": "  dhaka ", "shipping_address": "road  1"}
+        self.client.post("/cart/online-checkout/", retyped)
+
+        orders = Order.objects.filter(user=self.buyer)
+        self.assertEqual(orders.count(), 2)
+        self.assertEqual(Address.objects.filter(user=self.buyer).count(), 1)
+        self.assertEqual({(order.shipping_id, order.billing_id) for order in orders}, {(orders[0].shipping_id,) * 2})
+        self.assertEqual(orders[0].shipping.city, "Dhaka")
+
+    def test_checkout_prefills_the_default_address(self):
+        self.client.post("/cart/online-checkout/", self.shipping)
+        fields = {field: f"{field} 2" for field in ("name", "phone", "address", "city", "country")}
+        self.client.post("/accounts/addresses/", {**fields, "email": "two@example.com", "make_default": "on"})
+
+        response = self.client.get("/cart/checkout/")
+        self.assertEqual(response.context["shipping"]["city"], "city 2")
+        self.assertEqual(len(response.context["saved_addresses"]), 2)
+
+    def test_removed_address_stays_on_orders(self):
+        self.client.post("/cart/online-checkout/", self.shipping)
+        order = Order.objects.get(user=self.buyer)
+        self.client.post(f"/accounts/addresses/{order.shipping_id}/remove/")
+
+        order.refresh_from_db()
+        self.assertEqual(order.shipping.city, "Dhaka")
+        self.assertFalse(Address.objects.filter(user=self.buyer, saved=True).exists())
+        self.assertEqual(self.client.get("/cart/checkout/").context["shipping"]["city"], "")
+
+        # Checking out with it again doesn't bring it back; saving it in the book does
+        self.client.post("/cart/online-checkout/", self.shipping)
+        self.assertEqual(Order.objects.filter(user=self.buyer, shipping_id=order.shipping_id).count(), 2)
+        self.assertFalse(Address.objects.filter(user=self.buyer, saved=True).exists())
+        fields = {field.removeprefix("shipping_"): value for field, value in self.shipping.items()}
+        self.client.post("/accounts/addresses/", fields)
+        self.assertEqual(list(Address.objects.filter(user=self.buyer, saved=True)), [order.shipping])
+
+    def test_deleting_a_user_takes_their_orders_and_addresses(self):
+        from django.db.models import RestrictedError
+
+        self.client.post("/cart/online-checkout/", self.shipping)
+        order = Order.objects.get(user=self.buyer)
+        # Still on an order, so it can't go on its own
+        with self.assertRaises(RestrictedError):
+            Address.objects.filter(id=order.shipping_id).delete()
+
+        self.buyer.delete()
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(Address.objects.exists())
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seller = User.objects.create_user("seller", password="pass1234", user_type="seller")
+        product = Product.objects.create(
+            seller=seller,
+            category=Category.objects.create(name="Phones"),
+            name="Phone",
+            description="Test product",
+            price=Decimal("10.00"),
+            stock_quantity=3,
+        )
+        self.buyer = User.objects.create_user("buyer", password="pass1234")
+        cart = Cart.objects.create(user=self.buyer)
+        CartItem.objects.create(cart=cart, product=product, quantity=1, price_at_time=Decimal("10.00"))
+        self.client.force_login(self.buyer)
+        self.client.post("/cart/online-checkout/", StockReservationTests.shipping)
+        self.order = Order.objects.get()
+
+    def pay(self, key, payment_method="credit_card", order=None):
+        return self.client.post(
+            "/orders/complete-cart-payment/",
+            {"order_id": (order or self.order).id, "payment_method": payment_method},
+            content_type="application/json",
+            headers={"Idempotency-Key": key},
+        )
+
+    def test_retry_gets_the_first_response(self):
+        first = self.pay("attempt-1")
+        self.assertTrue(first.json()["success"])
+        retry = self.pay("attempt-1")
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Order.objects.get().payment_status, "paid")
+        # Without the key the order is no longer payable
+        self.assertFalse(self.pay("attempt-2").json()["success"])
+
+    def test_key_reused_for_another_request(self):
+        self.pay("attempt-1")
+        response = self.pay("attempt-1", payment_method="bkash")
+        self.assertEqual(response.status_code, 422)
+
+    def test_duplicate_in_flight_is_refused(self):
+        request = RequestFactory().post(
+            "/orders/complete-cart-payment/",
+            {"order_id": self.order.id, "payment_method": "credit_card"},
+            content_type="application/json",
+        )
+        IdempotencyKey.objects.create(
+            user=self.buyer,
+            key="attempt-1",
+            fingerprint=request_fingerprint(request),
+            locked_until=timezone.now() + timedelta(seconds=30),
+        )
+        self.assertEqual(self.pay("attempt-1").status_code, 409)
+        self.assertEqual(Order.objects.get().payment_status, "pending")
+
+    def test_failures_are_not_stored(self):
+        release_order(self.order)
+        self.assertFalse(self.pay("attempt-1").json()["success"])
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_wallet_payment_without_a_key_debits_once(self):
+        User.objects.filter(id=self.buyer.id).update(crazycart_balance=Decimal("15.00"))
+        first = self.client.post("/orders/payment/process/").json()
+        self.assertTrue(first["success"], first)
+        second = self.client.post("/orders/payment/process/").json()
+        self.assertFalse(second["success"])
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.crazycart_balance, Decimal("5.00"))
+        self.assertEqual(Order.objects.filter(payment__payment_method="crazycart_wallet").count(), 1)
+
+
+def simulator(**options):
+    return dict(settings.PAYMENT_GATEWAY, OPTIONS=dict(settings.PAYMENT_GATEWAY["OPTIONS"], **options))
+
+
+class PaymentGatewayTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seller = User.objects.create_user("seller", password="pass1234", user_type="seller")
+        self.product = Product.objects.create(
+            seller=seller,
+            category=Category.objects.create(name="Phones"),
+            name="Phone",
+            description="Test product",
+            price=Decimal("10.00"),
+            stock_quantity=3,
+        )
+        self.buyer = User.objects.create_user("buyer", password="pass1234")
+        cart = Cart.objects.create(user=self.buyer)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1, price_at_time=Decimal("10.00"))
+        self.client.force_login(self.buyer)
+        self.client.post("/cart/online-checkout/", StockReservationTests.shipping)
+        self.order = Order.objects.get()
+
+    def pay(self):
+        return self.client.post(
+            "/orders/complete-cart-payment/",
+            {"order_id": self.order.id, "payment_method": "credit_card"},
+            content_type="application/json",
+        ).json()
+
+    def webhook(self, event, signature=None):
+        body = json.dumps(event).encode()
+        return self.client.post(
+            "/orders/payment/webhook/",
+            body,
+            content_type="application/json",
+            headers={SIGNATURE_HEADER: signature or get_gateway().sign(body)},
+        )
+
+    def status(self):
+        return self.client.get(f"/orders/{self.order.order_number}/payment-status/").json()
+
+    def test_webhook_confirms_the_payment(self):
+        with override_settings(PAYMENT_GATEWAY=simulator(webhooks="inline", duplicate_rate=1)):
+            with self.captureOnCommitCallbacks() as callbacks:
+                data = self.pay()
+            self.assertTrue(data["pending"])
+            self.assertEqual(self.status()["payment_status"], "pending")
+            for callback in callbacks:
+                callback()
+
+        self.assertEqual((self.status()["status"], self.status()["payment_status"]), ("confirmed", "paid"))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 2)
+        self.assertFalse(CartItem.objects.exists())
+        # The second delivery of the same event was recognised
+        self.assertEqual(list(PaymentEvent.objects.values_list("outcome", flat=True)), ["paid"])
+
+    def test_no_second_charge_while_the_first_is_pending(self):
+        with override_settings(PAYMENT_GATEWAY=simulator(webhooks="inline")):
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.assertTrue(self.pay()["pending"])
+                self.assertTrue(self.pay()["pending"])
+            # One charge, so one webhook on its way
+            self.assertEqual(len(callbacks), 1)
+            callbacks[0]()
+        self.assertEqual(Order.objects.get().payment_status, "paid")
+
+    def test_extra_charge_for_a_paid_order_is_refunded(self):
+        self.assertTrue(self.pay()["success"])
+        payment = Payment.objects.get()
+        event = {"type": "payment.succeeded", "reference": payment.transaction_id}
+        paid_by = payment.gateway_response["charge"]
+        self.assertEqual(self.webhook(dict(event, id="evt_1", charge=paid_by)).json()["outcome"], "ignored")
+        self.assertEqual(self.webhook(dict(event, id="evt_2", charge="ch_other")).json()["outcome"], "refunded")
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.gateway_response["charge"]), ("paid", paid_by))
+
+    def test_charge_is_refunded_when_settling_fails(self):
+        with mock.patch("orders.payments.settle_payment", side_effect=RuntimeError("database went away")):
+            data = self.pay()
+        self.assertIn("refunded", data["error"])
+        payment = Payment.objects.get()
+        self.assertEqual((payment.status, payment.gateway_response["status"]), ("refunded", "refunded"))
+        self.assertEqual(Order.objects.get().status, "cancelled")
+
+    def test_items_added_while_paying_stay_in_the_cart(self):
+        other = Product.objects.create(
+            seller=self.product.seller,
+            category=self.product.category,
+            name="Case",
+            description="Test product",
+            price=Decimal("5.00"),
+            stock_quantity=3,
+        )
+        CartItem.objects.create(cart=self.buyer.cart, product=other, quantity=1, price_at_time=Decimal("5.00"))
+        self.assertTrue(self.pay()["success"])
+        self.assertEqual(list(CartItem.objects.values_list("product_id", flat=True)), [other.id])
+
+    def test_declined_charge_can_be_retried(self):
+        with override_settings(PAYMENT_GATEWAY=simulator(failure_rate=1)):
+            data = self.pay()
+        self.assertIn("declined", data["error"])
+        self.assertEqual(self.order.reservations.count(), 1)
+        self.assertTrue(self.pay()["success"])
+        self.assertEqual(Order.objects.get().payment_status, "paid")
+
+    def test_webhook_is_verified_and_applied_once(self):
+        event = {"id": "evt_1", "type": "payment.failed", "reference": self.order.payment.transaction_id}
+        self.assertEqual(self.webhook(event, signature="forged").status_code, 400)
+        self.assertEqual(self.webhook(event).json()["outcome"], "failed")
+        self.assertEqual(self.webhook(event).json()["outcome"], "duplicate")
+        self.assertEqual(self.status()["payment_status"], "failed")
+
+    def test_late_payment_for_cancelled_order_is_refunded(self):
+        release_order(self.order)
+        event = {"id": "evt_1", "type": "payment.succeeded", "reference": self.order.payment.transaction_id}
+        self.assertEqual(self.webhook(event).json()["outcome"], "refunded")
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.payment_status), ("cancelled", "refunded"))
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller", password="pass1234", user_type="seller")
+        self.product = Product.objects.create(
+            seller=self.seller,
+            category=Category.objects.create(name="Phones"),
+            name="Phone",
+            description="Test product",
+            price=Decimal("10.00"),
+            stock_quantity=3,
+            allow_bargaining=True,
+        )
+        self.buyer = User.objects.create_user(
+            "buyer", password="pass1234", email="buyer@example.com", crazycart_balance=Decimal("15.00")
+        )
+        self.client.force_login(self.buyer)
+        self.received = []
+        self.failing = set()
+
+        @handler("order.*")
+        def record(events):
+            self.received.extend(event.key for event in events)
+            if self.failing & {event.key for event in events}:
+                raise RuntimeError("handler down")
+
+        self.addCleanup(_handlers.remove, ("order.*", record))
+
+    def place_order(self, quantity=1):
+        cart, _ = Cart.objects.get_or_create(user=self.buyer)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=quantity, price_at_time=Decimal("10.00"))
+        return self.client.post(
+            "/orders/create/", {"payment_method": "crazycart_wallet", **StockReservationTests.shipping}
+        )
+
+    def test_events_commit_with_the_change(self):
+        self.place_order()
+        order = Order.objects.get()
+        self.client.post(f"/orders/{order.order_number}/cancel/")
+        self.assertEqual(
+            list(OutboxEvent.objects.order_by("id").values_list("topic", "stream")),
+            [("order.created", f"order:{order.id}"), ("order.cancelled", f"order:{order.id}")],
+        )
+        self.assertEqual(OutboxEvent.objects.get(topic="order.cancelled").payload["refunded"], True)
+
+        # The wallet can't pay for two: no order, and no event
+        CartItem.objects.all().delete()
+        self.buyer.refresh_from_db()
+        self.buyer.crazycart_balance = Decimal("5.00")
+        self.buyer.save()
+        self.place_order()
+        self.assertEqual(OutboxEvent.objects.count(), 2)
+
+    def test_bargain_responses_are_recorded(self):
+        from bargaining.services import create_bargain, respond_to_bargain
+
+        bargain = create_bargain(self.buyer, self.product, "8.00")
+        respond_to_bargain(bargain, self.seller, "counter", counter_offer="9.00")
+        respond_to_bargain(bargain, self.buyer, "accept")
+        events = list(OutboxEvent.objects.order_by("id"))
+        self.assertEqual([event.topic for event in events], ["bargain.countered", "bargain.accepted"])
+        self.assertEqual(events[1].payload["offer"], "9.00")
+
+    def test_relay_delivers_in_order_and_retries(self):
+        for number in (1, 2):
+            emit("order.created", f"order:{number}", f"created:{number}", {})
+            emit("order.paid", f"order:{number}", f"paid:{number}", {})
+        emit("order.paid", "order:1", "paid:1", {"duplicate": True})
+        emit("bargain.accepted", "bargain:1", "accepted:1", {})
+        self.failing = {"created:1"}
+
+        stats = relay()
+        self.assertEqual((stats["delivered"], stats["failed"]), (3, 1))
+        self.assertEqual(
+            set(OutboxEvent.objects.filter(delivered_at=None).values_list("key", flat=True)), {"created:1", "paid:1"}
+        )
+        failed = OutboxEvent.objects.get(key="created:1")
+        self.assertEqual((failed.attempts, failed.delivered_at), (1, None))
+        self.assertIn("handler down", failed.last_error)
+
+        # Backing off: order 1 waits, nothing else is due
+        self.received.clear()
+        self.assertEqual(relay()["delivered"], 0)
+        self.failing.clear()
+        OutboxEvent.objects.update(available_at=timezone.now())
+        relay()
+        self.assertEqual(self.received, ["created:1", "paid:1"])
+        self.assertFalse(OutboxEvent.objects.filter(delivered_at=None).exists())
+
+    def test_backing_off_events_do_not_fill_the_batch(self):
+        for number in (1, 2, 3):
+            emit("order.created", f"order:{number}", f"created:{number}", {})
+        emit("order.created", "order:4", "created:4", {})
+        self.failing = {"created:1", "created:2", "created:3"}
+        self.assertEqual(relay(batch_size=3, max_batches=1)["failed"], 3)
+
+        self.received.clear()
+        stats = relay(batch_size=3)
+        self.assertEqual(stats["delivered"], 1)
+        self.assertEqual(self.received, ["created:4"])
+
+
+class SellerOrdersTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sellers = [
+            User.objects.create_user(name, password="pass1234", user_type="seller") for name in ("north", "south")
+        ]
+        category = Category.objects.create(name="Phones")
+        self.products = [
+            Product.objects.create(
+                seller=seller,
+                category=category,
+                name=f"{seller.username} phone",
+                description="Test product",
+                price=Decimal("10.00"),
+                stock_quantity=50,
+            )
+            for seller in self.sellers
+        ]
+        self.buyer = User.objects.create_user("buyer", password="pass1234")
+        self.client.force_login(self.sellers[0])
+
+    def order(self, *products, status="confirmed"):
+        address = address_for(self.buyer, {**{field: "x" for field in ADDRESS_FIELDS}, "email": "buyer@example.com"})
+        order = Order.objects.create(
+            user=self.buyer,
+            status=status,
+            subtotal=Decimal("10.00"),
+            total_amount=Decimal("10.00"),
+            shipping=address,
+            billing=address,
+        )
+        for product in products:
+            OrderItem.objects.create(
+                order=order, product=product, seller_id=product.seller_id, quantity=1, price_at_time=product.price
+            )
+        return order
+
+    def bulk(self, orders, status, **extra):
+        return self.client.post(
+            "/orders/seller/orders/bulk-update/",
+            {"order_numbers": [order.order_number for order in orders], "status": status, **extra},
+            headers={"X-Requested-With": "XMLHttpRequest"},
+        ).json()
+
+
+
+class SellerExportTests(SellerOrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.orders = [self.order(*self.products) for _ in range(3)]
+        OrderItem.objects.filter(order=self.orders[0]).update(created_at=timezone.now() - timedelta(days=40))
+        OrderItem.objects.filter(order=self.orders[1]).update(status="shipped", tracking_number="TRK1")
+
+    def export(self, **params):
+        response = self.client.get("/orders/seller/orders/export/", params)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_streams_only_the_sellers_items(self):
+        lines = self.export().splitlines()
+        self.assertEqual(lines[0].split(",")[:4], ["order_number", "product", "sku", "quantity"])
+        self.assertEqual([line.split(",")[0] for line in lines[1:]], [order.order_number for order in self.orders])
+        self.assertTrue(all(",north phone," in line for line in lines[1:]))
+
+    def test_filters(self):
+        lines = self.export(status="shipped").splitlines()[1:]
+        self.assertEqual(len(lines), 1)
+        self.assertIn(",shipped,TRK1,", lines[0])
+
+        since = (timezone.localdate() - timedelta(days=7)).isoformat()
+        self.assertEqual(len(self.export(**{"from": since}).splitlines()), 3)
+        self.assertEqual(len(self.export(to=since).splitlines()), 2)
+
+        response = self.client.get("/orders/seller/orders/export/", {"status": "lost"})
+        self.assertRedirects(response, "/orders/seller/orders/", fetch_redirect_response=False)
+
+    def test_jsonl_and_command(self):
+        records = [json.loads(line) for line in self.export(format="jsonl").splitlines()]
+        self.assertEqual(len(records), 3)
+        self.assertEqual((records[0]["quantity"], records[0]["price"], records[0]["shipped_at"]), (1, "10.00", None))
+
+        with tempfile.NamedTemporaryFile("r", suffix=".jsonl") as f:
+            call_command(
+                "export_seller_orders", "north", "--format=jsonl", "--status=shipped", "-o", f.name, stderr=StringIO()
+            )
+            self.assertEqual([json.loads(line)["tracking_number"] for line in f], ["TRK1"])
+
+
+class OrderTransitionTests(SellerOrdersTestCase):
+    def test_bulk_ship_in_a_fixed_number_of_queries(self):
+        north, south = self.products
+        own = [self.order(north) for _ in range(10)]
+        shared = self.order(north, south)
+        unpaid = self.order(north, status="pending")
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.bulk(own + [shared, unpaid], "shipped")
+        self.assertLess(len(queries), 20)
+        self.assertEqual((data["updated"], data["skipped"]), (11, 1))
+
+        order = Order.objects.get(id=own[0].id)
+        self.assertEqual(order.status, "shipped")
+        self.assertIsNotNone(order.shipped_at)
+        item = order.items.get()
+        self.assertEqual(item.status, "shipped")
+        self.assertIsNotNone(item.shipped_at)
+        self.assertTrue(OrderTracking.objects.filter(order=order, status="shipped").exists())
+        # The other seller hasn't started, so the shared order is still confirmed
+        self.assertEqual(Order.objects.get(id=shared.id).status, "confirmed")
+        self.assertEqual(Order.objects.get(id=unpaid.id).items.get().status, "pending")
+        self.assertEqual(OutboxEvent.objects.filter(topic="order.status_changed").count(), 11)
+
+        # Once both sellers ship, the shared order follows
+        self.client.force_login(self.sellers[1])
+        self.bulk([shared], "processing")
+        self.assertEqual(Order.objects.get(id=shared.id).status, "processing")
+        self.bulk([shared], "shipped")
+        self.assertEqual(Order.objects.get(id=shared.id).status, "shipped")
+
+    def test_bulk_update_does_not_share_one_tracking_number(self):
+        orders = [self.order(self.products[0]) for _ in range(2)]
+        self.assertEqual(self.bulk(orders, "shipped", tracking_number="TRK1")["updated"], 2)
+        self.assertFalse(OrderItem.objects.filter(tracking_number="TRK1").exists())
+
+    def test_only_allowed_transitions(self):
+        order = self.order(self.products[0])
+        response = self.client.post(f"/orders/seller/orders/{order.order_number}/update/", {"status": "delivered"})
+        self.assertFalse(response.json()["success"])
+        self.assertFalse(self.bulk([order], "cancelled")["success"])
+
+        self.bulk([order], "shipped")
+        response = self.client.post(f"/orders/seller/orders/{order.order_number}/update/", {"status": "delivered"})
+        self.assertTrue(response.json()["success"])
+        order.refresh_from_db()
+        self.assertEqual(order.status, "delivered")
+        self.assertIsNotNone(order.delivered_at)
+        self.assertEqual(order.items.get().tracking_number, None)
+        self.assertFalse(self.bulk([order], "shipped")["success"])
+
+
+class TrackingIngestionTests(SellerOrdersTestCase):
+    def ship(self, order, number):
+        response = self.client.post(
+            f"/orders/seller/orders/{order.order_number}/update/", {"status": "shipped", "tracking_number": number}
+        )
+        self.assertTrue(response.json()["success"])
+
+    def post_updates(self, updates, signature=None):
+        from .tracking import SIGNATURE_HEADER, sign
+
+        body = json.dumps({"carrier": "local", "updates": updates}).encode()
+        return self.client.post(
+            "/orders/tracking/webhook/",
+            body,
+            content_type="application/json",
+            headers={SIGNATURE_HEADER: signature or sign(body)},
+        )
+
+    def test_carrier_scans_deliver_the_order(self):
+        from .tracking import LocalCarrier, ingest_updates
+
+        orders = [self.order(self.products[0]) for _ in range(20)]
+        for number, order in enumerate(orders):
+            self.ship(order, f"TRK{number}")
+        carrier = LocalCarrier(transit_days=2)
+        shipped_at = timezone.now()
+        updates = [
+            update for number in range(20) for update in carrier.scans(f"TRK{number}", "Sylhet", shipped_at)
+        ]
+        updates.append({"tracking_number": "NOPE", "event_id": "1", "status": "in_transit"})
+        updates.append({"tracking_number": "TRK0", "event_id": "2", "status": "lost"})
+
+        with CaptureQueriesContext(connection) as queries:
+            stats = ingest_updates(updates)
+        self.assertLess(len(queries), 20)
+        self.assertEqual((stats["applied"], stats["unmatched"], stats["invalid"]), (100, 1, 1))
+
+        order = Order.objects.get(id=orders[0].id)
+        self.assertEqual(order.status, "delivered")
+        self.assertIsNotNone(order.delivered_at)
+        self.assertEqual(
+            timezone.localdate(order.estimated_delivery), timezone.localdate(shipped_at + timedelta(days=2))
+        )
+        self.assertEqual(order.items.get().status, "delivered")
+        timeline = order.tracking_updates.exclude(carrier_event_id=None).order_by("occurred_at")
+        self.assertEqual(
+            [entry.location for entry in timeline],
+            ["Seller pickup", "Dhaka sorting center", "Sylhet hub", "Sylhet", "Sylhet"],
+        )
+
+        # Carriers resend; nothing is applied twice
+        stats = ingest_updates(updates)
+        self.assertEqual((stats["applied"], stats["duplicates"]), (0, 100))
+        self.assertEqual(order.tracking_updates.exclude(carrier_event_id=None).count(), 5)
+
+        self.client.force_login(self.buyer)
+        response = self.client.get(f"/orders/{order.order_number}/track/")
+        self.assertContains(response, "Sylhet hub")
+        self.assertContains(response, "TRK0")
+
+    def test_shipping_sets_an_estimate_and_waits_for_every_parcel(self):
+        from .tracking import ingest_updates
+
+        north, south = self.products
+        order = self.order(north, south)
+        self.ship(order, "NORTH1")
+        self.client.force_login(self.sellers[1])
+        self.ship(order, "SOUTH1")
+
+        ingest_updates([{"tracking_number": "NORTH1", "event_id": "n1", "status": "delivered"}])
+        order.refresh_from_db()
+        self.assertEqual(order.status, "shipped")
+        self.assertEqual(
+            order.estimated_delivery, order.shipped_at + timedelta(days=settings.DELIVERY_ESTIMATE_DAYS)
+        )
+        ingest_updates([{"tracking_number": "SOUTH1", "event_id": "s1", "status": "delivered"}])
+        order.refresh_from_db()
+        self.assertEqual(order.status, "delivered")
+        self.assertEqual(
+            OutboxEvent.objects.filter(topic="order.status_changed", payload__status="delivered").count(), 1
+        )
+
+    def test_malformed_fields_are_rejected(self):
+        from .tracking import TrackingError, parse_update
+
+        update = {"tracking_number": "TRK1", "event_id": "e1", "status": "in_transit"}
+        for field, value in [
+            ("status", ["in_transit"]),
+            ("status", {"code": "in_transit"}),
+            ("occurred_at", 1700000000),
+            ("estimated_delivery", ["2024-01-01"]),
+            ("occurred_at", "2024-02-30"),
+        ]:
+            with self.subTest(field=field, value=value), self.assertRaises(TrackingError):
+                parse_update(dict(update, **{field: value}))
+
+        response = self.post_updates([dict(update, status=["in_transit"]), dict(update, occurred_at=1)])
+        self.assertEqual(response.status_code, 200)
+
+    def test_webhook_checks_the_signature(self):
+        order = self.order(self.products[0])
+        self.ship(order, "TRK9")
+        update = {"tracking_number": "TRK9", "event_id": "e1", "status": "out_for_delivery", "location": "Khulna"}
+
+        self.assertEqual(self.post_updates([update], signature="forged").status_code, 400)
+        data = self.post_updates([update]).json()
+        self.assertEqual((data["success"], data["applied"]), (True, 1))
+        self.assertTrue(OrderTracking.objects.filter(order=order, location="Khulna").exists())
+
+
+class OrderArchiveTests(SellerOrdersTestCase):
+    def test_old_finished_orders_move_to_the_archive(self):
+        north = self.products[0]
+        old, recent, open_order = self.order(north), self.order(north), self.order(north)
+        Payment.objects.create(order=old, payment_method="bkash", amount=old.total_amount, status="paid")
+        self.bulk([old, recent, open_order], "shipped")
+        self.bulk([old, recent], "delivered")
+        long_ago = timezone.now() - timedelta(days=settings.ORDER_ARCHIVE_AFTER_DAYS + 1)
+        Order.objects.filter(id__in=[old.id, open_order.id]).update(updated_at=long_ago)
+
+        out = StringIO()
+        call_command("archive_orders", "--batch-size", "1", stdout=out)
+        self.assertIn("Archived 1 orders", out.getvalue())
+        self.assertEqual(set(Order.objects.values_list("id", flat=True)), {recent.id, open_order.id})
+        self.assertFalse(OrderItem.objects.filter(order_id=old.id).exists())
+        self.assertFalse(OrderTracking.objects.filter(order_id=old.id).exists())
+        archived = ArchivedOrder.objects.get()
+        self.assertEqual((archived.order_number, archived.status), (old.order_number, "delivered"))
+        self.assertEqual(archived.data["payment"]["payment_method"], "bkash")
+
+        self.client.force_login(self.buyer)
+        response = self.client.get(f"/orders/{old.order_number}/")
+        self.assertContains(response, "This order is archived.")
+        self.assertContains(response, north.name)
+        self.assertEqual(response.context["order"].total_amount, old.total_amount)
+        self.assertNotContains(self.client.get("/orders/"), old.order_number)
+        self.assertContains(self.client.get("/orders/?archived=1"), old.order_number)
+
+        self.client.force_login(self.sellers[1])
+        self.assertEqual(self.client.get(f"/orders/{old.order_number}/").status_code, 404)
+
+    def test_archived_orders_stay_with_their_sellers(self):
+        from .archive import archive_orders
+
+        north, south = self.products
+        old, live = self.order(north, south), self.order(north)
+        for seller in self.sellers:
+            self.client.force_login(seller)
+            self.client.post(
+                f"/orders/seller/orders/{old.order_number}/update/",
+                {"status": "shipped", "tracking_number": f"TRK-{seller.username}"},
+            )
+            self.bulk([old], "delivered")
+        OrderItem.objects.filter(order=live).update(created_at=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(archive_orders(timezone.now() + timedelta(seconds=1)), 1)
+        archived = ArchivedOrder.objects.get()
+        self.assertEqual(set(archived.sellers.all()), set(self.sellers))
+
+        self.client.force_login(self.buyer)
+        response = self.client.get(f"/orders/{old.order_number}/track/")
+        self.assertContains(response, "TRK-north, TRK-south")
+
+        self.client.force_login(self.sellers[0])
+        self.assertNotContains(self.client.get("/orders/seller/orders/"), old.order_number)
+        response = self.client.get("/orders/seller/orders/?archived=1")
+        self.assertContains(response, old.order_number)
+        self.assertEqual([item.product.name for item in response.context["page_obj"].object_list], [north.name])
+        response = self.client.get(f"/orders/seller/orders/{old.order_number}/detail/")
+        self.assertContains(response, "This order is archived.")
+        self.assertEqual(response.context["seller_total"], north.price)
+
+        response = self.client.get("/orders/seller/orders/export/")
+        lines = b"".join(response.streaming_content).decode().splitlines()[1:]
+        self.assertEqual([line.split(",")[0] for line in lines], [old.order_number, live.order_number])
+        self.assertIn(",north phone,", lines[0])
+        self.assertIn(",delivered,TRK-north,", lines[0])
+
+        other = User.objects.create_user("west", password="pass1234", user_type="seller")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(f"/orders/seller/orders/{old.order_number}/detail/").status_code, 404)
@@ -0,0 +1,304 @@
+"""
+Carrier tracking updates.
+
+Carriers report scans of the parcels sellers shipped, in batches: as a
+signed webhook to /orders/tracking/webhook/ or as JSON-lines files picked
+up by the ingest_tracking command. Each update looks like
+
+    {"tracking_number": "TRK123", "event_id": "e-1", "status": "in_transit",
+     "occurred_at": "2026-10-19T08:00:00+06:00", "location": "Dhaka hub",
+     "description": "Arrived at hub", "estimated_delivery": "2026-10-21"}
+
+ingest_updates() matches updates to order items by tracking number,
+moves the items (and through them their orders) along the state machine
+in orders.transitions, sets estimated_delivery and adds an OrderTracking
+entry per update to the buyer's timeline. It works a chunk of updates at
+a time with a fixed number of set-based queries, and an update whose
+event id was already recorded is skipped, so carriers may resend.
+
+LocalCarrier stands in for a real carrier in development and load tests;
+see the simulate_carrier command.
+"""
+import hashlib
+import hmac
+import json
+import random
+import urllib.request
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Order, OrderItem, OrderTracking
+from .outbox import emit_many, order_payload
+from .transitions import OPEN_ORDER_STATUSES, PROGRESS, advance_items, rollup_orders
+
+SIGNATURE_HEADER = "X-Carrier-Signature"
+
+# Updates applied per transaction
+CHUNK_SIZE = 500
+
+# Carrier statuses and the item status each one means; None only adds to the timeline
+CARRIER_STATUSES = {
+    "picked_up": "shipped",
+    "in_transit": "shipped",
+    "out_for_delivery": "shipped",
+    "delivered": "delivered",
+    "exception": None,
+}
+
+DEFAULT_MESSAGES = {
+    "picked_up": "Picked up by the carrier",
+    "in_transit": "In transit",
+    "out_for_delivery": "Out for delivery",
+    "delivered": "Delivered",
+    "exception": "Delivery problem reported by the carrier",
+}
+
+# Orders whose items still take carrier updates
+TRACKED_ORDER_STATUSES = OPEN_ORDER_STATUSES + ("delivered",)
+
+
+class TrackingError(Exception):
+    pass
+
+
+def sign(body):
+    return hmac.new(settings.CARRIER_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body, signature):
+    return hmac.compare_digest(sign(body), signature or "")
+
+
+def _when(value, field):
+    if not value:
+        return None
+    if not isinstance(value, str):
+        raise TrackingError(f"Invalid {field} {value!r}")
+    try:
+        when = parse_datetime(value)
+        if when is None:
+            day = parse_date(value)
+            if day is None:
+                raise TrackingError(f"Invalid {field} {value!r}")
+            when = datetime.combine(day, time.min)
+    except ValueError:
+        # Well formed but out of range, e.g. 2024-02-30
+        raise TrackingError(f"Invalid {field} {value!r}")
+    if timezone.is_naive(when):
+        when = timezone.make_aware(when)
+    return when
+
+
+def parse_update(raw):
+    """A carrier update as a dict with parsed fields, or TrackingError"""
+    if not isinstance(raw, dict):
+        raise TrackingError("Update must be an object")
+    number = str(raw.get("tracking_number") or "").strip()
+    event_id = str(raw.get("event_id") or "").strip()
+    status = raw.get("status")
+    if not number or not event_id:
+        raise TrackingError("Update needs a tracking_number and an event_id")
+    if not isinstance(status, str) or status not in CARRIER_STATUSES:
+        raise TrackingError(f"Unknown carrier status {status!r}")
+    return {
+        "tracking_number": number[:100],
+        "event_id": event_id[:100],
+        "status": status,
+        "location": str(raw.get("location") or "")[:200],
+        "description": str(raw.get("description") or ""),
+        "occurred_at": _when(raw.get("occurred_at"), "occurred_at") or timezone.now(),
+        "estimated_delivery": _when(raw.get("estimated_delivery"), "estimated_delivery"),
+    }
+
+
+def ingest_updates(updates, carrier="local"):
+    """Apply carrier updates in chunks; returns counts for metrics"""
+    stats = Counter()
+    for start in range(0, len(updates), CHUNK_SIZE):
+        stats.update(_ingest_chunk(updates[start : start + CHUNK_SIZE], carrier))
+    return stats
+
+
+def _ingest_chunk(raw_updates, carrier):
+    stats = Counter(received=len(raw_updates))
+    updates = []
+    for raw in raw_updates:
+        try:
+            updates.append(parse_update(raw))
+        except TrackingError:
+            stats["invalid"] += 1
+    # Timeline entries are written in the order things happened
+    updates.sort(key=lambda update: update["occurred_at"])
+    now = timezone.now()
+
+    with transaction.atomic():
+        orders_by_number = {}
+        for order_id, number in OrderItem.objects.filter(
+            tracking_number__in={update["tracking_number"] for update in updates},
+            order__status__in=TRACKED_ORDER_STATUSES,
+        ).values_list("order_id", "tracking_number"):
+            orders_by_number.setdefault(number, set()).add(order_id)
+
+        # One entry per order the parcel belongs to; a repeated event counts once
+        entries = {
+            (order_id, f"{carrier}:{update['event_id']}"): update
+            for update in updates
+            for order_id in orders_by_number.get(update["tracking_number"], ())
+        }
+        stats["unmatched"] = sum(1 for update in updates if update["tracking_number"] not in orders_by_number)
+        seen = set(
+            OrderTracking.objects.filter(carrier_event_id__in={key for _, key in entries}).values_list(
+                "order_id", "carrier_event_id"
+            )
+        )
+        new = [(order_id, key, update) for (order_id, key), update in entries.items() if (order_id, key) not in seen]
+        stats["duplicates"] = len(entries) - len(new)
+        if not new:
+            return stats
+
+        # Items only move forward, so only each parcel's furthest update matters
+        furthest = {}
+        for _, _, update in new:
+            status = CARRIER_STATUSES[update["status"]]
+            number = update["tracking_number"]
+            if status and PROGRESS[status] > PROGRESS.get(furthest.get(number), -1):
+                furthest[number] = status
+        for status in ("shipped", "delivered"):
+            numbers = [number for number, target in furthest.items() if PROGRESS[target] >= PROGRESS[status]]
+            if numbers:
+                stats["items_" + status] += advance_items(
+                    OrderItem.objects.filter(
+                        tracking_number__in=numbers, order__status__in=TRACKED_ORDER_STATUSES
+                    ),
+                    status,
+                    now,
+                )
+
+        order_ids = {order_id for order_id, _, _ in new}
+        changed = rollup_orders(order_ids, now)
+        stats["orders_changed"] = len(changed)
+        _estimate_delivery(new, order_ids)
+
+        OrderTracking.objects.bulk_create(
+            [
+                OrderTracking(
+                    order_id=order_id,
+                    status=CARRIER_STATUSES[update["status"]] or "shipped",
+                    message=update["description"] or DEFAULT_MESSAGES[update["status"]],
+                    location=update["location"] or None,
+                    carrier_event_id=key,
+                    occurred_at=update["occurred_at"],
+                )
+                for order_id, key, update in new
+            ],
+            ignore_conflicts=True,
+        )
+        stats["applied"] = len(new)
+
+        if changed:
+            emit_many(
+                "order.status_changed",
+                [
+                    (
+                        f"order:{order.id}",
+                        f"order.status_changed:{order.id}:{carrier}:{order.status}",
+                        order_payload(order, carrier=carrier),
+                    )
+                    for order in Order.objects.filter(id__in=changed)
+                ],
+            )
+    return stats
+
+
+def _estimate_delivery(entries, order_ids):
+    """
+    Take the carrier's estimate where it gave one (the latest, for orders
+    shipped in several parcels); otherwise expect shipped orders
+    DELIVERY_ESTIMATE_DAYS after they shipped.
+    """
+    estimates = {}
+    for order_id, _, update in entries:
+        estimate = update["estimated_delivery"]
+        if estimate and (order_id not in estimates or estimate > estimates[order_id]):
+            estimates[order_id] = estimate
+    by_date = {}
+    for order_id, estimate in estimates.items():
+        by_date.setdefault(estimate, []).append(order_id)
+    for estimate, ids in by_date.items():
+        # Once delivered, an order keeps the estimate it had
+        Order.objects.filter(Q(delivered_at__isnull=True) | Q(estimated_delivery__isnull=True), id__in=ids).update(
+            estimated_delivery=estimate
+        )
+
+    Order.objects.filter(
+        id__in=order_ids - estimates.keys(), estimated_delivery__isnull=True, shipped_at__isnull=False
+    ).update(estimated_delivery=F("shipped_at") + timedelta(days=settings.DELIVERY_ESTIMATE_DAYS))
+
+
+class LocalCarrier:
+    """
+    Stands in for a carrier: generates the scans a parcel goes through on
+    its way from the seller to the buyer's city, and sends them as a
+    signed webhook or writes them for the file drop.
+    """
+
+    name = "local"
+
+    def __init__(self, transit_days=3, exception_rate=0):
+        self.transit_days = transit_days
+        self.exception_rate = exception_rate
+
+    def route(self, city):
+        return [
+            ("picked_up", "Seller pickup"),
+            ("in_transit", "Dhaka sorting center"),
+            ("in_transit", f"{city} hub"),
+            ("out_for_delivery", city),
+            ("delivered", city),
+        ]
+
+    def scans(self, tracking_number, city, shipped_at):
+        """All the updates for one parcel, oldest first"""
+        route = self.route(city or "Destination")
+        step = timedelta(days=self.transit_days) / len(route)
+        eta = timezone.localdate(shipped_at + timedelta(days=self.transit_days)).isoformat()
+        updates = []
+        for number, (status, location) in enumerate(route):
+            if status == "out_for_delivery" and random.random() < self.exception_rate:
+                updates.append(
+                    {
+                        "tracking_number": tracking_number,
+                        "event_id": f"{tracking_number}-x",
+                        "status": "exception",
+                        "location": location,
+                        "occurred_at": (shipped_at + step * number).isoformat(),
+                        "description": "Recipient not available, will retry",
+                        "estimated_delivery": eta,
+                    }
+                )
+            updates.append(
+                {
+                    "tracking_number": tracking_number,
+                    "event_id": f"{tracking_number}-{number}",
+                    "status": status,
+                    "location": location,
+                    "occurred_at": (shipped_at + step * (number + 1)).isoformat(),
+                    "estimated_delivery": eta,
+                }
+            )
+        return updates
+
+    def send(self, url, updates):
+        """POST updates to a tracking webhook the way the carrier would"""
+        body = json.dumps({"carrier": self.name, "updates": updates}).encode()
+        request = urllib.request.Request(
+            url, data=body, headers={"Content-Type": "application/json", SIGNATURE_HEADER: sign(body)}
+        )
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.loads(response.read())
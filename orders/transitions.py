@@ -0,0 +1,189 @@
+"""
+Order and order item status transitions.
+
+Sellers move their own items forward (processing, shipped, delivered);
+the order's status then follows its items: it is the least advanced
+status among the items that are not cancelled. Shipping and delivery
+stamp shipped_at / delivered_at on items and orders, and every change
+leaves an OrderTracking entry for the buyer and an outbox event.
+
+transition_items() works on many orders at once with a fixed number of
+set-based queries, so a seller can ship a whole page of orders in one
+request.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Min, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Order, OrderItem, OrderTracking
+from .outbox import emit_many, order_payload
+
+# Order statuses reachable from each order status
+ORDER_TRANSITIONS = {
+    "pending": ("confirmed", "cancelled"),
+    "confirmed": ("processing", "shipped", "delivered", "cancelled"),
+    "processing": ("shipped", "delivered"),
+    "shipped": ("delivered",),
+    "delivered": ("refunded",),
+    "cancelled": (),
+    "refunded": (),
+}
+
+# Item statuses a seller can set, from each item status. New items stay
+# "pending" while their order is confirmed, so both count as not started.
+ITEM_TRANSITIONS = {
+    "pending": ("processing", "shipped"),
+    "confirmed": ("processing", "shipped"),
+    "processing": ("shipped",),
+    "shipped": ("delivered",),
+    "delivered": (),
+    "cancelled": (),
+    "refunded": (),
+}
+SELLER_STATUSES = ("processing", "shipped", "delivered")
+
+# Orders per bulk request
+MAX_BULK_ORDERS = 500
+
+# Sellers can only work on paid-for or cash-on-delivery orders still in progress
+OPEN_ORDER_STATUSES = ("confirmed", "processing", "shipped")
+
+# How far along an item is, for the order rollup
+PROGRESS = {"pending": 0, "confirmed": 0, "processing": 1, "shipped": 2, "delivered": 3}
+ROLLUP_STATUSES = {0: "confirmed", 1: "processing", 2: "shipped", 3: "delivered"}
+
+TRACKING_MESSAGES = {
+    "processing": "{count} item(s) from {seller} are being prepared",
+    "shipped": "{count} item(s) from {seller} have been shipped",
+    "delivered": "{count} item(s) from {seller} have been delivered",
+}
+
+
+class TransitionError(Exception):
+    pass
+
+
+def can_transition(current, new, transitions=ORDER_TRANSITIONS):
+    return new in transitions.get(current, ())
+
+
+def items_allowed_to(status):
+    """Item statuses that can move to `status`"""
+    return [current for current, targets in ITEM_TRANSITIONS.items() if status in targets]
+
+
+def rollup_status(statuses):
+    """The status an order with items in `statuses` has: its least advanced live item's"""
+    progress = [PROGRESS[status] for status in statuses if status in PROGRESS]
+    return ROLLUP_STATUSES[min(progress)] if progress else "cancelled"
+
+
+def _stamps(status, now):
+    """shipped_at/delivered_at updates for a status, keeping earlier stamps"""
+    stamps = {}
+    if status in ("shipped", "delivered"):
+        stamps["shipped_at"] = Coalesce(F("shipped_at"), Value(now))
+    if status == "delivered":
+        stamps["delivered_at"] = Coalesce(F("delivered_at"), Value(now))
+    return stamps
+
+
+def advance_items(items, status, now=None, **extra):
+    """
+    Move the items in `items` that may go to `status` there, stamping them;
+    returns how many moved.
+    """
+    now = now or timezone.now()
+    return items.filter(status__in=items_allowed_to(status)).update(
+        status=status, updated_at=now, **_stamps(status, now), **extra
+    )
+
+
+def rollup_orders(order_ids, now=None):
+    """
+    Set each order's status from its items with one aggregate query, and
+    one UPDATE per resulting status. Returns {order_id: new status} for the
+    orders that changed.
+    """
+    now = now or timezone.now()
+    progress = Case(
+        *[When(status=status, then=Value(rank)) for status, rank in PROGRESS.items()],
+        output_field=IntegerField(),
+    )
+    targets = {
+        row["order_id"]: ROLLUP_STATUSES[row["progress"]]
+        for row in OrderItem.objects.filter(order_id__in=order_ids)
+        .exclude(status="cancelled")
+        .values("order_id")
+        .annotate(progress=Min(progress))
+        if row["progress"] is not None
+    }
+    current = dict(
+        Order.objects.filter(id__in=targets, status__in=OPEN_ORDER_STATUSES).values_list("id", "status")
+    )
+    changed = {
+        order_id: target
+        for order_id, target in targets.items()
+        if order_id in current and current[order_id] != target and can_transition(current[order_id], target)
+    }
+    for target in set(changed.values()):
+        Order.objects.filter(id__in=[order_id for order_id, status in changed.items() if status == target]).update(
+            status=target, updated_at=now, **_stamps(target, now)
+        )
+    return changed
+
+
+def transition_items(seller, order_ids, status, tracking_number=""):
+    """
+    Move `seller`'s items in the given orders to `status`. Orders with no
+    item that can make that move are skipped. Returns the ids of the
+    orders that changed.
+    """
+    if status not in SELLER_STATUSES:
+        raise TransitionError("Invalid status.")
+    allowed_from = items_allowed_to(status)
+    now = timezone.now()
+
+    with transaction.atomic():
+        items = OrderItem.objects.filter(
+            seller=seller,
+            order_id__in=order_ids,
+            status__in=allowed_from,
+            order__status__in=OPEN_ORDER_STATUSES,
+        )
+        counts = {}
+        for order_id in items.values_list("order_id", flat=True):
+            counts[order_id] = counts.get(order_id, 0) + 1
+        if not counts:
+            return []
+
+        extra = {"tracking_number": tracking_number} if tracking_number else {}
+        advance_items(OrderItem.objects.filter(seller=seller, order_id__in=counts), status, now, **extra)
+
+        rollup_orders(counts, now)
+
+        suffix = f". Tracking number: {tracking_number}" if tracking_number else ""
+        OrderTracking.objects.bulk_create(
+            OrderTracking(
+                order_id=order_id,
+                status=status,
+                message=TRACKING_MESSAGES[status].format(count=count, seller=seller.username) + suffix,
+            )
+            for order_id, count in counts.items()
+        )
+        orders = Order.objects.filter(id__in=counts)
+        emit_many(
+            "order.status_changed",
+            [
+                (
+                    f"order:{order.id}",
+                    f"order.status_changed:{order.id}:{seller.id}:{status}",
+                    order_payload(
+                        order, seller_id=seller.id, item_status=status, tracking_number=tracking_number
+                    ),
+                )
+                for order in orders
+            ],
+        )
+    return list(counts)
@@ -7,6 +7,8 @@ urlpatterns = [
     path('', views.order_list_view, name='order_list'),
     path('create/', views.create_order_view, name='create_order'),
     path('seller/orders/', views.seller_orders_view, name='seller_orders'),
+    path('seller/orders/export/', views.export_seller_orders_view, name='export_seller_orders'),
+    path('seller/orders/bulk-update/', views.bulk_update_order_status_view, name='bulk_update_order_status'),
     path('seller/orders/<str:order_number>/detail/', views.seller_order_detail_view, name='seller_order_detail'),
     path('seller/orders/<str:order_number>/update/', views.update_order_status_view, name='update_order_status'),
     path('payment/process/', views.process_payment_view, name='process_payment'),
@@ -14,8 +16,11 @@ urlpatterns = [
     path('payment/success/', views.payment_success_view, name='payment_success'),
     path('payment/failed/', views.payment_failed_view, name='payment_failed'),
     path('complete-cart-payment/', views.complete_cart_payment_view, name='complete_cart_payment'),
+    path('payment/webhook/', views.payment_webhook_view, name='payment_webhook'),
+    path('tracking/webhook/', views.tracking_webhook_view, name='tracking_webhook'),
     path('<str:order_number>/', views.order_detail_view, name='order_detail'),
     path('<str:order_number>/confirm/', views.confirm_order_view, name='confirm_order'),
     path('<str:order_number>/cancel/', views.cancel_order_view, name='cancel_order'),
     path('<str:order_number>/track/', views.track_order_view, name='track_order'),
+    path('<str:order_number>/payment-status/', views.payment_status_view, name='payment_status'),
 ]
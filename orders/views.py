@@ -1,26 +1,67 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.core.paginator import Paginator
-from .models import Order, OrderItem, Payment
+from django.db import transaction
+from crazycart.replicas import primary_required
+from .idempotency import idempotent
+from .models import ArchivedOrder, Order, OrderItem, Payment
+from .exports import seller_export_rows, iter_export, parse_export_date, EXPORT_FORMATS
+from .services import (
+    ADDRESS_FIELDS,
+    CheckoutError,
+    address_kwargs,
+    cancel_order,
+    decrement_stock,
+    missing_shipping_fields,
+    place_cart_order,
+    shipping_from_user,
+)
 
 
 @login_required
 def order_list_view(request):
-    orders = Order.objects.filter(user=request.user).order_by("-created_at")
+    archived = request.GET.get("archived") == "1"
+    if archived:
+        orders = ArchivedOrder.objects.filter(user=request.user).order_by("-created_at")
+    else:
+        orders = Order.objects.filter(user=request.user).select_related("shipping").order_by("-created_at")
 
     # Pagination
     paginator = Paginator(orders, 10)
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
+    if archived:
+        from .archive import unpack
+
+        page_obj.object_list = [unpack(order)[0] for order in page_obj.object_list]
 
-    return render(request, "orders/order_list.html", {"page_obj": page_obj})
+    context = {
+        "page_obj": page_obj,
+        "archived": archived,
+        "has_archived": archived or ArchivedOrder.objects.filter(user=request.user).exists(),
+    }
+    return render(request, "orders/order_list.html", context)
 
 
 @login_required
 def order_detail_view(request, order_number):
-    order = get_object_or_404(Order, order_number=order_number, user=request.user)
+    order = Order.objects.filter(order_number=order_number, user=request.user).first()
+    if order is None:
+        # Finished orders move to the archive after a while; see orders/archive.py
+        from .archive import unpack
+
+        archived = get_object_or_404(ArchivedOrder, order_number=order_number, user=request.user)
+        order, order_items, _ = unpack(archived)
+        return render(
+            request,
+            "orders/order_detail.html",
+            {"order": order, "order_items": order_items, "archived": True},
+        )
     order_items = order.items.select_related("product", "seller").all()
 
     context = {
@@ -31,26 +72,30 @@ def order_detail_view(request, order_number):
     return render(request, "orders/order_detail.html", context)
 
 
+@primary_required
 @login_required
 def confirm_order_view(request, order_number):
     # This view is called after successful payment
     order = get_object_or_404(Order, order_number=order_number, user=request.user)
 
     if order.status == "pending":
-        order.status = "confirmed"
-        order.save()
-
-        # Update product stock
-        for item in order.items.all():
-            product = item.product
-            product.stock_quantity -= item.quantity
-            product.save()
+        try:
+            with transaction.atomic():
+                order.status = "confirmed"
+                order.save()
 
-        messages.success(request, "Order confirmed successfully!")
+                # Update product stock
+                decrement_stock(order)
+        except CheckoutError as e:
+            order.refresh_from_db()
+            messages.error(request, e.message)
+        else:
+            messages.success(request, "Order confirmed successfully!")
 
     return render(request, "orders/order_confirmation.html", {"order": order})
 
 
+@primary_required
 @login_required
 def cancel_order_view(request, order_number):
     order = get_object_or_404(Order, order_number=order_number, user=request.user)
@@ -64,60 +109,52 @@ def cancel_order_view(request, order_number):
 
     if is_ajax:
         if request.method == "POST":
-            if order.status in ["pending", "confirmed"]:
-                order.status = "cancelled"
-                order.save()
-
-                # Refund if payment was made
-                if hasattr(order, "payment") and order.payment.status == "paid":
-                    # Process refund
-                    request.user.crazycart_balance += order.total_amount
-                    request.user.save()
-
-                    order.payment.status = "refunded"
-                    order.payment.save()
-
-                return JsonResponse(
-                    {"success": True, "message": "Order cancelled successfully!"}
-                )
-            else:
-                return JsonResponse(
-                    {"success": False, "message": "Cannot cancel this order."}
-                )
+            try:
+                cancel_order(order, request.user)
+            except CheckoutError as e:
+                return JsonResponse({"success": False, "message": e.message})
+            return JsonResponse(
+                {"success": True, "message": "Order cancelled successfully!"}
+            )
         else:
             return JsonResponse(
                 {"success": False, "message": "Invalid request method."}
             )
 
     # Handle regular form requests
-    if order.status in ["pending", "confirmed"]:
-        order.status = "cancelled"
-        order.save()
-
-        # Refund if payment was made
-        if hasattr(order, "payment") and order.payment.status == "paid":
-            # Process refund
-            request.user.crazycart_balance += order.total_amount
-            request.user.save()
-
-            order.payment.status = "refunded"
-            order.payment.save()
-
+    try:
+        cancel_order(order, request.user)
         messages.success(request, "Order cancelled successfully!")
-    else:
-        messages.error(request, "Cannot cancel this order.")
+    except CheckoutError as e:
+        messages.error(request, e.message)
 
     return redirect("orders:order_detail", order_number=order_number)
 
 
 @login_required
 def track_order_view(request, order_number):
-    order = get_object_or_404(Order, order_number=order_number, user=request.user)
-    tracking_updates = order.tracking_updates.all()
+    order = Order.objects.filter(order_number=order_number, user=request.user).first()
+    if order is None:
+        from .archive import unpack
+
+        archived = get_object_or_404(ArchivedOrder, order_number=order_number, user=request.user)
+        order, items, tracking_updates = unpack(archived)
+        tracking_updates.sort(key=lambda entry: (entry.created_at, entry.id), reverse=True)
+        tracking_numbers = sorted({item.tracking_number for item in items if item.tracking_number})
+    else:
+        tracking_updates = order.tracking_updates.order_by("-created_at", "-id")
+        tracking_numbers = sorted(
+            set(
+                order.items.exclude(tracking_number__isnull=True)
+                .exclude(tracking_number="")
+                .values_list("tracking_number", flat=True)
+            )
+        )
 
     context = {
         "order": order,
         "tracking_updates": tracking_updates,
+        "tracking_number": ", ".join(tracking_numbers) or order.tracking_number,
     }
 
     return render(request, "orders/track_order.html", context)
@@ -129,18 +166,69 @@ def seller_orders_view(request):
         messages.error(request, "Access denied. Seller account required.")
         return redirect("home")
 
-    order_items = (
-        OrderItem.objects.filter(seller=request.user)
-        .select_related("order", "product")
-        .order_by("-created_at")
-    )
+    archived = request.GET.get("archived") == "1"
+    if archived:
+        # Archived orders are paged whole; each shows as this seller's items in it
+        order_items = (
+            ArchivedOrder.objects.filter(sellers=request.user).select_related("user").order_by("-created_at")
+        )
+    else:
+        order_items = (
+            OrderItem.objects.filter(seller=request.user)
+            .select_related("order", "product")
+            .order_by("-created_at")
+        )
 
     # Pagination
     paginator = Paginator(order_items, 20)
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
+    if archived:
+        from .archive import unpack_for_seller
+
+        page_obj.object_list = [
+            item for order in page_obj.object_list for item in unpack_for_seller(order, request.user)[1]
+        ]
 
-    return render(request, "orders/seller_orders.html", {"page_obj": page_obj})
+    context = {
+        "page_obj": page_obj,
+        "archived": archived,
+        "has_archived": archived or ArchivedOrder.objects.filter(sellers=request.user).exists(),
+    }
+    return render(request, "orders/seller_orders.html", context)
+
+
+@login_required
+def export_seller_orders_view(request):
+    """Stream the seller's order items as CSV or JSONL"""
+    if request.user.user_type != "seller":
+        messages.error(request, "Access denied. Seller account required.")
+        return redirect("home")
+
+    export_format = request.GET.get("format", "csv")
+    if export_format not in EXPORT_FORMATS:
+        messages.error(request, "Invalid export format.")
+        return redirect("orders:seller_orders")
+
+    try:
+        rows = seller_export_rows(
+            request.user,
+            status=request.GET.get("status") or None,
+            date_from=parse_export_date(request.GET.get("from")),
+            date_to=parse_export_date(request.GET.get("to"), end_of_day=True),
+        )
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect("orders:seller_orders")
+
+    content_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    response = StreamingHttpResponse(
+        iter_export(rows, export_format), content_type=content_type
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="orders-{request.user.username}.{export_format}"'
+    )
+    return response
 
 
 @login_required
@@ -150,7 +238,24 @@ def seller_order_detail_view(request, order_number):
         return redirect("home")
 
     # Get the order
-    order = get_object_or_404(Order, order_number=order_number)
+    order = Order.objects.filter(order_number=order_number).first()
+    if order is None:
+        # Finished orders move to the archive after a while; see orders/archive.py
+        from .archive import unpack_for_seller
+
+        archived = get_object_or_404(
+            ArchivedOrder.objects.select_related("user"), order_number=order_number, sellers=request.user
+        )
+        order, seller_items, all_items = unpack_for_seller(archived, request.user)
+        context = {
+            "order": order,
+            "seller_items": seller_items,
+            "all_items": all_items,
+            "seller_total": sum(item.total_price for item in seller_items),
+            "seller_status": order.status,
+            "archived": True,
+        }
+        return render(request, "orders/seller_order_detail.html", context)
 
     # Check if seller has items in this order
     seller_items = order.items.filter(seller=request.user).select_related("product")
@@ -164,11 +269,19 @@ def seller_order_detail_view(request, order_number):
     # Calculate seller's total value
     seller_total = sum(item.total_price for item in seller_items)
 
+    # Where this seller's part of the order stands, which decides the next action
+    from .transitions import OPEN_ORDER_STATUSES, rollup_status
+
+    seller_status = order.status
+    if order.status in OPEN_ORDER_STATUSES:
+        seller_status = rollup_status(item.status for item in seller_items)
+
     context = {
         "order": order,
         "seller_items": seller_items,
         "all_items": all_items,
         "seller_total": seller_total,
+        "seller_status": seller_status,
     }
 
     return render(request, "orders/seller_order_detail.html", context)
@@ -188,104 +301,53 @@ def update_order_status_view(request, order_number):
         return JsonResponse({"success": False, "message": "Access denied."})
 
     if request.method == "POST":
-        try:
-            new_status = request.POST.get("status")
-            tracking_number = request.POST.get("tracking_number", "")
+        from .transitions import TransitionError, transition_items
 
-            # Get valid status choices (just the keys)
-            valid_statuses = [choice[0] for choice in Order.STATUS_CHOICES]
-
-            if new_status in valid_statuses:
-                # Update order items for this seller
-                order.items.filter(seller=request.user).update(
-                    status=new_status, tracking_number=tracking_number or None
-                )
-
-                # Update main order status if all items have same status
-                all_items = order.items.all()
-                if all(item.status == new_status for item in all_items):
-                    order.status = new_status
-                    order.save()
-
-                return JsonResponse(
-                    {"success": True, "message": "Order status updated successfully!"}
-                )
-            else:
-                return JsonResponse({"success": False, "message": "Invalid status."})
-        except Exception as e:
+        new_status = request.POST.get("status")
+        tracking_number = request.POST.get("tracking_number", "")
+        try:
+            changed = transition_items(request.user, [order.id], new_status, tracking_number)
+        except TransitionError as e:
+            return JsonResponse({"success": False, "message": str(e)})
+        if not changed:
             return JsonResponse(
-                {"success": False, "message": "Failed to update order status."}
+                {
+                    "success": False,
+                    "message": f"This order can't be marked as {new_status} now.",
+                }
             )
+        return JsonResponse(
+            {"success": True, "message": "Order status updated successfully!"}
+        )
 
     return JsonResponse({"success": False, "message": "Invalid request method."})
 
 
+@primary_required
 @login_required
+@idempotent
 def process_payment_view(request):
     if request.method == "POST":
         from cart.models import Cart
 
         cart = get_object_or_404(Cart, user=request.user)
 
-        if not cart.items.exists():
-            return JsonResponse({"success": False, "message": "Cart is empty"})
-
-        # Check user balance
-        total_amount = cart.total_price
-        if request.user.crazycart_balance < total_amount:
+        # Ship to the buyer's default address
+        shipping = shipping_from_user(request.user)
+        missing_fields = missing_shipping_fields(shipping)
+        if missing_fields:
             return JsonResponse(
-                {"success": False, "message": "Insufficient CrazyCart balance"}
-            )
-
-        # Create order
-        order = Order.objects.create(
-            user=request.user,
-            subtotal=cart.subtotal,
-            total_amount=total_amount,
-            # Add shipping and billing info from form
-            shipping_name=request.user.get_full_name(),
-            shipping_email=request.user.email,
-            shipping_phone=request.user.phone_number or "",
-            shipping_address=request.user.address or "",
-            shipping_city=request.user.city or "",
-            shipping_state=request.user.state or "",
-            shipping_postal_code=request.user.postal_code or "",
-            shipping_country=request.user.country or "",
-            billing_name=request.user.get_full_name(),
-            billing_email=request.user.email,
-            billing_phone=request.user.phone_number or "",
-            billing_address=request.user.address or "",
-            billing_city=request.user.city or "",
-            billing_state=request.user.state or "",
-            billing_postal_code=request.user.postal_code or "",
-            billing_country=request.user.country or "",
-        )
-
-        # Create order items
-        for cart_item in cart.items.all():
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                seller=cart_item.product.seller,
-                quantity=cart_item.quantity,
-                price_at_time=cart_item.price_at_time,
-                total_price=cart_item.total_price,
+                {
+                    "success": False,
+                    "message": f'Please add your {", ".join(missing_fields)} to your address book',
+                }
             )
 
-        # Process payment
-        Payment.objects.create(
-            order=order,
-            payment_method="crazycart_wallet",
-            amount=total_amount,
-            status="paid",
-        )
-
-        # Deduct from user balance
-        request.user.crazycart_balance -= total_amount
-        request.user.save()
-
-        # Clear cart
-        cart.items.all().delete()
+        # The wallet is debited, and stock taken, in the order's transaction
+        try:
+            order = place_cart_order(request.user, cart, "crazycart_wallet", shipping)
+        except CheckoutError as e:
+            return JsonResponse({"success": False, "message": e.message})
 
         return JsonResponse(
             {
@@ -298,25 +360,17 @@ def process_payment_view(request):
     return JsonResponse({"success": False, "message": "Invalid request method"})
 
 
+@primary_required
 @login_required
+@idempotent
 def process_buy_now_payment_view(request):
     """Process payment for buy now items"""
     try:
-        print(f"=== BUY NOW PAYMENT DEBUG ===")
-        print(f"Request method: {request.method}")
-        print(f"User: {request.user}")
-        print(
-            f"User balance: {getattr(request.user, 'crazycart_balance', 'NOT FOUND')}"
-        )
-
         if request.method == "POST":
             from products.models import Product
 
             buy_now_item = request.session.get("buy_now_item")
-            print(f"Buy now item from session: {buy_now_item}")
-
             if not buy_now_item:
-                print("ERROR: No buy_now_item in session")
                 return JsonResponse(
                     {"success": False, "message": "No item found for purchase"}
                 )
@@ -325,20 +379,18 @@ def process_buy_now_payment_view(request):
                 product = Product.objects.get(
                     id=buy_now_item["product_id"], is_active=True
                 )
-                print(f"Product found: {product.name}, Stock: {product.stock_quantity}")
             except Product.DoesNotExist:
-                print(f"ERROR: Product not found with ID: {buy_now_item['product_id']}")
                 if "buy_now_item" in request.session:
                     del request.session["buy_now_item"]
                 return JsonResponse(
                     {"success": False, "message": "Product is no longer available"}
                 )
 
-            # Check stock again
-            print(
-                f"Checking stock: requested={buy_now_item['quantity']}, available={product.stock_quantity}"
-            )
-            if buy_now_item["quantity"] > product.stock_quantity:
+            # Check stock again, less what is held for other buyers' payments
+            from .reservations import available_stock, take_stock
+
+            available = available_stock([product.id], exclude_user=request.user)[product.id]
+            if buy_now_item["quantity"] > available:
                 if "buy_now_item" in request.session:
                     del request.session["buy_now_item"]
                 return JsonResponse(
@@ -348,11 +400,10 @@ def process_buy_now_payment_view(request):
             # Check user balance - handle decimal conversion properly
             from decimal import Decimal
 
+            from .services import debit_wallet
+
             total_amount = Decimal(str(buy_now_item["total_price"]))
             user_balance = getattr(request.user, "crazycart_balance", Decimal("0.00"))
-            print(
-                f"Balance check: total_amount={total_amount} (type: {type(total_amount)}), user_balance={user_balance} (type: {type(user_balance)})"
-            )
             if user_balance < total_amount:
                 return JsonResponse(
                     {
@@ -361,82 +412,45 @@ def process_buy_now_payment_view(request):
                     }
                 )
 
-            # Get user info safely
-            user_full_name = request.user.get_full_name() or request.user.username
-            user_email = request.user.email or ""
-            user_phone = getattr(request.user, "phone_number", "") or ""
-            user_address = getattr(request.user, "address", "") or ""
-            user_city = getattr(request.user, "city", "") or ""
-            user_state = getattr(request.user, "state", "") or ""
-            user_postal_code = getattr(request.user, "postal_code", "") or ""
-            user_country = getattr(request.user, "country", "") or "Bangladesh"
-
-            print(
-                f"Creating order with user info: name={user_full_name}, email={user_email}"
-            )
-
-            # Create order with confirmed status since payment is immediate
-            order = Order.objects.create(
-                user=request.user,
-                status="confirmed",  # Set to confirmed since payment is processed immediately
-                payment_status="paid",  # Payment is successful
-                subtotal=total_amount,
-                total_amount=total_amount,
-                # Add shipping and billing info from user profile
-                shipping_name=user_full_name,
-                shipping_email=user_email,
-                shipping_phone=user_phone,
-                shipping_address=user_address,
-                shipping_city=user_city,
-                shipping_state=user_state,
-                shipping_postal_code=user_postal_code,
-                shipping_country=user_country,
-                billing_name=user_full_name,
-                billing_email=user_email,
-                billing_phone=user_phone,
-                billing_address=user_address,
-                billing_city=user_city,
-                billing_state=user_state,
-                billing_postal_code=user_postal_code,
-                billing_country=user_country,
-            )
-
-            print(f"Order created: {order.order_number}")
+            # Ship to the buyer's default address
+            shipping = shipping_from_user(request.user, "Bangladesh")
 
-            # Create order item
-            order_item = OrderItem.objects.create(
-                order=order,
-                product=product,
-                seller=product.seller,
-                quantity=buy_now_item["quantity"],
-                price_at_time=product.price,
-                total_price=total_amount,
-            )
-
-            print(f"Order item created: {order_item}")
-
-            # Process payment
-            payment = Payment.objects.create(
-                order=order,
-                payment_method="crazycart_wallet",
-                amount=total_amount,
-                status="paid",
-            )
-
-            print(f"Payment created: {payment}")
-
-            # Deduct from user balance - handle decimal properly
-            request.user.crazycart_balance = user_balance - total_amount
-            request.user.save()
-
-            print(f"User balance updated: {request.user.crazycart_balance}")
+            try:
+                with transaction.atomic():
+                    # Create order with confirmed status since payment is immediate
+                    order = Order.objects.create(
+                        user=request.user,
+                        status="confirmed",
+                        payment_status="paid",
+                        subtotal=total_amount,
+                        total_amount=total_amount,
+                        **address_kwargs(request.user, shipping),
+                    )
+                    OrderItem.objects.create(
+                        order=order,
+                        product=product,
+                        seller=product.seller,
+                        quantity=buy_now_item["quantity"],
+                        price_at_time=product.price,
+                        total_price=total_amount,
+                    )
+                    Payment.objects.create(
+                        order=order,
+                        payment_method="crazycart_wallet",
+                        amount=total_amount,
+                        status="paid",
+                    )
+                    if not debit_wallet(request.user, total_amount):
+                        raise CheckoutError("Insufficient CrazyCart balance")
+                    # Stock is checked again under the product's row lock
+                    take_stock(order)
+            except CheckoutError as e:
+                return JsonResponse({"success": False, "message": e.message})
 
             # Clear buy now item from session
             if "buy_now_item" in request.session:
                 del request.session["buy_now_item"]
 
-            print(f"SUCCESS: Payment processed successfully")
-
             return JsonResponse(
                 {
                     "success": True,
@@ -483,7 +497,9 @@ def payment_failed_view(request):
     return render(request, "orders/payment_failed.html")
 
 
+@primary_required
 @login_required
+@idempotent
 def complete_cart_payment_view(request):
     """Complete payment for cart checkout"""
     if request.method != "POST":
@@ -504,39 +520,93 @@ def complete_cart_payment_view(request):
 
         if order.payment_status == "paid":
             return JsonResponse({"success": False, "error": "Order already paid"})
+        if order.status != "pending":
+            return JsonResponse(
+                {
+                    "success": False,
+                    "error": "This order is no longer awaiting payment",
+                }
+            )
 
-        from django.db import transaction
-        from cart.models import Cart
+        from .payments import get_gateway, refund_extra_charge, refund_payment, settle_payment
+
+        gateway = get_gateway()
+        payment = order.payment
+        pending = {
+            "success": True,
+            "pending": True,
+            "message": "Waiting for the payment provider to confirm",
+            "status_url": reverse("orders:payment_status", args=[order.order_number]),
+            "redirect_url": f"/orders/{order.order_number}/",
+        }
+        # A retry after a declined charge starts a fresh attempt, but while
+        # the provider has yet to answer an earlier charge there is no retry
+        claimed = (
+            Payment.objects.filter(id=payment.id)
+            .exclude(status="paid")
+            .exclude(gateway_response__status="pending")
+            .update(payment_method=payment_method, status="pending", gateway_response={"status": "pending"})
+        )
+        if not claimed:
+            return JsonResponse(pending)
+        # Charged outside any transaction, so a slow provider holds no locks
+        try:
+            result = gateway.charge(payment, payment_method)
+        except Exception:
+            Payment.objects.filter(id=payment.id, status="pending").update(gateway_response=None)
+            raise
+
+        if result.status == "failed":
+            Payment.objects.filter(id=payment.id, status="pending").update(
+                gateway_response=result.data
+            )
+            return JsonResponse(
+                {
+                    "success": False,
+                    "error": "The payment was declined. Please try again or choose another method.",
+                }
+            )
+        if result.status == "pending":
+            # The provider confirms by webhook; the page polls the order's status
+            Payment.objects.filter(id=payment.id, status="pending").update(
+                gateway_response=result.data
+            )
+            request.session.pop("pending_order_id", None)
+            return JsonResponse(pending)
 
-        with transaction.atomic():
-            # Update payment record
-            payment = order.payment
-            payment.payment_method = payment_method
-            payment.status = "paid"
-            payment.save()
-
-            # Update order status
-            order.status = "confirmed"
-            order.payment_status = "paid"
-            order.save()
-
-            # Update product stock
-            for item in order.items.all():
-                product = item.product
-                product.stock_quantity -= item.quantity
-                product.save()
-
-            # Clear the user's cart
-            try:
-                cart = Cart.objects.get(user=request.user)
-                cart.items.all().delete()
-                cart.save()
-            except Cart.DoesNotExist:
-                pass
+        # Charged: from here on, anything that stops the order gives the money back
+        charge = result.data.get("charge")
+        try:
+            settled = settle_payment(order, result.data)
+        except Exception as e:
+            refund_payment(gateway, order, charge)
+            if not isinstance(e, CheckoutError):
+                import logging
 
-            # Clear session data
-            if "pending_order_id" in request.session:
-                del request.session["pending_order_id"]
+                logging.getLogger(__name__).exception(
+                    "Settling order %s failed; the charge was refunded", order.order_number
+                )
+                return JsonResponse(
+                    {"success": False, "error": "The payment could not be completed and has been refunded."}
+                )
+            # The hold lapsed and the stock went to someone else
+            return JsonResponse(
+                {"success": False, "error": f"{e.message}. Your payment has been refunded."}
+            )
+        if not settled:
+            order.refresh_from_db()
+            if order.payment_status != "paid":
+                # Cancelled while the provider was answering
+                refund_payment(gateway, order, charge)
+                return JsonResponse(
+                    {
+                        "success": False,
+                        "error": "This order is no longer awaiting payment. Your payment has been refunded.",
+                    }
+                )
+            if charge != (order.payment.gateway_response or {}).get("charge"):
+                refund_extra_charge(gateway, order.payment, charge)
+        request.session.pop("pending_order_id", None)
 
         return JsonResponse(
             {
@@ -551,231 +621,169 @@ def complete_cart_payment_view(request):
 
 
 @login_required
-def create_order_view(request):
-    """Create order from cart checkout"""
-    try:
-        if request.method != "POST":
-            messages.error(request, "Invalid request method")
-            return redirect("cart:checkout")
-
-        from cart.models import Cart
-
-        try:
-            cart = Cart.objects.get(user=request.user)
-        except Cart.DoesNotExist:
-            messages.error(request, "Cart not found")
-            return redirect("cart:cart")
-
-        cart_items = cart.items.select_related("product").all()
-
-        if not cart_items:
-            messages.error(request, "Your cart is empty")
-            return redirect("cart:cart")
-
-        # Get and validate form data
-        payment_method = request.POST.get("payment_method")
-        if not payment_method:
-            messages.error(request, "Please select a payment method")
-            return redirect("cart:checkout")
-
-        # Validate required shipping fields
-        required_fields = [
-            "shipping_name",
-            "shipping_email",
-            "shipping_phone",
-            "shipping_city",
-            "shipping_address",
-            "shipping_country",
-        ]
-        missing_fields = []
-
-        for field in required_fields:
-            if not request.POST.get(field, "").strip():
-                missing_fields.append(
-                    field.replace("shipping_", "").replace("_", " ").title()
-                )
-
-        if missing_fields:
-            messages.error(
-                request,
-                f'Please fill in all required fields: {", ".join(missing_fields)}',
-            )
-            return redirect("cart:checkout")
-
-        # Validate stock
-        for item in cart_items:
-            if item.quantity > item.product.stock_quantity:
-                messages.error(
-                    request,
-                    f"Not enough stock for {item.product.name}. Available: {item.product.stock_quantity}, Requested: {item.quantity}",
-                )
-                return redirect("cart:cart")
-
-            if not item.product.is_active:
-                messages.error(request, f"{item.product.name} is no longer available")
-                return redirect("cart:cart")
-
-        # Validate payment method specific requirements
-        if payment_method == "crazycart_wallet":
-            user_balance = getattr(request.user, "crazycart_balance", 0)
-            if user_balance < cart.total_price:
-                messages.error(
-                    request,
-                    f"Insufficient wallet balance. Available: ৳{user_balance}, Required: ৳{cart.total_price}",
-                )
-                return redirect("cart:checkout")
-
-        try:
-            from django.db import transaction
-            import logging
-
-            logger = logging.getLogger(__name__)
+@require_POST
+def bulk_update_order_status_view(request):
+    """
+    Move the seller's items in many orders to one status. Tracking numbers
+    differ per parcel, so they are entered on each order instead.
+    """
+    if request.user.user_type != "seller":
+        return JsonResponse(
+            {"success": False, "message": "Access denied. Seller account required."}
+        )
 
-            with transaction.atomic():
-                logger.info(
-                    f"Creating order for user {request.user.username} with payment method {payment_method}"
-                )
+    from .transitions import MAX_BULK_ORDERS, TransitionError, transition_items
 
-                # Create order
-                order = Order.objects.create(
-                    user=request.user,
-                    subtotal=cart.subtotal,
-                    total_amount=cart.total_price,
-                    # Shipping details
-                    shipping_name=request.POST.get("shipping_name"),
-                    shipping_email=request.POST.get("shipping_email"),
-                    shipping_phone=request.POST.get("shipping_phone"),
-                    shipping_address=request.POST.get("shipping_address"),
-                    shipping_city=request.POST.get("shipping_city"),
-                    shipping_state=request.POST.get("shipping_state", ""),
-                    shipping_postal_code=request.POST.get("shipping_postal_code", ""),
-                    shipping_country=request.POST.get("shipping_country"),
-                    # Billing (same as shipping)
-                    billing_name=request.POST.get("shipping_name"),
-                    billing_email=request.POST.get("shipping_email"),
-                    billing_phone=request.POST.get("shipping_phone"),
-                    billing_address=request.POST.get("shipping_address"),
-                    billing_city=request.POST.get("shipping_city"),
-                    billing_state=request.POST.get("shipping_state", ""),
-                    billing_postal_code=request.POST.get("shipping_postal_code", ""),
-                    billing_country=request.POST.get("shipping_country"),
-                )
+    new_status = request.POST.get("status")
+    order_numbers = set(request.POST.getlist("order_numbers"))
+    try:
+        if not order_numbers:
+            raise TransitionError("No orders selected.")
+        if len(order_numbers) > MAX_BULK_ORDERS:
+            raise TransitionError(f"At most {MAX_BULK_ORDERS} orders can be updated at once.")
+        order_ids = list(
+            Order.objects.filter(order_number__in=order_numbers).values_list("id", flat=True)
+        )
+        changed = transition_items(request.user, order_ids, new_status)
+    except TransitionError as e:
+        result = {"success": False, "message": str(e)}
+    else:
+        skipped = len(order_numbers) - len(changed)
+        message = f"{len(changed)} order(s) marked as {new_status}."
+        if skipped:
+            message += f" {skipped} could not be changed to {new_status}."
+        result = {
+            "success": bool(changed),
+            "message": message,
+            "updated": len(changed),
+            "skipped": skipped,
+        }
+
+    if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+        return JsonResponse(result)
+    if result["success"]:
+        messages.success(request, result["message"])
+    else:
+        messages.error(request, result["message"])
+    return redirect("orders:seller_orders")
 
-                logger.info(f"Order created with number: {order.order_number}")
 
-                # Create order items
-                for item in cart_items:
-                    OrderItem.objects.create(
-                        order=order,
-                        product=item.product,
-                        seller=item.product.seller,
-                        quantity=item.quantity,
-                        price_at_time=item.price_at_time,
-                        total_price=item.total_price,
-                    )
+@primary_required
+@login_required
+def payment_status_view(request, order_number):
+    """Where an order's online payment stands, for the payment page to poll"""
+    order = get_object_or_404(
+        Order.objects.select_related("payment"), order_number=order_number, user=request.user
+    )
+    return JsonResponse(
+        {
+            "success": True,
+            "status": order.status,
+            "payment_status": order.payment.status,
+            "redirect_url": f"/orders/{order.order_number}/",
+        }
+    )
 
-                logger.info(f"Created {cart_items.count()} order items")
 
-                # Process payment
-                if payment_method == "crazycart_wallet":
-                    # Double-check wallet balance inside transaction
-                    request.user.refresh_from_db()
-                    if request.user.crazycart_balance < order.total_amount:
-                        logger.error(
-                            f"Insufficient wallet balance during transaction: {request.user.crazycart_balance} < {order.total_amount}"
-                        )
-                        messages.error(request, "Insufficient wallet balance")
-                        return redirect("cart:checkout")
+@csrf_exempt
+@require_POST
+@primary_required
+def payment_webhook_view(request):
+    """Payment provider callbacks; see orders/payments.py"""
+    from .payments import SIGNATURE_HEADER, GatewayError, get_gateway, ingest_event
 
-                    # Deduct from wallet
-                    request.user.crazycart_balance -= order.total_amount
-                    request.user.save()
+    gateway = get_gateway()
+    try:
+        event = gateway.parse_webhook(request.body, request.headers.get(SIGNATURE_HEADER))
+    except GatewayError as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=400)
+    return JsonResponse({"success": True, "outcome": ingest_event(gateway, event)})
 
-                    logger.info(f"Deducted ৳{order.total_amount} from user wallet")
 
-                    # Create payment record
-                    Payment.objects.create(
-                        order=order,
-                        payment_method="crazycart_wallet",
-                        amount=order.total_amount,
-                        status="paid",
-                    )
+@csrf_exempt
+@require_POST
+@primary_required
+def tracking_webhook_view(request):
+    """Batches of carrier tracking updates; see orders/tracking.py"""
+    import json
 
-                    # Update order status
-                    order.status = "confirmed"
-                    order.payment_status = "paid"
-                    order.save()
-
-                    # Update stock
-                    for item in order.items.all():
-                        product = item.product
-                        product.stock_quantity -= item.quantity
-                        product.save()
-                        logger.info(
-                            f"Updated stock for {product.name}: -{item.quantity}"
-                        )
- 
-                    # Clear cart
-                    cart.items.all().delete()
-                    cart.save()
-
-                    messages.success(request, "Order placed successfully!")
-                    return redirect(
-                        "orders:order_detail", order_number=order.order_number
-                    )
+    from .tracking import SIGNATURE_HEADER, ingest_updates, verify_signature
 
-                elif payment_method == "cash_on_delivery":
-                    # Create payment record for COD
-                    Payment.objects.create(
-                        order=order,
-                        payment_method="cash_on_delivery",
-                        amount=order.total_amount,
-                        status="pending",
-                    )
+    if not verify_signature(request.body, request.headers.get(SIGNATURE_HEADER)):
+        return JsonResponse({"success": False, "error": "Invalid signature"}, status=400)
+    try:
+        data = json.loads(request.body)
+        updates = data["updates"]
+        if not isinstance(updates, list):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"success": False, "error": "Malformed updates"}, status=400)
+    stats = ingest_updates(updates, str(data.get("carrier") or "local")[:40])
+    return JsonResponse({"success": True, **stats})
 
-                    # Update order status
-                    order.status = "confirmed"
-                    order.payment_status = "pending"
-                    order.save()
 
-                    # Update stock
-                    for item in order.items.all():
-                        product = item.product
-                        product.stock_quantity -= item.quantity
-                        product.save()
+@primary_required
+@login_required
+def create_order_view(request):
+    """Create order from cart checkout"""
+    if request.method != "POST":
+        messages.error(request, "Invalid request method")
+        return redirect("cart:checkout")
 
-                    # Clear cart
-                    cart.items.all().delete()
-                    cart.save()
+    from cart.models import Cart
 
-                    messages.success(
-                        request,
-                        "Order placed successfully! You can pay when the order arrives.",
-                    )
-                    return redirect(
-                        "orders:order_detail", order_number=order.order_number
-                    )
+    try:
+        cart = Cart.objects.get(user=request.user)
+    except Cart.DoesNotExist:
+        messages.error(request, "Cart not found")
+        return redirect("cart:cart")
+
+    # Get and validate form data; the cart itself is validated by place_cart_order
+    payment_method = request.POST.get("payment_method")
+    if not payment_method:
+        messages.error(request, "Please select a payment method")
+        return redirect("cart:checkout")
 
-                else:
-                    logger.error(f"Invalid payment method: {payment_method}")
-                    messages.error(request, "Invalid payment method")
-                    return redirect("cart:checkout")
+    shipping = {
+        field: request.POST.get(f"shipping_{field}", "") for field in ADDRESS_FIELDS
+    }
+    missing_fields = missing_shipping_fields(shipping)
+    if missing_fields:
+        messages.error(
+            request,
+            f'Please fill in all required fields: {", ".join(missing_fields)}',
+        )
+        return redirect("cart:checkout")
 
-        except Exception as e:
-            import logging
+    import logging
 
-            logger = logging.getLogger(__name__)
-            logger.error(f"Error creating order: {str(e)}", exc_info=True)
-            messages.error(
-                request,
-                "An error occurred while processing your payment. Please try again.",
-            )
-            return redirect("cart:checkout")
+    logger = logging.getLogger(__name__)
 
+    try:
+        logger.info(
+            f"Creating order for user {request.user.username} with payment method {payment_method}"
+        )
+        order = place_cart_order(request.user, cart, payment_method, shipping)
+    except CheckoutError as e:
+        for problem in e.problems or [{"message": e.message, "blocking": True}]:
+            if problem["blocking"]:
+                messages.error(request, problem["message"])
+        return redirect("cart:cart" if e.code == "cart" else "cart:checkout")
     except Exception as e:
-        import logging
-
-        logger = logging.getLogger(__name__)
-        logger.error(f"Unexpected error in create_order_view: {str(e)}", exc_info=True)
-        messages.error(request, "An unexpected error occurred. Please try again.")
+        logger.error(f"Error creating order: {str(e)}", exc_info=True)
+        messages.error(
+            request,
+            "An error occurred while processing your payment. Please try again.",
+        )
         return redirect("cart:checkout")
+
+    logger.info(f"Order created with number: {order.order_number}")
+
+    if payment_method == "cash_on_delivery":
+        messages.success(
+            request,
+            "Order placed successfully! You can pay when the order arrives.",
+        )
+    else:
+        messages.success(request, "Order placed successfully!")
+    return redirect("orders:order_detail", order_number=order.order_number)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Product, ProductImage, ProductReview, Wishlist, Discount
+from .models import Category, Product, ProductImage, ProductReview, Wishlist, Discount, ProductImport
 
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
@@ -7,8 +7,9 @@ class ProductImageInline(admin.TabularInline):
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'slug', 'is_active', 'created_at')
+    list_display = ('name', 'slug', 'parent', 'product_count', 'is_active', 'created_at')
     list_filter = ('is_active', 'created_at')
+    readonly_fields = ('path', 'depth', 'product_count')
     search_fields = ('name', 'description')
     prepopulated_fields = {'slug': ('name',)}
 
@@ -18,7 +19,6 @@ class ProductAdmin(admin.ModelAdmin):
     list_filter = ('category', 'condition', 'is_active', 'is_featured', 'allow_bargaining', 'created_at')
     search_fields = ('name', 'description', 'sku', 'seller__username')
     inlines = [ProductImageInline]
-    prepopulated_fields = {'slug': ('name',)}
     readonly_fields = ('views_count',)
 
 @admin.register(ProductReview)
@@ -39,3 +39,10 @@ class DiscountAdmin(admin.ModelAdmin):
     list_filter = ('discount_type', 'is_active', 'valid_from', 'valid_until')
     search_fields = ('code', 'name')
     readonly_fields = ('used_count',)
+
+@admin.register(ProductImport)
+class ProductImportAdmin(admin.ModelAdmin):
+    list_display = ('id', 'seller', 'file_format', 'status', 'total_rows', 'created_count', 'updated_count', 'error_count', 'created_at')
+    list_filter = ('status', 'file_format', 'created_at')
+    search_fields = ('seller__username',)
+    readonly_fields = ('total_rows', 'created_count', 'updated_count', 'error_count', 'errors', 'finished_at')
@@ -0,0 +1,6 @@
+from crazycart.cache import CacheNamespace
+
+from .conditional import catalog_version
+
+# Follows the catalog version, so every catalog change invalidates it in all processes
+catalog_cache = CacheNamespace("catalog", timeout=10 * 60, version_func=catalog_version)
@@ -0,0 +1,198 @@
+from django.db.models import Count, F, Value
+from django.db.models.functions import Concat, Substr
+
+from crazycart.cache import CacheNamespace
+
+from .models import Category, Product
+
+PATH_SEGMENT = "{:06d}/"
+
+# Invalidated on category changes and count changes; see products.signals
+tree_cache = CacheNamespace("category-tree", timeout=60 * 60)
+
+# The last tree this process built or loaded, with its namespace version
+_local_tree = {"version": None, "tree": None}
+
+
+def place_category(category):
+    """
+    Give a saved category its path under its parent, moving its subtree
+    along when the parent changed.
+    """
+    parent_path = ""
+    depth = 0
+    if category.parent_id:
+        parent = Category.objects.only("path", "depth").get(id=category.parent_id)
+        parent_path, depth = parent.path, parent.depth + 1
+    path = parent_path + PATH_SEGMENT.format(category.pk)
+    old_path = category.path
+    if path == old_path and depth == category.depth:
+        return
+    if old_path and parent_path.startswith(old_path):
+        raise ValueError("A category cannot be moved under itself")
+
+    if old_path:
+        # Rewrite the prefix of every descendant in one UPDATE
+        Category.objects.filter(path__startswith=old_path).exclude(id=category.pk).update(
+            path=Concat(Value(path), Substr("path", len(old_path) + 1)),
+            depth=F("depth") + (depth - category.depth),
+        )
+    Category.objects.filter(id=category.pk).update(path=path, depth=depth)
+    category.path, category.depth = path, depth
+
+
+def adjust_counts(deltas):
+    """Apply {category_id: change} to the product counts"""
+    changed = False
+    for category_id, delta in deltas.items():
+        if category_id and delta:
+            Category.objects.filter(id=category_id).update(product_count=F("product_count") + delta)
+            changed = True
+    if changed:
+        tree_cache.invalidate()
+
+
+def recount_categories(category_ids=None):
+    """Recount active products for the given categories (all when None)"""
+    categories = Category.objects.all()
+    if category_ids is not None:
+        categories = categories.filter(id__in=set(category_ids))
+    products = Product.objects.filter(is_active=True)
+    if category_ids is not None:
+        products = products.filter(category_id__in=set(category_ids))
+    counts = dict(products.values_list("category_id").annotate(count=Count("id")).order_by())
+
+    to_update = []
+    for category in categories.only("id", "product_count"):
+        count = counts.get(category.id, 0)
+        if category.product_count != count:
+            category.product_count = count
+            to_update.append(category)
+    Category.objects.bulk_update(to_update, ["product_count"], batch_size=500)
+    tree_cache.invalidate()
+    return len(to_update)
+
+
+def rebuild_paths():
+    """Recompute every path and depth from the parent links"""
+    categories = {category.id: category for category in Category.objects.all()}
+    changed = []
+
+    def visit(category, parent_path, depth):
+        path = parent_path + PATH_SEGMENT.format(category.id)
+        if (category.path, category.depth) != (path, depth):
+            category.path, category.depth = path, depth
+            changed.append(category)
+        for child in children.get(category.id, []):
+            visit(child, path, depth + 1)
+
+    children = {}
+    for category in categories.values():
+        children.setdefault(category.parent_id, []).append(category)
+    for root in children.get(None, []):
+        visit(root, "", 0)
+
+    Category.objects.bulk_update(changed, ["path", "depth"], batch_size=500)
+    tree_cache.invalidate()
+    return len(changed)
+
+
+class CategoryNode:
+    """A category in the cached tree; product_count includes subcategories"""
+
+    def __init__(self, category):
+        self.id = category.id
+        self.name = category.name
+        self.slug = category.slug
+        self.description = category.description
+        self.image = category.image
+        self.path = category.path
+        self.depth = category.depth
+        self.parent_id = category.parent_id
+        self.own_count = category.product_count
+        self.product_count = category.product_count
+        self.parent = None
+        self.children = []
+        self.descendant_ids = [category.id]
+
+    def __str__(self):
+        return self.name
+
+    def __eq__(self, other):
+        return isinstance(other, CategoryNode) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    @property
+    def ancestors(self):
+        """Root first, for breadcrumbs"""
+        nodes = []
+        node = self.parent
+        while node:
+            nodes.append(node)
+            node = node.parent
+        return nodes[::-1]
+
+
+class CategoryTree:
+    """
+    Active categories as a tree. A category under an inactive parent is
+    hidden along with it.
+    """
+
+    def __init__(self, categories):
+        self.by_id = {}
+        self.roots = []
+        for category in sorted(categories, key=lambda category: category.path):
+            node = CategoryNode(category)
+            if node.parent_id is None:
+                self.roots.append(node)
+            elif node.parent_id in self.by_id:
+                node.parent = self.by_id[node.parent_id]
+                node.parent.children.append(node)
+            else:
+                continue
+            self.by_id[node.id] = node
+        self.by_slug = {node.slug: node for node in self.by_id.values()}
+
+        def sort(nodes):
+            nodes.sort(key=lambda node: node.name)
+            for node in nodes:
+                sort(node.children)
+
+        sort(self.roots)
+
+        # Deepest first, so each node adds up finished children
+        for node in sorted(self.by_id.values(), key=lambda node: -node.depth):
+            for child in node.children:
+                node.product_count += child.product_count
+                node.descendant_ids.extend(child.descendant_ids)
+
+    def get(self, slug):
+        return self.by_slug.get(slug)
+
+    def flat(self):
+        """All nodes in display order, for indented lists"""
+        nodes = []
+
+        def walk(children):
+            for node in children:
+                nodes.append(node)
+                walk(node.children)
+
+        walk(self.roots)
+        return nodes
+
+
+def get_category_tree():
+    """The cached tree; no database queries while the cache is warm"""
+    version = tree_cache.version()
+    if _local_tree["version"] == version:
+        return _local_tree["tree"]
+
+    tree = tree_cache.get_or_set(
+        "tree", lambda: CategoryTree(Category.objects.filter(is_active=True))
+    )
+    _local_tree.update(version=version, tree=tree)
+    return tree
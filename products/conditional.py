@@ -0,0 +1,153 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+from .identifiers import allocate
+from .models import IdentifierSequence
+
+CATALOG_SEQUENCE = "catalog"
+
+
+def catalog_version():
+    """
+    Bumped when something the catalog pages show changes (see
+    products.signals); one primary-key lookup. Checkouts only bump it when
+    a product sells out, since lists show stock as in or out; pages with
+    exact counts or reviews add them to their own validators.
+    """
+    return (
+        IdentifierSequence.objects.filter(name=CATALOG_SEQUENCE)
+        .values_list("value", flat=True)
+        .first()
+        or 0
+    )
+
+
+def bump_catalog_version():
+    allocate(CATALOG_SEQUENCE)
+
+
+def stock_version():
+    """When any product's stock last changed through a checkout, as a queryset for catalog_version_with()"""
+    from .models import Product
+
+    return (
+        Product.objects.filter(stock_changed_at__isnull=False)
+        .order_by("-stock_changed_at")
+        .values_list("stock_changed_at", flat=True)[:1]
+    )
+
+
+def catalog_version_with(*values):
+    """The catalog version followed by the first value of each values_list queryset, in one query"""
+    from django.db.models import Subquery
+
+    annotations = {f"value_{number}": Subquery(queryset) for number, queryset in enumerate(values)}
+    row = (
+        IdentifierSequence.objects.filter(name=CATALOG_SEQUENCE)
+        .annotate(**annotations)
+        .values_list("value", *annotations)
+        .first()
+    )
+    if row is None:
+        # Nothing bumped the version yet
+        return (0, *[next(iter(queryset), None) for queryset in values])
+    return row
+
+
+def user_state(user):
+    """
+    What the page header shows for a signed-in user (name, wallet, cart
+    count), reduced to a few aggregates.
+    """
+    from cart.cache import get_cart_summary
+
+    cart = get_cart_summary(user)
+    return [
+        user.pk,
+        user.username,
+        user.get_full_name(),
+        user.user_type,
+        user.crazycart_balance,
+        cart["lines"],
+        cart["total_items"],
+        cart["changed"],
+    ]
+
+
+def guest_state(request):
+    """The guest cart badge, for visitors who are not signed in"""
+    from cart.guest import get_guest_cart_summary, guest_cart_key
+
+    key = guest_cart_key(request)
+    if not key:
+        return []
+    cart = get_guest_cart_summary(key)
+    return [key, cart["lines"], cart["total_items"], cart["changed"]]
+
+
+def catalog_etag(request, *parts):
+    """
+    Validator for catalog pages: the catalog version, the request URL, the
+    CSRF cookie embedded in forms and the header state of the viewer or
+    their guest cart. None disables conditional handling, e.g. when flash
+    messages are waiting to be shown.
+    """
+    if len(get_messages(request)):
+        return None
+
+    values = [
+        catalog_version(),
+        request.get_full_path(),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+    ]
+    if request.user.is_authenticated:
+        values.extend(user_state(request.user))
+    else:
+        values.extend(guest_state(request))
+    values.extend(parts)
+    digest = hashlib.md5(repr(values).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def page_etag(request, *args, **kwargs):
+    """Default validator; view arguments are already part of the URL"""
+    return catalog_etag(request)
+
+
+def catalog_conditional(etag_func=page_etag, not_modified_hook=None):
+    """
+    Like django.views.decorators.http.condition, but the validator is
+    computed before the view runs its queries, and `not_modified_hook`
+    can still record the hit when a 304 is returned.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+
+            etag = etag_func(request, *args, **kwargs)
+            if etag is not None:
+                not_modified = get_conditional_response(request, etag=etag)
+                if not_modified is not None:
+                    if not_modified_hook and not_modified.status_code == 304:
+                        not_modified_hook(request, *args, **kwargs)
+                    patch_vary_headers(not_modified, ("Cookie",))
+                    return not_modified
+
+            response = view(request, *args, **kwargs)
+            if etag is not None and response.status_code == 200 and not response.has_header("ETag"):
+                response["ETag"] = etag
+                response["Cache-Control"] = "private, no-cache"
+                patch_vary_headers(response, ("Cookie",))
+            return response
+
+        return wrapper
+
+    return decorator
@@ -26,6 +26,14 @@ class ProductForm(forms.ModelForm):
             else:
                 field.widget.attrs['class'] = 'w-full p-3 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-600'
 
+class ProductImportForm(forms.Form):
+    file = forms.FileField(help_text='CSV or JSONL product catalog')
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['file'].widget.attrs['class'] = 'w-full p-3 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-600'
+        self.fields['file'].widget.attrs['accept'] = '.csv,.jsonl,.ndjson,.json'
+
 class ProductReviewForm(forms.ModelForm):
     class Meta:
         model = ProductReview
@@ -0,0 +1,101 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.text import slugify
+
+from .models import IdentifierSequence, Product
+
+SKU_SEQUENCE = "sku"
+SLUG_SEQUENCE_PREFIX = "slug:"
+SLUG_BASE_LENGTH = 180
+DEFAULT_SLUG = "product"
+
+
+def allocate(name, count=1):
+    """
+    Reserve `count` consecutive values from the named sequence and return
+    the first one. Costs one UPDATE and one SELECT regardless of count; the
+    row lock taken by the UPDATE serializes concurrent allocators.
+    """
+    with transaction.atomic():
+        updated = IdentifierSequence.objects.filter(name=name).update(
+            value=F("value") + count
+        )
+        if not updated:
+            try:
+                with transaction.atomic():
+                    IdentifierSequence.objects.create(name=name, value=count)
+                return 1
+            except IntegrityError:
+                # Another allocator created the row first
+                IdentifierSequence.objects.filter(name=name).update(
+                    value=F("value") + count
+                )
+        value = IdentifierSequence.objects.values_list("value", flat=True).get(name=name)
+    return value - count + 1
+
+
+def base_slug(name):
+    return slugify(name)[:SLUG_BASE_LENGTH].strip("-") or DEFAULT_SLUG
+
+
+def format_slug(base, number):
+    return base if number == 1 else f"{base}-{number}"
+
+
+def _allocate_unique(keys, format_value, field, exclude=()):
+    """
+    One value per key from each key's sequence, skipping values already
+    used by a product or in `exclude`. Sequences of different keys can
+    produce the same value ("Phone" twice and "Phone 2" all give
+    "phone-2"), and sellers type SKUs in the generated format, so taken
+    values are drawn again from the next numbers.
+    """
+    values = [None] * len(keys)
+    pending = list(range(len(keys)))
+    taken = set(exclude)
+    while pending:
+        next_numbers = {key: allocate(key, count) for key, count in Counter(keys[i] for i in pending).items()}
+        candidates = {}
+        for i in pending:
+            candidates[i] = format_value(i, next_numbers[keys[i]])
+            next_numbers[keys[i]] += 1
+        taken.update(
+            Product.objects.filter(**{f"{field}__in": candidates.values()}).values_list(field, flat=True)
+        )
+        pending = []
+        for i, value in candidates.items():
+            if value in taken:
+                pending.append(i)
+            else:
+                values[i] = value
+                taken.add(value)
+    return values
+
+
+def allocate_slug(name):
+    return allocate_slugs([name])[0]
+
+
+def allocate_slugs(names):
+    """Unique slugs for many names with one allocation per distinct base slug"""
+    bases = [base_slug(name) for name in names]
+    return _allocate_unique(
+        [SLUG_SEQUENCE_PREFIX + base for base in bases],
+        lambda i, number: format_slug(bases[i], number),
+        "slug",
+    )
+
+
+def format_sku(number, name):
+    return f"PROD-{number:06d}-{slugify(name)[:10]}"
+
+
+def allocate_sku(name):
+    return allocate_skus([name])[0]
+
+
+def allocate_skus(names, exclude=()):
+    """Unique SKUs for many names with a single range allocation; `exclude` holds SKUs about to be used"""
+    return _allocate_unique([SKU_SEQUENCE] * len(names), lambda i, number: format_sku(number, names[i]), "sku", exclude)
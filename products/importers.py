@@ -0,0 +1,517 @@
+import csv
+import http.client
+import io
+import ipaddress
+import json
+import os
+import socket
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from urllib.request import HTTPHandler, HTTPRedirectHandler, HTTPSHandler, build_opener
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.forms.models import model_to_dict
+from django.utils import timezone
+
+from .categories import recount_categories
+from .conditional import bump_catalog_version
+from .forms import ProductForm
+from .identifiers import allocate_skus, allocate_slugs
+from .models import Category, Product, ProductImage
+
+IMPORT_FORMATS = ("csv", "jsonl")
+IMPORT_BATCH_SIZE = 500
+IMAGE_WORKERS = 8
+MAX_IMAGES_PER_PRODUCT = 5
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+IMAGE_FETCH_TIMEOUT = 10
+# Pillow formats accepted for product images, and the extension they are stored with
+IMAGE_EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "GIF": "gif", "WEBP": "webp"}
+
+BOOLEAN_FIELDS = ("allow_bargaining", "is_featured")
+FALSE_VALUES = ("", "0", "false", "no", "n", "off")
+
+
+class ProductRowForm(ProductForm):
+    """ProductForm rules for one import row; category is resolved from a preloaded map"""
+
+    class Meta(ProductForm.Meta):
+        fields = [field for field in ProductForm.Meta.fields if field != "category"]
+
+
+class ImportResult:
+    def __init__(self):
+        self.total_rows = 0
+        self.created_count = 0
+        self.updated_count = 0
+        self.errors = []
+
+    def add_error(self, row_number, sku, messages):
+        self.errors.append({"row": row_number, "sku": sku or "", "errors": messages})
+
+    @property
+    def error_count(self):
+        return len(self.errors)
+
+
+def detect_format(filename):
+    extension = os.path.splitext(filename)[1].lower()
+    return "jsonl" if extension in (".jsonl", ".ndjson", ".json") else "csv"
+
+
+def read_rows(fileobj, file_format):
+    """Yield (row_number, row, error) tuples from a binary or text file object"""
+    if isinstance(fileobj.read(0), bytes):
+        fileobj = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+
+    if file_format == "csv":
+        # Row 1 is the header
+        for row_number, row in enumerate(csv.DictReader(fileobj), start=2):
+            yield row_number, row, None
+    elif file_format == "jsonl":
+        for row_number, line in enumerate(fileobj, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield row_number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield row_number, None, "Each line must be a JSON object"
+                continue
+            yield row_number, row, None
+    else:
+        raise ValueError(f"Unsupported import format: {file_format}")
+
+
+def _load_categories():
+    lookup = {}
+    for category in Category.objects.filter(is_active=True):
+        lookup[str(category.id)] = category
+        lookup[category.slug] = category
+        lookup[category.name.lower()] = category
+    return lookup
+
+
+def _split_image_refs(value):
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        refs = value
+    else:
+        refs = str(value).replace("|", ";").split(";")
+    return [ref.strip() for ref in refs if ref and ref.strip()][:MAX_IMAGES_PER_PRODUCT]
+
+
+def _row_data(row, product):
+    """Form data for a row: existing values (on update) overlaid with the row's columns"""
+    data = model_to_dict(product, fields=ProductRowForm.Meta.fields) if product else {}
+    for field in ProductRowForm.Meta.fields:
+        if field in row and row[field] is not None:
+            data[field] = row[field]
+
+    for field in BOOLEAN_FIELDS:
+        value = data.get(field)
+        if value is None:
+            data[field] = Product._meta.get_field(field).default
+        elif isinstance(value, str):
+            data[field] = value.strip().lower() not in FALSE_VALUES
+    return data
+
+
+def _is_public(address):
+    ip = ipaddress.ip_address(address.split("%")[0])
+    return ip.is_global and not ip.is_multicast
+
+
+def check_image_host(url):
+    """
+    Refuse URLs that would make the server fetch from itself or its
+    network: hosts outside PRODUCT_IMPORT_IMAGE_HOSTS when that is set,
+    and any host resolving to a private, loopback, link-local or reserved
+    address.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError(f"Image URL '{url}' is not an http(s) URL")
+    host = parsed.hostname.lower()
+
+    allowed = getattr(settings, "PRODUCT_IMPORT_IMAGE_HOSTS", None)
+    if allowed and not any(host == domain or host.endswith("." + domain) for domain in allowed):
+        raise ValueError(f"Image host '{host}' is not allowed")
+
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parsed.port or None)}
+    except (socket.gaierror, UnicodeError, ValueError):
+        raise ValueError(f"Image host '{host}' could not be resolved")
+    if not all(map(_is_public, addresses)):
+        raise ValueError(f"Image host '{host}' is not a public address")
+
+
+def _public_connection(address, *args, **kwargs):
+    # The name is resolved again to connect, so the address actually connected to is checked too
+    sock = socket.create_connection(address, *args, **kwargs)
+    if not _is_public(sock.getpeername()[0]):
+        sock.close()
+        raise ValueError(f"Image host '{address[0]}' is not a public address")
+    return sock
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPHandler(HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _CheckedRedirectHandler(HTTPRedirectHandler):
+    """Redirects are followed only to hosts that pass check_image_host"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_image_host(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+_image_opener = build_opener(_PublicHTTPHandler, _PublicHTTPSHandler, _CheckedRedirectHandler)
+
+
+def fetch_image(ref, images_root=None):
+    """Return the bytes of an http(s) URL on a public host or of a path inside images_root"""
+    parsed = urlparse(ref)
+    if parsed.scheme in ("http", "https"):
+        check_image_host(ref)
+        with _image_opener.open(ref, timeout=IMAGE_FETCH_TIMEOUT) as response:
+            content = response.read(MAX_IMAGE_BYTES + 1)
+    else:
+        if not images_root:
+            raise ValueError(f"Local image '{ref}' not allowed without an images directory")
+        root = os.path.realpath(images_root)
+        path = os.path.realpath(os.path.join(root, ref))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"Image '{ref}' is outside the images directory")
+        with open(path, "rb") as f:
+            content = f.read(MAX_IMAGE_BYTES + 1)
+
+    if len(content) > MAX_IMAGE_BYTES:
+        raise ValueError(f"Image '{ref}' is larger than {MAX_IMAGE_BYTES} bytes")
+    return content
+
+
+def image_extension(content):
+    """The extension to store image bytes under; ValueError unless Pillow reads them as an allowed format"""
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            image.verify()
+            image_format = image.format
+    except Exception:
+        raise ValueError("not a valid image")
+    if image_format not in IMAGE_EXTENSIONS:
+        raise ValueError(f"{image_format} images are not allowed")
+    return IMAGE_EXTENSIONS[image_format]
+
+
+def store_image(ref, images_root=None):
+    """Fetch, check and save an image under a generated name; the remote name is never used"""
+    content = fetch_image(ref, images_root)
+    extension = image_extension(content)
+    return default_storage.save(f"products/{uuid.uuid4().hex}.{extension}", ContentFile(content))
+
+
+def _process_images(pending_images, images_root, result):
+    """Fetch and store images in a worker pool, then attach them with one bulk insert"""
+    if not pending_images:
+        return
+
+    jobs = []
+    with ThreadPoolExecutor(max_workers=IMAGE_WORKERS) as pool:
+        for row_number, product, refs in pending_images:
+            futures = [pool.submit(store_image, ref, images_root) for ref in refs]
+            jobs.append((row_number, product, refs, futures))
+
+    new_images = []
+    replaced_ids = []
+    for row_number, product, refs, futures in jobs:
+        stored = []
+        failures = []
+        for ref, future in zip(refs, futures):
+            try:
+                stored.append(future.result())
+            except Exception as e:
+                failures.append(f"Image '{ref}': {e}")
+        if failures:
+            result.add_error(row_number, product.sku, failures)
+        if not stored:
+            continue
+
+        replaced_ids.append(product.id)
+        for index, name in enumerate(stored):
+            new_images.append(
+                ProductImage(
+                    product=product,
+                    image=name,
+                    alt_text=product.name[:200],
+                    is_primary=(index == 0),
+                    order=index,
+                )
+            )
+
+    with transaction.atomic():
+        ProductImage.objects.filter(product_id__in=replaced_ids).delete()
+        ProductImage.objects.bulk_create(new_images)
+
+
+def _import_batch(seller, batch, categories, seen_skus, images_root, result):
+    skus = [str(row.get("sku") or "").strip() for _, row in batch]
+    existing = {
+        product.sku: product
+        for product in Product.objects.filter(sku__in=[sku for sku in skus if sku])
+    }
+
+    to_create = []
+    to_update = []
+    pending_images = []
+    touched_categories = set()
+    now = timezone.now()
+
+    for (row_number, row), sku in zip(batch, skus):
+        if sku in seen_skus:
+            result.add_error(row_number, sku, ["Duplicate SKU in file"])
+            continue
+        if sku:
+            seen_skus.add(sku)
+
+        product = existing.get(sku)
+        if product and product.seller_id != seller.id:
+            result.add_error(row_number, sku, ["SKU belongs to another seller"])
+            continue
+        if product:
+            touched_categories.add(product.category_id)
+
+        category_ref = str(row.get("category") or "").strip()
+        if category_ref:
+            category = categories.get(category_ref) or categories.get(category_ref.lower())
+            if category is None:
+                result.add_error(row_number, sku, [f"Unknown category '{category_ref}'"])
+                continue
+        elif product:
+            category = None
+        else:
+            result.add_error(row_number, sku, ["Category is required"])
+            continue
+
+        form = ProductRowForm(data=_row_data(row, product), instance=product)
+        if not form.is_valid():
+            result.add_error(
+                row_number,
+                sku,
+                [f"{field}: {error}" for field, errors in form.errors.items() for error in errors],
+            )
+            continue
+
+        obj = form.save(commit=False)
+        if category is not None:
+            obj.category = category
+        obj.seller = seller
+        obj.sku = sku
+
+        touched_categories.add(obj.category_id)
+        if product:
+            obj.updated_at = now
+            to_update.append(obj)
+        else:
+            to_create.append(obj)
+
+        refs = _split_image_refs(row.get("images"))
+        if refs:
+            pending_images.append((row_number, obj, refs))
+
+    # bulk_create skips Product.save(), so allocate identifiers for the whole batch here
+    for obj, slug in zip(to_create, allocate_slugs([obj.name for obj in to_create])):
+        obj.slug = slug
+    missing_sku = [obj for obj in to_create if not obj.sku]
+    generated_skus = allocate_skus([obj.name for obj in missing_sku], exclude=seen_skus)
+    for obj, generated in zip(missing_sku, generated_skus):
+        obj.sku = generated
+
+    with transaction.atomic():
+        Product.objects.bulk_create(to_create)
+        if to_update:
+            Product.objects.bulk_update(
+                to_update, ProductRowForm.Meta.fields + ["category", "updated_at"]
+            )
+
+    result.created_count += len(to_create)
+    result.updated_count += len(to_update)
+    # bulk_create/bulk_update skip the signals that keep category counts
+    if to_create or to_update:
+        recount_categories(touched_categories)
+
+    _process_images(pending_images, images_root, result)
+    bump_catalog_version()
+
+
+def import_products(
+    seller,
+    fileobj,
+    file_format="csv",
+    images_root=None,
+    batch_size=IMPORT_BATCH_SIZE,
+    progress=None,
+):
+    """
+    Upsert a seller's products by SKU from a CSV/JSONL catalog. Rows
+    without a SKU are created with a generated one.
+
+    Rows are validated with ProductForm rules and written with
+    bulk_create/bulk_update every `batch_size` rows. Bad rows are skipped
+    and reported in the returned ImportResult.
+    """
+    result = ImportResult()
+    categories = _load_categories()
+    seen_skus = set()
+    batch = []
+
+    for row_number, row, error in read_rows(fileobj, file_format):
+        result.total_rows += 1
+        if error:
+            result.add_error(row_number, "", [error])
+            continue
+        batch.append((row_number, row))
+        if len(batch) >= batch_size:
+            _import_batch(seller, batch, categories, seen_skus, images_root, result)
+            batch = []
+            if progress:
+                progress(result)
+
+    if batch:
+        _import_batch(seller, batch, categories, seen_skus, images_root, result)
+        if progress:
+            progress(result)
+
+    return result
+
+
+def write_error_report(errors, fileobj):
+    writer = csv.writer(fileobj)
+    writer.writerow(["row", "sku", "errors"])
+    for error in errors:
+        writer.writerow([error["row"], error["sku"], "; ".join(error["errors"])])
+
+
+def run_import(product_import, images_root=None, batch_size=IMPORT_BATCH_SIZE):
+    """Run a stored ProductImport, saving progress after every batch"""
+    from .models import ProductImport
+
+    def save_progress(result):
+        ProductImport.objects.filter(id=product_import.id).update(
+            total_rows=result.total_rows,
+            created_count=result.created_count,
+            updated_count=result.updated_count,
+            error_count=result.error_count,
+        )
+
+    if product_import.status != "running":
+        product_import.status = "running"
+        product_import.started_at = timezone.now()
+        product_import.save(update_fields=["status", "started_at"])
+
+    try:
+        with product_import.file.open("rb") as f:
+            result = import_products(
+                product_import.seller,
+                f,
+                product_import.file_format,
+                images_root=images_root,
+                batch_size=batch_size,
+                progress=save_progress,
+            )
+    except Exception as e:
+        product_import.status = "failed"
+        product_import.errors = [{"row": 0, "sku": "", "errors": [str(e)]}]
+        product_import.error_count = 1
+    else:
+        product_import.status = "completed"
+        product_import.total_rows = result.total_rows
+        product_import.created_count = result.created_count
+        product_import.updated_count = result.updated_count
+        product_import.error_count = result.error_count
+        product_import.errors = result.errors
+
+    product_import.finished_at = timezone.now()
+    product_import.save()
+    return product_import
+
+
+def claim_next_import():
+    """The oldest pending import, marked running so no other worker takes it; None if there is none"""
+    from .models import ProductImport
+
+    for import_id in ProductImport.objects.filter(status="pending").order_by("created_at", "id").values_list(
+        "id", flat=True
+    )[:10]:
+        now = timezone.now()
+        if ProductImport.objects.filter(id=import_id, status="pending").update(status="running", started_at=now):
+            return ProductImport.objects.select_related("seller").get(id=import_id)
+    return None
+
+
+def fail_stale_imports(older_than):
+    """
+    Fail imports still "running" since before `older_than`: the worker that
+    had them stopped. They are not retried, since rows without a SKU would
+    be created twice; the seller uploads the rest again.
+    """
+    from django.db.models import Q
+    from .models import ProductImport
+
+    stale = ProductImport.objects.filter(
+        Q(started_at__lt=older_than) | Q(started_at__isnull=True), status="running"
+    )
+    count = 0
+    for product_import in stale:
+        message = (
+            f"The import stopped after {product_import.total_rows} rows. "
+            "Rows with a SKU can be uploaded again safely."
+        )
+        count += ProductImport.objects.filter(id=product_import.id, status="running").update(
+            status="failed",
+            finished_at=timezone.now(),
+            error_count=product_import.error_count + 1,
+            errors=product_import.errors + [{"row": 0, "sku": "", "errors": [message]}],
+        )
+    return count
+
+
+def run_pending_imports(images_root=None, limit=None):
+    """Run queued imports one after another; returns how many ran"""
+    count = 0
+    while limit is None or count < limit:
+        product_import = claim_next_import()
+        if product_import is None:
+            break
+        run_import(product_import, images_root=images_root)
+        count += 1
+    return count
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Compare full responses with If-None-Match revalidation on the catalog pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50, help="Requests per page and mode")
+        parser.add_argument("--url", action="append", dest="urls", help="Page to measure (repeatable)")
+
+    def measure(self, client, url, count, headers=None):
+        total_bytes = 0
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for _ in range(count):
+                response = client.get(url, headers=headers or {})
+                total_bytes += len(response.content)
+            elapsed = time.perf_counter() - start
+        return response, elapsed * 1000 / count, total_bytes / count, len(queries) / count
+
+    def handle(self, *args, **options):
+        count = options["requests"]
+        urls = options["urls"]
+        if not urls:
+            product = Product.objects.filter(is_active=True).order_by("id").first()
+            if product is None:
+                raise CommandError("No active products; run populate_sample_data_new first")
+            urls = ["/", "/products/", f"/products/{product.slug}/", "/api/v1/products/"]
+
+        client = Client(HTTP_HOST="localhost")
+        client.get("/")  # pick up the CSRF cookie like a browser would
+
+        self.stdout.write(f"{'page':40} {'status':6} {'ms/req':>8} {'bytes':>9} {'queries':>8}")
+        for url in urls:
+            full, full_ms, full_bytes, full_queries = self.measure(client, url, count)
+            etag = full.get("ETag")
+            if not etag:
+                self.stdout.write(self.style.WARNING(f"{url}: no ETag (status {full.status_code})"))
+                continue
+            cached, cached_ms, cached_bytes, cached_queries = self.measure(
+                client, url, count, {"If-None-Match": etag}
+            )
+            self.stdout.write(f"{url:40} {full.status_code:<6} {full_ms:8.2f} {full_bytes:9.0f} {full_queries:8.1f}")
+            self.stdout.write(
+                f"{'':40} {cached.status_code:<6} {cached_ms:8.2f} {cached_bytes:9.0f} {cached_queries:8.1f}"
+            )
+            saved = 100 * (1 - cached_ms / full_ms) if full_ms else 0
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{'':40} saved {full_bytes - cached_bytes:.0f} bytes and {saved:.0f}% time per repeat visit"
+                )
+            )
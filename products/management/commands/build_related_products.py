@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from products.models import Product
+from products.related import rebuild_related, stale_product_ids
+
+
+class Command(BaseCommand):
+    help = "Build the related-products index (incrementally by default)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full", action="store_true", help="Rebuild every active product instead of only stale ones"
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        products = Product.objects.filter(is_active=True).only("id", "category_id", "brand")
+        if not options["full"]:
+            products = products.filter(id__in=stale_product_ids())
+
+        count = rebuild_related(products.iterator(chunk_size=options["batch_size"]), options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt related products for {count} products"))
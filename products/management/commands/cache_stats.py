@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from crazycart.cache import cache_stats
+import cart.cache  # noqa: F401  (registers the namespaces)
+import products.cache  # noqa: F401
+
+
+class Command(BaseCommand):
+    help = "Show hit ratios of the cache namespaces, as recorded in the shared cache"
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'namespace':12} {'hits':>8} {'stale':>8} {'misses':>8} {'negative':>8} {'ratio':>6}")
+        for name, counts in cache_stats().items():
+            ratio = f"{counts['hit_ratio']:.0%}" if counts["hit_ratio"] is not None else "-"
+            self.stdout.write(
+                f"{name:12} {counts['hit']:8} {counts['stale']:8} {counts['miss']:8} "
+                f"{counts['negative_hit']:8} {ratio:>6}"
+            )
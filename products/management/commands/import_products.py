@@ -0,0 +1,71 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from products.importers import (
+    import_products,
+    detect_format,
+    write_error_report,
+    IMPORT_FORMATS,
+    IMPORT_BATCH_SIZE,
+)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Bulk import (upsert by SKU) a seller's products from a CSV or JSONL catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument("seller", help="Seller username")
+        parser.add_argument("file", help="Path to the CSV or JSONL catalog")
+        parser.add_argument("--format", choices=IMPORT_FORMATS, help="Defaults to the file extension")
+        parser.add_argument(
+            "--images-dir",
+            help="Directory for local image references (defaults to the catalog's directory)",
+        )
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument("--report", help="Write the per-row error report to this CSV file")
+
+    def handle(self, *args, **options):
+        try:
+            seller = User.objects.get(username=options["seller"], user_type="seller")
+        except User.DoesNotExist:
+            raise CommandError(f"Seller '{options['seller']}' not found")
+
+        path = options["file"]
+        if not os.path.exists(path):
+            raise CommandError(f"File '{path}' not found")
+
+        file_format = options["format"] or detect_format(path)
+        images_dir = options["images_dir"] or os.path.dirname(os.path.abspath(path))
+
+        def progress(result):
+            self.stdout.write(
+                f"  {result.total_rows} rows: {result.created_count} created, "
+                f"{result.updated_count} updated, {result.error_count} errors"
+            )
+
+        with open(path, "rb") as f:
+            result = import_products(
+                seller,
+                f,
+                file_format,
+                images_root=images_dir,
+                batch_size=options["batch_size"],
+                progress=progress,
+            )
+
+        if options["report"]:
+            with open(options["report"], "w", newline="", encoding="utf-8") as f:
+                write_error_report(result.errors, f)
+        else:
+            for error in result.errors[:50]:
+                self.stdout.write(f"Row {error['row']} ({error['sku']}): {'; '.join(error['errors'])}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result.total_rows} rows: {result.created_count} created, "
+                f"{result.updated_count} updated, {result.error_count} errors"
+            )
+        )
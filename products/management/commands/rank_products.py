@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from products.rankings import update_scores, rebuild_rankings, STORED_N
+
+
+class Command(BaseCommand):
+    help = "Update time-decayed popularity scores and rebuild trending/best-seller rankings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=STORED_N, help="Products stored per ranked list")
+
+    def handle(self, *args, **options):
+        scored = update_scores()
+        ranked = rebuild_rankings(options["limit"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Updated {scored} popularity scores, wrote {ranked} ranking rows")
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from products.categories import rebuild_paths, recount_categories
+
+
+class Command(BaseCommand):
+    help = "Recompute category paths from parent links and recount active products per category"
+
+    def handle(self, *args, **options):
+        paths = rebuild_paths()
+        counts = recount_categories()
+        self.stdout.write(self.style.SUCCESS(f"Fixed {paths} paths and {counts} product counts"))
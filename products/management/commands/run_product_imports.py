@@ -0,0 +1,45 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.importers import fail_stale_imports, run_pending_imports
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the catalog imports sellers queued from the bulk import page, oldest first. "
+        'Imports left "running" by a worker that stopped are marked failed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run what is queued and exit")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds to wait when idle")
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=settings.PRODUCT_IMPORT_STALE_AFTER,
+            help="Seconds after which a running import counts as abandoned",
+        )
+
+    def run(self, options):
+        stale = fail_stale_imports(timezone.now() - timedelta(seconds=options["stale_after"]))
+        if stale:
+            self.stdout.write(f"Marked {stale} abandoned imports as failed")
+        count = run_pending_imports(images_root=getattr(settings, "PRODUCT_IMPORT_IMAGE_ROOT", None))
+        if count:
+            self.stdout.write(self.style.SUCCESS(f"Ran {count} imports"))
+        return count
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            self.run(options)
+            return
+        try:
+            while True:
+                if not self.run(options):
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.4 on 2026-10-19 04:09
+
+import re
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+SLUG_BASE_LENGTH = 180
+BATCH_SIZE = 500
+
+
+def dedupe_slugs(apps, schema_editor):
+    """Give duplicate/empty product slugs a -N suffix and seed the identifier counters"""
+    Product = apps.get_model("products", "Product")
+    IdentifierSequence = apps.get_model("products", "IdentifierSequence")
+
+    used = set()
+    counters = {}
+    changed = []
+
+    for product in Product.objects.order_by("id").only("id", "name", "slug").iterator(chunk_size=BATCH_SIZE):
+        base = product.slug or slugify(product.name)[:SLUG_BASE_LENGTH].strip("-") or "product"
+        slug = base
+        number = counters.get(base, 1)
+        while slug in used:
+            number += 1
+            slug = f"{base}-{number}"
+        counters[base] = number
+        used.add(slug)
+
+        if slug != product.slug:
+            product.slug = slug
+            changed.append(product)
+        if len(changed) >= BATCH_SIZE:
+            Product.objects.bulk_update(changed, ["slug"])
+            changed = []
+
+    if changed:
+        Product.objects.bulk_update(changed, ["slug"])
+
+    # Make sure future "name" allocations skip past existing "name-N" slugs
+    for slug in used:
+        counters[slug] = max(counters.get(slug, 1), 1)
+        match = re.match(r"^(.+)-(\d+)$", slug)
+        if match:
+            prefix, number = match.group(1), int(match.group(2))
+            counters[prefix] = max(counters.get(prefix, 1), number)
+
+    sequences = [
+        IdentifierSequence(name=f"slug:{base}", value=value)
+        for base, value in counters.items()
+    ]
+    last_id = Product.objects.aggregate(models.Max("id"))["id__max"] or 0
+    sequences.append(IdentifierSequence(name="sku", value=last_id))
+    IdentifierSequence.objects.bulk_create(sequences, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_productimport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdentifierSequence',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(dedupe_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=200, unique=True),
+        ),
+    ]
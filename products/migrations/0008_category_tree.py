@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-19 04:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_paths_and_counts(apps, schema_editor):
+    # Existing categories are all top level
+    Category = apps.get_model('products', 'Category')
+    Product = apps.get_model('products', 'Product')
+    counts = dict(
+        Product.objects.filter(is_active=True)
+        .values_list('category_id')
+        .annotate(count=models.Count('id'))
+    )
+    categories = list(Category.objects.all())
+    for category in categories:
+        category.path = f"{category.id:06d}/"
+        category.depth = 0
+        category.product_count = counts.get(category.id, 0)
+    Category.objects.bulk_update(categories, ['path', 'depth', 'product_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_rankings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='products.category'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_paths_and_counts, migrations.RunPython.noop),
+    ]
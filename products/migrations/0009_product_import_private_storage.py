@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:29
+
+import products.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_category_tree'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimport',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='productimport',
+            name='file',
+            field=models.FileField(storage=products.models.import_storage, upload_to='imports/'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_import_private_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_changed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -1,11 +1,18 @@
 from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.core.files.storage import storages
 from django.utils.text import slugify
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100, unique=True, blank=True)
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    # Materialized path of zero-padded ids, e.g. "000001/000007/"; descendants share the prefix
+    path = models.CharField(max_length=255, editable=False, db_index=True, default='')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Active products directly in this category, kept up to date by products.signals
+    product_count = models.PositiveIntegerField(default=0, editable=False)
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='categories/', blank=True, null=True)
     is_active = models.BooleanField(default=True)
@@ -15,10 +22,18 @@ class Category(models.Model):
         verbose_name_plural = 'Categories'
         ordering = ['name']
     
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if self.parent_id and self.pk and self.parent.path.startswith(self.path):
+            raise ValidationError({'parent': 'A category cannot be moved under itself.'})
+    
     def save(self, *args, **kwargs):
+        from .categories import place_category, tree_cache
         if not self.slug:
             self.slug = slugify(self.name)
         super().save(*args, **kwargs)
+        place_category(self)
+        tree_cache.invalidate()
     
     def __str__(self):
         return self.name
@@ -34,7 +49,7 @@ class Product(models.Model):
     seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='products')
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     name = models.CharField(max_length=200)
-    slug = models.SlugField(max_length=200, blank=True)
+    slug = models.SlugField(max_length=200, unique=True, blank=True)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     original_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
@@ -52,17 +67,27 @@ class Product(models.Model):
     allow_bargaining = models.BooleanField(default=True)
     minimum_bargain_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     views_count = models.PositiveIntegerField(default=0)
+    # Set by checkouts, which change stock without bumping the catalog version
+    stock_changed_at = models.DateTimeField(blank=True, null=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the category counts currently include, to apply deltas on save
+        instance._counted_in = (instance.__dict__.get('category_id'), instance.__dict__.get('is_active'))
+        return instance
+    
     def save(self, *args, **kwargs):
+        from .identifiers import allocate_slug, allocate_sku
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = allocate_slug(self.name)
         if not self.sku:
-            self.sku = f"PROD-{self.id or 'NEW'}-{slugify(self.name)[:10]}"
+            self.sku = allocate_sku(self.name)
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -79,6 +104,56 @@ class Product(models.Model):
     def is_in_stock(self):
         return self.stock_quantity > 0
 
+class RelatedProductIndex(models.Model):
+    """Precomputed related product ids, best match first (see products.related)"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='related_index')
+    related_ids = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Related products for {self.product_id}"
+
+class ProductPopularity(models.Model):
+    """Time-decayed popularity scores, maintained by the rank_products job"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='popularity')
+    trending_score = models.FloatField(default=0)
+    sales_score = models.FloatField(default=0)
+    views_seen = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"Popularity of {self.product_id}"
+
+class ProductRanking(models.Model):
+    KIND_CHOICES = [
+        ('trending', 'Trending'),
+        ('best_seller', 'Best Seller'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Null for the site-wide list
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, blank=True, null=True, related_name='rankings')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='rankings')
+    rank = models.PositiveIntegerField()
+    score = models.FloatField()
+    
+    class Meta:
+        ordering = ['kind', 'category', 'rank']
+        indexes = [
+            models.Index(fields=['kind', 'category', 'rank']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.rank}: {self.product_id}"
+
+class IdentifierSequence(models.Model):
+    """Named counter used to hand out unique slugs and SKUs without exists() retries"""
+    name = models.CharField(max_length=255, primary_key=True)
+    value = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='products/')
@@ -150,3 +225,38 @@ class Discount(models.Model):
         return (self.is_active and 
                 self.valid_from <= now <= self.valid_until and
                 (self.usage_limit is None or self.used_count < self.usage_limit))
+
+def import_storage():
+    return storages['product_imports']
+
+
+class ProductImport(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ]
+    
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='product_imports')
+    file = models.FileField(upload_to='imports/', storage=import_storage)
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='csv')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_rows = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Import #{self.id} by {self.seller.username} ({self.status})"
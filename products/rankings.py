@@ -0,0 +1,138 @@
+import math
+
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .conditional import bump_catalog_version
+from .models import Category, Product, ProductPopularity, ProductRanking, Wishlist
+
+TOP_N = 12
+# Store a few spares so products deactivated or sold out after the build can be skipped
+STORED_N = TOP_N + 8
+
+# Half-lives in days: trending reacts within days, best sellers over a month
+TRENDING_HALF_LIFE = 3.0
+SALES_HALF_LIFE = 30.0
+
+VIEW_WEIGHT = 1.0
+WISHLIST_WEIGHT = 3.0
+SALE_WEIGHT = 5.0
+
+EXCLUDED_ORDER_STATUSES = ("cancelled", "refunded")
+
+
+def decay(age_seconds, half_life_days):
+    return math.pow(0.5, max(age_seconds, 0) / (half_life_days * 86400))
+
+
+def _collect_deltas(since, now):
+    """Decayed score contributions from sales and wishlist adds after `since`"""
+    from orders.models import OrderItem
+
+    trending = {}
+    sales = {}
+
+    # Archived orders are left out; their sales have long decayed (see orders/archive.py)
+    items = OrderItem.objects.filter(created_at__lte=now).exclude(
+        order__status__in=EXCLUDED_ORDER_STATUSES
+    )
+    wishes = Wishlist.objects.filter(created_at__lte=now)
+    if since:
+        items = items.filter(created_at__gt=since)
+        wishes = wishes.filter(created_at__gt=since)
+
+    for product_id, quantity, created_at in items.values_list(
+        "product_id", "quantity", "created_at"
+    ).iterator(chunk_size=2000):
+        age = (now - created_at).total_seconds()
+        trending[product_id] = trending.get(product_id, 0) + SALE_WEIGHT * quantity * decay(age, TRENDING_HALF_LIFE)
+        sales[product_id] = sales.get(product_id, 0) + quantity * decay(age, SALES_HALF_LIFE)
+
+    for product_id, created_at in wishes.values_list("product_id", "created_at").iterator(chunk_size=2000):
+        age = (now - created_at).total_seconds()
+        trending[product_id] = trending.get(product_id, 0) + WISHLIST_WEIGHT * decay(age, TRENDING_HALF_LIFE)
+
+    return trending, sales
+
+
+@transaction.atomic
+def update_scores(now=None):
+    """
+    Decay every score by the time since the last run and add the events
+    (sales, wishlist adds, views_count growth) that happened since then.
+    """
+    now = now or timezone.now()
+    since = ProductPopularity.objects.aggregate(last=Max("updated_at"))["last"]
+
+    if since:
+        elapsed = (now - since).total_seconds()
+        ProductPopularity.objects.update(
+            trending_score=F("trending_score") * decay(elapsed, TRENDING_HALF_LIFE),
+            sales_score=F("sales_score") * decay(elapsed, SALES_HALF_LIFE),
+            updated_at=now,
+        )
+
+    trending, sales = _collect_deltas(since, now)
+
+    existing = ProductPopularity.objects.in_bulk()
+    to_create = []
+    to_update = []
+    for product_id, views_count in Product.objects.values_list("id", "views_count").iterator(chunk_size=2000):
+        popularity = existing.get(product_id)
+        if popularity is None:
+            popularity = ProductPopularity(product_id=product_id, updated_at=now)
+            to_create.append(popularity)
+        view_delta = max(views_count - popularity.views_seen, 0)
+        trend_delta = trending.get(product_id, 0) + VIEW_WEIGHT * view_delta
+        sales_delta = sales.get(product_id, 0)
+        if product_id in existing and not (trend_delta or sales_delta or view_delta):
+            continue
+        popularity.trending_score += trend_delta
+        popularity.sales_score += sales_delta
+        popularity.views_seen = views_count
+        popularity.updated_at = now
+        if product_id in existing:
+            to_update.append(popularity)
+
+    ProductPopularity.objects.bulk_create(to_create, batch_size=1000)
+    ProductPopularity.objects.bulk_update(
+        to_update, ["trending_score", "sales_score", "views_seen", "updated_at"], batch_size=1000
+    )
+    return len(to_create) + len(to_update)
+
+
+def _top(score_field, category=None, limit=TOP_N):
+    popular = ProductPopularity.objects.filter(
+        product__is_active=True, product__stock_quantity__gt=0, **{f"{score_field}__gt": 0}
+    )
+    if category is not None:
+        # Subcategory products count towards their parents' lists
+        popular = popular.filter(product__category__path__startswith=category.path)
+    return popular.order_by(f"-{score_field}", "product_id").values_list("product_id", score_field)[:limit]
+
+
+@transaction.atomic
+def rebuild_rankings(limit=STORED_N):
+    """Replace the ranked top-N lists, site-wide and per active category"""
+    rows = []
+    categories = [None] + list(Category.objects.filter(is_active=True))
+    for kind, score_field in (("trending", "trending_score"), ("best_seller", "sales_score")):
+        for category in categories:
+            for rank, (product_id, score) in enumerate(_top(score_field, category, limit), start=1):
+                rows.append(
+                    ProductRanking(kind=kind, category=category, product_id=product_id, rank=rank, score=score)
+                )
+
+    ProductRanking.objects.all().delete()
+    ProductRanking.objects.bulk_create(rows)
+    bump_catalog_version()
+    return len(rows)
+
+
+def get_ranked_products(kind, category=None, limit=TOP_N):
+    """Top products of a ranking that can still be bought; one indexed query"""
+    rankings = ProductRanking.objects.filter(
+        kind=kind, category=category, product__is_active=True, product__stock_quantity__gt=0
+    ).select_related("product", "product__category", "product__seller")
+    return [ranking.product for ranking in rankings.order_by("rank")[:limit]]
@@ -0,0 +1,146 @@
+from collections import Counter
+
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .conditional import bump_catalog_version
+from .models import Product, RelatedProductIndex, Wishlist
+
+RELATED_LIMIT = 8
+# Store a few spares so products deactivated after the build can be skipped
+STORED_LIMIT = 12
+CANDIDATE_LIMIT = 50
+
+CO_PURCHASE_WEIGHT = 5.0
+CO_WISHLIST_WEIGHT = 2.0
+CATEGORY_WEIGHT = 1.0
+BRAND_WEIGHT = 1.5
+
+
+def compute_related_ids(product, limit=STORED_LIMIT):
+    """Score candidates by co-purchase, co-wishlist and category/brand similarity"""
+    from orders.models import OrderItem
+
+    scores = Counter()
+
+    # Live orders only; archived orders are too old to count (see orders/archive.py)
+    orders = OrderItem.objects.filter(product_id=product.id).values("order_id")
+    co_purchased = (
+        OrderItem.objects.filter(order_id__in=orders, product__is_active=True)
+        .exclude(product_id=product.id)
+        .values_list("product_id")
+        .annotate(n=Count("order_id", distinct=True))
+        .order_by("-n")[:CANDIDATE_LIMIT]
+    )
+    for product_id, n in co_purchased:
+        scores[product_id] += CO_PURCHASE_WEIGHT * n
+
+    users = Wishlist.objects.filter(product_id=product.id).values("user_id")
+    co_wishlisted = (
+        Wishlist.objects.filter(user_id__in=users, product__is_active=True)
+        .exclude(product_id=product.id)
+        .values_list("product_id")
+        .annotate(n=Count("user_id", distinct=True))
+        .order_by("-n")[:CANDIDATE_LIMIT]
+    )
+    for product_id, n in co_wishlisted:
+        scores[product_id] += CO_WISHLIST_WEIGHT * n
+
+    brand = (product.brand or "").strip().lower()
+    similar = Product.objects.filter(is_active=True).exclude(id=product.id)
+    if brand:
+        similar = similar.filter(Q(category_id=product.category_id) | Q(brand__iexact=brand))
+    else:
+        similar = similar.filter(category_id=product.category_id)
+    for product_id, category_id, other_brand in similar.order_by("-views_count").values_list(
+        "id", "category_id", "brand"
+    )[:CANDIDATE_LIMIT]:
+        if category_id == product.category_id:
+            scores[product_id] += CATEGORY_WEIGHT
+        if brand and (other_brand or "").strip().lower() == brand:
+            scores[product_id] += BRAND_WEIGHT
+
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return [product_id for product_id, _ in ranked[:limit]]
+
+
+def rebuild_related(products, batch_size=500):
+    """Recompute and store the index for the given products; returns the count"""
+    rows = []
+    count = 0
+    for product in products:
+        rows.append(
+            RelatedProductIndex(product_id=product.id, related_ids=compute_related_ids(product))
+        )
+        if len(rows) >= batch_size:
+            _save_rows(rows)
+            count += len(rows)
+            rows = []
+    if rows:
+        _save_rows(rows)
+        count += len(rows)
+    return count
+
+
+def _save_rows(rows):
+    now = timezone.now()
+    for row in rows:
+        row.updated_at = now
+    RelatedProductIndex.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["product"],
+        update_fields=["related_ids", "updated_at"],
+    )
+    bump_catalog_version()
+
+
+def stale_product_ids(since=None):
+    """
+    Products whose related list may have changed since the last build: those
+    without an entry, edited products, and products in new orders or wishlists.
+    """
+    from orders.models import OrderItem
+
+    if since is None:
+        since = RelatedProductIndex.objects.aggregate(last=Max("updated_at"))["last"]
+
+    stale = set(
+        Product.objects.filter(is_active=True, related_index__isnull=True).values_list("id", flat=True)
+    )
+    if since is None:
+        return stale
+
+    stale.update(
+        Product.objects.filter(is_active=True, updated_at__gt=since).values_list("id", flat=True)
+    )
+    new_orders = OrderItem.objects.filter(created_at__gt=since).values("order_id")
+    stale.update(
+        OrderItem.objects.filter(order_id__in=new_orders).values_list("product_id", flat=True)
+    )
+    new_wishers = Wishlist.objects.filter(created_at__gt=since).values("user_id")
+    stale.update(
+        Wishlist.objects.filter(user_id__in=new_wishers).values_list("product_id", flat=True)
+    )
+    return stale
+
+
+def get_related_products(product, limit=RELATED_LIMIT):
+    """Related products for the detail page from the precomputed index"""
+    related_ids = (
+        RelatedProductIndex.objects.filter(product_id=product.id)
+        .values_list("related_ids", flat=True)
+        .first()
+    )
+
+    queryset = Product.objects.filter(is_active=True).select_related("category").prefetch_related("images")
+    if related_ids is None:
+        # Not indexed yet: newest products in the same category
+        return list(
+            queryset.filter(category_id=product.category_id)
+            .exclude(id=product.id)
+            .order_by("-created_at")[:limit]
+        )
+
+    products = {p.id: p for p in queryset.filter(id__in=related_ids)}
+    return [products[pid] for pid in related_ids if pid in products][:limit]
@@ -0,0 +1,122 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .categories import adjust_counts, recount_categories, tree_cache
+from .conditional import bump_catalog_version
+from .models import Category, Product, ProductImage
+
+# Fields the catalog pages don't render from the cached state. Stock moved
+# by checkouts is tracked separately; see products.conditional.stock_version.
+UNTRACKED_PRODUCT_FIELDS = {"views_count", "updated_at", "stock_changed_at"}
+COUNTED_PRODUCT_FIELDS = {"category", "category_id", "is_active"}
+# What the catalog pages show of a category and of a seller
+CATEGORY_FIELDS = {"name", "slug", "parent_id", "description", "image", "is_active"}
+SELLER_FIELDS = {"username", "first_name", "last_name", "email", "phone_number", "city", "state", "user_type"}
+
+_shown_fields = {
+    Product: {field.attname for field in Product._meta.concrete_fields} - UNTRACKED_PRODUCT_FIELDS,
+    Category: CATEGORY_FIELDS,
+}
+
+
+def shown_fields(model):
+    return _shown_fields.get(model, SELLER_FIELDS)
+
+
+def shown_state(instance):
+    return tuple(instance.__dict__.get(field) for field in sorted(shown_fields(type(instance))))
+
+
+@receiver(post_init, sender=Product)
+@receiver(post_init, sender=Category)
+@receiver(post_init, sender=settings.AUTH_USER_MODEL)
+def remember_shown_state(sender, instance, **kwargs):
+    instance._shown_state = shown_state(instance)
+
+
+def shown_state_changed(instance, created, update_fields):
+    """
+    Whether a save changed something the catalog pages show, so unrelated
+    writes don't all queue up behind the catalog version row.
+    """
+    fields = shown_fields(type(instance))
+    if update_fields is not None:
+        attnames = {instance._meta.get_field(name).attname for name in update_fields}
+        if not fields & attnames:
+            return False
+    before, instance._shown_state = getattr(instance, "_shown_state", None), shown_state(instance)
+    return created or before != instance._shown_state
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    count_product(instance, created, update_fields)
+    if shown_state_changed(instance, created, update_fields):
+        bump_catalog_version()
+
+
+def count_product(instance, created, update_fields):
+    """Move the product between category counts if its category or status changed"""
+    if update_fields and not COUNTED_PRODUCT_FIELDS & set(update_fields):
+        return
+    counted_in = None if created else getattr(instance, "_counted_in", None)
+    now_in = (instance.category_id, instance.is_active)
+    instance._counted_in = now_in
+    if counted_in == now_in:
+        return
+    if not created and counted_in is None:
+        # Saved without being loaded; we don't know what it was counted as
+        recount_categories([instance.category_id])
+        return
+
+    deltas = Counter()
+    if counted_in and counted_in[1]:
+        deltas[counted_in[0]] -= 1
+    if now_in[1]:
+        deltas[now_in[0]] += 1
+    adjust_counts(deltas)
+
+
+@receiver(post_save, sender=ProductImage)
+def image_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_catalog_version()
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    if not raw and shown_state_changed(instance, created, update_fields):
+        bump_catalog_version()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def seller_saved(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    # Seller names are shown next to their listings; a new seller has none yet
+    if raw or created or instance.user_type != "seller":
+        return
+    if shown_state_changed(instance, created, update_fields):
+        bump_catalog_version()
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    if instance.is_active:
+        # The category may be going away in the same cascade; the UPDATE then matches nothing
+        adjust_counts({instance.category_id: -1})
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    tree_cache.invalidate()
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=ProductImage)
+def catalog_deleted(sender, instance, **kwargs):
+    bump_catalog_version()
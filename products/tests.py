@@ -1,3 +1,483 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.addresses import address_for
+from accounts.models import User
+from cart.models import Cart, CartItem
+from orders.models import Order, OrderItem
+
+from .categories import get_category_tree
+from .conditional import catalog_version
+from .identifiers import allocate_skus, allocate_slugs, format_sku
+from .importers import check_image_host, fail_stale_imports, import_products, run_pending_imports
+from .models import (
+    Category,
+    IdentifierSequence,
+    Product,
+    ProductImage,
+    ProductImport,
+    ProductPopularity,
+    ProductReview,
+    RelatedProductIndex,
+    Wishlist,
+)
+from .rankings import get_ranked_products, rebuild_rankings, update_scores
+from .related import get_related_products, rebuild_related, stale_product_ids
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller", password="pass1234", user_type="seller")
+        self.buyer = User.objects.create_user("buyer", password="pass1234")
+        self.category = Category.objects.create(name="Phones")
+        self.product = Product.objects.create(
+            seller=self.seller,
+            category=self.category,
+            name="Phone",
+            description="Test product",
+            price=Decimal("10.00"),
+            stock_quantity=5,
+        )
+        self.urls = ["/", "/products/", f"/products/{self.product.slug}/"]
+        # The first response sets the CSRF cookie, which is part of the validator
+        self.client.get("/")
+
+    def revalidate(self, url):
+        return self.revalidated(url, self.client.get(url)["ETag"])
+
+    def revalidated(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_repeat_visit_is_not_modified(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)["ETag"]
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b"")
+                self.assertLessEqual(len(queries), 3)
+
+    def test_catalog_change_invalidates(self):
+        etags = {url: self.client.get(url)["ETag"] for url in self.urls}
+        self.product.price = Decimal("12.00")
+        self.product.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_checkout_only_invalidates_pages_showing_stock(self):
+        from orders.services import decrement_stock
+
+        address = address_for(self.buyer, {"name": "Buyer", "phone": "1", "address": "Road 1", "city": "Dhaka"})
+        order = Order.objects.create(user=self.buyer, subtotal=10, total_amount=10, shipping=address, billing=address)
+        item = OrderItem.objects.create(
+            order=order, product=self.product, seller=self.seller, quantity=2, price_at_time=10
+        )
+        api = "/api/v1/products/"
+        etags = {url: self.client.get(url)["ETag"] for url in self.urls + [api]}
+
+        decrement_stock(order)
+        changed = {url for url, etag in etags.items() if self.revalidated(url, etag).status_code == 200}
+        self.assertEqual(changed, {f"/products/{self.product.slug}/", api})
+
+        # Selling out shows on every list
+        OrderItem.objects.filter(id=item.id).update(quantity=3)
+        etags = {url: self.client.get(url)["ETag"] for url in self.urls}
+        decrement_stock(order)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.revalidated(url, etag).status_code, 200)
+
+    def test_only_shown_changes_bump_the_catalog(self):
+        version = catalog_version()
+        self.product.views_count += 1
+        self.product.save(update_fields=["views_count"])
+        Product.objects.get(id=self.product.id).save()
+        self.buyer.crazycart_balance = Decimal("5.00")
+        self.buyer.save()
+        seller = User.objects.get(id=self.seller.id)
+        seller.crazycart_balance = Decimal("5.00")
+        seller.save()
+        self.assertEqual(catalog_version(), version)
+
+        seller.first_name = "North"
+        seller.save()
+        self.assertGreater(catalog_version(), version)
+
+    def test_review_only_invalidates_its_product_page(self):
+        etags = {url: self.client.get(url)["ETag"] for url in self.urls}
+        ProductReview.objects.create(product=self.product, user=self.buyer, rating=5, review="Good")
+        changed = {url for url, etag in etags.items() if self.revalidated(url, etag).status_code == 200}
+        self.assertEqual(changed, {f"/products/{self.product.slug}/"})
+
+    def test_cart_change_invalidates_for_user(self):
+        self.client.login(username="buyer", password="pass1234")
+        self.client.get("/")
+        etag = self.client.get("/").get("ETag")
+        cart = Cart.objects.create(user=self.buyer)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        response = self.client.get("/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified_detail_counts_view(self):
+        url = f"/products/{self.product.slug}/"
+        self.assertEqual(self.revalidate(url).status_code, 304)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.views_count, 2)
+
+    def test_api_not_modified_skips_queryset(self):
+        url = "/api/v1/products/"
+        etag = self.client.get(url)["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller", password="pass1234", user_type="seller")
+        self.electronics = Category.objects.create(name="Electronics")
+        self.phones = Category.objects.create(name="Phones", parent=self.electronics)
+        self.android = Category.objects.create(name="Android", parent=self.phones)
+        self.books = Category.objects.create(name="Books")
+
+    def add_product(self, category, name, **kwargs):
+        return Product.objects.create(
+            seller=self.seller,
+            category=category,
+            name=name,
+            description="Test product",
+            price=Decimal("10.00"),
+            **kwargs,
+        )
+
+    def counts(self):
+        tree = get_category_tree()
+        return {node.slug: node.product_count for node in tree.flat()}
+
+    def test_paths(self):
+        self.android.refresh_from_db()
+        self.assertEqual(self.android.depth, 2)
+        self.assertTrue(self.android.path.startswith(self.phones.path))
+
+        # Moving a category moves its subtree
+        self.phones.parent = self.books
+        self.phones.save()
+        self.android.refresh_from_db()
+        self.assertTrue(self.android.path.startswith(self.books.path))
+
+    def test_counts_follow_products(self):
+        phone = self.add_product(self.phones, "Phone")
+        self.add_product(self.android, "Pixel")
+        self.add_product(self.android, "Hidden", is_active=False)
+        self.assertEqual(self.counts(), {"books": 0, "electronics": 2, "phones": 2, "android": 1})
+
+        phone.category = self.books
+        phone.save()
+        self.assertEqual(self.counts()["books"], 1)
+        self.assertEqual(self.counts()["phones"], 1)
+
+        phone.is_active = False
+        phone.save()
+        self.assertEqual(self.counts()["books"], 0)
+
+        Product.objects.get(name="Pixel").delete()
+        self.assertEqual(self.counts()["electronics"], 0)
+
+    def test_warm_tree_needs_no_queries(self):
+        get_category_tree()
+        with self.assertNumQueries(0):
+            tree = get_category_tree()
+        self.assertEqual([node.name for node in tree.roots], ["Books", "Electronics"])
+
+    def test_category_page_includes_subcategories(self):
+        self.add_product(self.phones, "Phone")
+        self.add_product(self.android, "Pixel")
+        self.add_product(self.books, "Novel")
+        response = self.client.get(f"/products/category/{self.electronics.slug}/")
+        names = {product.name for product in response.context["page_obj"]}
+        self.assertEqual(names, {"Phone", "Pixel"})
+        self.assertEqual(self.client.get("/products/category/missing/").status_code, 404)
+
+
+class RelatedProductsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller", password="pass1234", user_type="seller")
+        self.buyer = User.objects.create_user("buyer", password="pass1234")
+        phones, books = Category.objects.create(name="Phones"), Category.objects.create(name="Books")
+        self.phone, self.case, self.charger = [self.add_product(name, phones) for name in ("Phone", "Case", "Charger")]
+        self.novel = self.add_product("Novel", books)
+
+    def add_product(self, name, category):
+        return Product.objects.create(
+            seller=self.seller,
+            category=category,
+            name=name,
+            description="Test product",
+            price=Decimal("10.00"),
+            stock_quantity=5,
+        )
+
+    def buy(self, *products):
+        address = address_for(self.buyer, {"name": "Buyer", "phone": "1", "address": "Road 1", "city": "Dhaka"})
+        order = Order.objects.create(
+            user=self.buyer, subtotal=10, total_amount=10, shipping=address, billing=address
+        )
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, seller=self.seller, quantity=1, price_at_time=10)
+
+    def related(self, product):
+        return [related.name for related in get_related_products(product)]
+
+    def test_co_purchases_rank_first(self):
+        self.buy(self.phone, self.charger)
+        self.buy(self.phone, self.novel)
+        self.buy(self.phone, self.charger)
+        rebuild_related(Product.objects.all())
+        self.assertEqual(self.related(self.phone), ["Charger", "Novel", "Case"])
+
+        # Products deactivated after the build are skipped
+        Product.objects.filter(id=self.charger.id).update(is_active=False)
+        self.assertEqual(self.related(self.phone), ["Novel", "Case"])
+
+    def test_incremental_refresh_only_rebuilds_stale_products(self):
+        self.assertEqual(stale_product_ids(), {self.phone.id, self.case.id, self.charger.id, self.novel.id})
+        rebuild_related(Product.objects.all())
+        self.assertEqual(stale_product_ids(), set())
+
+        self.buy(self.phone, self.novel)
+        Wishlist.objects.create(user=self.buyer, product=self.case)
+        self.assertEqual(stale_product_ids(), {self.phone.id, self.novel.id, self.case.id})
+
+        before = dict(RelatedProductIndex.objects.values_list("product_id", "updated_at"))
+        out = io.StringIO()
+        call_command("build_related_products", stdout=out)
+        self.assertIn("Rebuilt related products for 3 products", out.getvalue())
+        after = dict(RelatedProductIndex.objects.values_list("product_id", "updated_at"))
+        self.assertEqual(after[self.charger.id], before[self.charger.id])
+        self.assertEqual(self.related(self.phone)[0], "Novel")
+        self.assertEqual(stale_product_ids(), set())
+
+
+class RankingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seller = User.objects.create_user("seller", password="pass1234", user_type="seller")
+        self.buyer = User.objects.create_user("buyer", password="pass1234")
+        self.address = address_for(self.buyer, {"name": "Buyer", "phone": "1", "address": "Road 1", "city": "Dhaka"})
+        category = Category.objects.create(name="Phones")
+        self.old, self.new, self.viewed = [
+            Product.objects.create(
+                seller=seller,
+                category=category,
+                name=name,
+                description="Test product",
+                price=Decimal("10.00"),
+                stock_quantity=5,
+            )
+            for name in ("Old hit", "New hit", "Viewed")
+        ]
+
+    def sell(self, product, quantity, days_ago=0):
+        order = Order.objects.create(
+            user=self.buyer, subtotal=10, total_amount=10, shipping=self.address, billing=self.address
+        )
+        item = OrderItem.objects.create(
+            order=order, product=product, seller=product.seller, quantity=quantity, price_at_time=10
+        )
+        OrderItem.objects.filter(id=item.id).update(created_at=timezone.now() - timedelta(days=days_ago))
+
+    def ranked(self, kind):
+        return [product.name for product in get_ranked_products(kind)]
+
+    def scores(self, product):
+        popularity = ProductPopularity.objects.get(product=product)
+        return popularity.trending_score, popularity.sales_score
+
+    def test_scores_decay_by_half_life(self):
+        self.sell(self.new, 2)
+        self.sell(self.old, 4, days_ago=30)
+        now = timezone.now()
+        update_scores(now)
+        trending, sales = self.scores(self.new)
+        self.assertAlmostEqual(trending, 10, places=3)
+        self.assertAlmostEqual(sales, 2, places=3)
+        self.assertAlmostEqual(self.scores(self.old)[1], 2, places=3)
+
+        # Three days (one trending half-life) later the old score has halved; the new sale is as old
+        self.sell(self.new, 1)
+        update_scores(now + timedelta(days=3))
+        trending, sales = self.scores(self.new)
+        self.assertAlmostEqual(trending, 10 / 2 + 5 / 2, places=3)
+        self.assertAlmostEqual(sales, 3 * 0.5 ** (3 / 30), places=3)
+
+    def test_ranking_order_skips_products_that_cannot_be_bought(self):
+        self.sell(self.old, 3, days_ago=60)
+        self.sell(self.new, 1)
+        Product.objects.filter(id=self.viewed.id).update(views_count=4)
+        update_scores()
+        rebuild_rankings()
+
+        self.assertEqual(self.ranked("trending"), ["New hit", "Viewed", "Old hit"])
+        self.assertEqual(self.ranked("best_seller"), ["New hit", "Old hit"])
+
+        Product.objects.filter(id=self.new.id).update(is_active=False)
+        Product.objects.filter(id=self.viewed.id).update(stock_quantity=0)
+        self.assertEqual(self.ranked("trending"), ["Old hit"])
+        self.assertEqual(self.ranked("best_seller"), ["Old hit"])
+
+
+class IdentifierTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="pass1234", user_type="seller")
+        self.category = Category.objects.create(name="Phones")
+
+    def add_product(self, name, **kwargs):
+        return Product.objects.create(
+            seller=self.seller,
+            category=self.category,
+            name=name,
+            description="Test product",
+            price=Decimal("10.00"),
+            **kwargs,
+        )
+
+    def next_sku_number(self):
+        return (IdentifierSequence.objects.filter(name="sku").values_list("value", flat=True).first() or 0) + 1
+
+    def test_numbered_slugs_do_not_clash_with_other_names(self):
+        slugs = [self.add_product(name).slug for name in ("Phone", "Phone", "Phone 2", "Phone 2")]
+        self.assertEqual(slugs, ["phone", "phone-2", "phone-2-2", "phone-2-3"])
+        self.assertEqual(allocate_slugs(["Phone 2", "Phone", "Phone 2"]), ["phone-2-4", "phone-3", "phone-2-5"])
+
+    def test_generated_skus_skip_typed_ones(self):
+        number = self.next_sku_number()
+        self.add_product("Typed", sku=format_sku(number, "Phone"))
+        self.assertEqual(self.add_product("Phone").sku, format_sku(number + 1, "Phone"))
+
+        number = self.next_sku_number()
+        typed = format_sku(number + 1, "Case")
+        skus = allocate_skus(["Case", "Case"], exclude={typed})
+        self.assertEqual(skus, [format_sku(number, "Case"), format_sku(number + 2, "Case")])
+
+
+class ProductImportTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", password="pass1234", user_type="seller")
+        Category.objects.create(name="Phones")
+        self.media = tempfile.TemporaryDirectory()
+        self.images = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.addCleanup(self.images.cleanup)
+        settings = override_settings(MEDIA_ROOT=self.media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # The field resolves its storage once, at import
+        field = ProductImport._meta.get_field("file")
+        storage, field.storage = field.storage, FileSystemStorage(location=self.images.name)
+        self.addCleanup(setattr, field, "storage", storage)
+
+    def write_image(self, name, content):
+        with open(os.path.join(self.images.name, name), "wb") as f:
+            f.write(content)
+
+    def run_import(self, images):
+        catalog = (
+            "sku,name,description,price,stock_quantity,condition,category,images\n"
+            f"P1,Phone,Test,10.00,5,new,phones,{images}\n"
+        )
+        return import_products(self.seller, io.StringIO(catalog), images_root=self.images.name)
+
+    def test_images_are_checked_and_renamed(self):
+        from PIL import Image
+
+        png = io.BytesIO()
+        Image.new("RGB", (2, 2)).save(png, "PNG")
+        self.write_image("photo.html", png.getvalue())
+        self.write_image("page.png", b"<script>alert(1)</script>")
+
+        result = self.run_import("photo.html;page.png")
+        self.assertEqual(result.created_count, 1)
+        self.assertEqual(result.errors[0]["errors"], ["Image 'page.png': not a valid image"])
+        name = ProductImage.objects.get().image.name
+        self.assertRegex(name, r"^products/[0-9a-f]{32}\.png$")
+
+    def test_internal_image_urls_are_refused(self):
+        for url in (
+            "http://127.0.0.1/admin/",
+            "http://169.254.169.254/latest/meta-data/",
+            "http://10.0.0.5/",
+            "http://[::1]:8000/",
+            "file:///etc/passwd",
+        ):
+            with self.subTest(url=url):
+                with self.assertRaises(ValueError):
+                    check_image_host(url)
+
+        result = self.run_import("http://localhost/secret.png")
+        self.assertIn("is not a public address", result.errors[0]["errors"][0])
+        self.assertFalse(ProductImage.objects.exists())
+
+    @override_settings(PRODUCT_IMPORT_IMAGE_HOSTS=["cdn.example.com"])
+    def test_image_host_allowlist(self):
+        with self.assertRaisesMessage(ValueError, "not allowed"):
+            check_image_host("https://example.org/a.png")
+
+    def test_uploads_are_queued_privately_for_the_worker(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        self.client.force_login(self.seller)
+        catalog = b"sku,name,description,price,stock_quantity,condition,category\nP1,Phone,Test,10.00,5,new,phones\n"
+        response = self.client.post(
+            "/products/import/", {"file": SimpleUploadedFile("catalog.csv", catalog)}
+        )
+        self.assertRedirects(response, "/products/import/")
+        product_import = ProductImport.objects.get()
+        self.assertEqual(product_import.status, "pending")
+        self.assertTrue(product_import.file.path.startswith(self.images.name))
+        self.assertEqual(self.client.get(f"/media/{product_import.file.name}").status_code, 404)
+
+        self.assertEqual(run_pending_imports(), 1)
+        product_import.refresh_from_db()
+        self.assertEqual((product_import.status, product_import.created_count), ("completed", 1))
+        self.assertEqual(run_pending_imports(), 0)
+
+    def test_abandoned_imports_are_failed(self):
+        product_import = ProductImport.objects.create(
+            seller=self.seller, file="imports/catalog.csv", status="running", total_rows=500
+        )
+        ProductImport.objects.filter(id=product_import.id).update(
+            started_at=timezone.now() - timedelta(hours=2)
+        )
+        self.assertEqual(fail_stale_imports(timezone.now() - timedelta(hours=3)), 0)
+        self.assertEqual(fail_stale_imports(timezone.now() - timedelta(hours=1)), 1)
+        product_import.refresh_from_db()
+        self.assertEqual(product_import.status, "failed")
+        self.assertIn("stopped after 500 rows", product_import.errors[0]["errors"][0])
+
+    def test_typed_and_generated_skus_in_one_batch(self):
+        number = (IdentifierSequence.objects.filter(name="sku").values_list("value", flat=True).first() or 0) + 1
+        catalog = (
+            "sku,name,description,price,stock_quantity,condition,category\n"
+            f"{format_sku(number, 'Phone')},Typed,Test,10.00,5,new,phones\n"
+            ",Phone,Test,10.00,5,new,phones\n"
+        )
+        result = import_products(self.seller, io.StringIO(catalog))
+        self.assertEqual((result.created_count, result.errors), (2, []))
@@ -12,6 +12,9 @@ urlpatterns = [
     ),
     path("search/", views.product_search_view, name="product_search"),
     path("add/", views.add_product_view, name="add_product"),
+    path("import/", views.bulk_import_view, name="bulk_import"),
+    path("import/<int:import_id>/status/", views.bulk_import_status, name="bulk_import_status"),
+    path("import/<int:import_id>/errors/", views.bulk_import_errors, name="bulk_import_errors"),
     path("wishlist/", views.wishlist_view, name="wishlist"),
     path("wishlist/add/", views.add_to_wishlist, name="add_to_wishlist"),
     path("wishlist/remove/", views.remove_from_wishlist, name="remove_from_wishlist"),
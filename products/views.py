@@ -1,23 +1,53 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, Http404
 from django.core.paginator import Paginator
-from django.db.models import Q, Avg, Max
-from .models import Product, Category, ProductReview, Wishlist, Discount, ProductImage
-from .forms import ProductForm, ProductReviewForm
+from django.db.models import Q, Avg, Count, Max, F
+from .models import Product, Category, ProductReview, Wishlist, Discount, ProductImage, ProductImport
+from .forms import ProductForm, ProductReviewForm, ProductImportForm
+from .related import get_related_products
+from .rankings import get_ranked_products
+from .conditional import catalog_conditional, catalog_etag
+from .cache import catalog_cache
+from .categories import get_category_tree
+
+
+def product_detail_etag(request, slug):
+    in_wishlist = request.user.is_authenticated and Wishlist.objects.filter(
+        user=request.user, product__slug=slug
+    ).exists()
+    # The page shows the exact stock count, which checkouts change without a catalog bump,
+    # and the product's reviews, which only this page shows
+    state = (
+        Product.objects.filter(slug=slug)
+        .annotate(review_count=Count("reviews"), reviewed_at=Max("reviews__updated_at"))
+        .values_list("stock_quantity", "review_count", "reviewed_at")
+        .first()
+    )
+    return catalog_etag(request, in_wishlist, state)
+
+
+def count_product_view(request, slug):
+    # A revalidated page is still a view
+    Product.objects.filter(slug=slug, is_active=True).update(views_count=F("views_count") + 1)
 
 
+@catalog_conditional()
 def product_list_view(request, category_slug=None):
     products = Product.objects.filter(is_active=True).select_related(
         "seller", "category"
     )
 
-    # Filter by category if provided
+    # Filter by category (and its subcategories) if provided
+    tree = get_category_tree()
+    category_slug = category_slug or request.GET.get("category")
     category = None
     if category_slug:
-        category = get_object_or_404(Category, slug=category_slug, is_active=True)
-        products = products.filter(category=category)
+        category = tree.get(category_slug)
+        if category is None:
+            raise Http404("No Category matches the given query.")
+        products = products.filter(category_id__in=category.descendant_ids)
 
     # Search functionality
     query = request.GET.get("q")
@@ -45,18 +75,28 @@ def product_list_view(request, category_slug=None):
     if sort_by in ["price", "-price", "name", "-name", "created_at", "-created_at"]:
         products = products.order_by(sort_by)
 
-    # Pagination
+    # Pagination; the COUNT is cached per filter combination
     paginator = Paginator(products, 12)
+    paginator.count = catalog_cache.get_or_set(
+        ("count", category_slug, query, min_price, max_price, condition),
+        lambda: products.count(),
+    )
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
 
-    # Get all categories for sidebar
-    categories = Category.objects.filter(is_active=True)
+    # Category tree for the sidebar, in display order
+    categories = tree.flat()
+
+    # Top sellers of the current category (precomputed by rank_products)
+    category_best_sellers = (
+        get_ranked_products("best_seller", category=category.id, limit=4) if category else []
+    )
 
     context = {
         "page_obj": page_obj,
         "categories": categories,
         "current_category": category,
+        "category_best_sellers": category_best_sellers,
         "query": query,
         "sort_by": sort_by,
     }
@@ -68,6 +108,7 @@ def product_search_view(request):
     return product_list_view(request)
 
 
+@catalog_conditional(product_detail_etag, not_modified_hook=count_product_view)
 def product_detail_view(request, slug):
     product = get_object_or_404(Product, slug=slug, is_active=True)
 
@@ -78,14 +119,9 @@ def product_detail_view(request, slug):
     # Get product reviews
     reviews = product.reviews.select_related("user").order_by("-created_at")
 
-    # Get related products from the same category
-    related_products = (
-        Product.objects.filter(category=product.category, is_active=True)
-        .exclude(id=product.id)
-        .select_related("category")
-        .prefetch_related("images")
-        .order_by("-created_at", "?")[:8]
-    )
+    # Get related products from the precomputed index
+    related_products = get_related_products(product)
+
     # Check if user has this in wishlist
     in_wishlist = False
     if request.user.is_authenticated:
@@ -140,6 +176,71 @@ def add_product_view(request):
     return render(request, "products/add_product.html", {"form": form})
 
 
+@login_required
+def bulk_import_view(request):
+    if request.user.user_type != "seller":
+        messages.error(request, "Only sellers can import products.")
+        return redirect("home")
+
+    if request.method == "POST":
+        form = ProductImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            from .importers import detect_format
+
+            upload = form.cleaned_data["file"]
+            # Queued for the run_product_imports worker; the page polls for status
+            ProductImport.objects.create(
+                seller=request.user,
+                file=upload,
+                file_format=detect_format(upload.name),
+            )
+
+            messages.success(
+                request, "Import queued. This page will show its progress."
+            )
+            return redirect("products:bulk_import")
+    else:
+        form = ProductImportForm()
+
+    imports = ProductImport.objects.filter(seller=request.user).defer("errors")[:10]
+
+    return render(
+        request, "products/bulk_import.html", {"form": form, "imports": imports}
+    )
+
+
+@login_required
+def bulk_import_status(request, import_id):
+    product_import = get_object_or_404(
+        ProductImport.objects.defer("errors"), id=import_id, seller=request.user
+    )
+
+    return JsonResponse(
+        {
+            "status": product_import.status,
+            "total_rows": product_import.total_rows,
+            "created_count": product_import.created_count,
+            "updated_count": product_import.updated_count,
+            "error_count": product_import.error_count,
+        }
+    )
+
+
+@login_required
+def bulk_import_errors(request, import_id):
+    """Download the per-row error report of an import as CSV"""
+    from .importers import write_error_report
+
+    product_import = get_object_or_404(ProductImport, id=import_id, seller=request.user)
+
+    response = HttpResponse(content_type="text/csv")
+    response["Content-Disposition"] = (
+        f'attachment; filename="import-{product_import.id}-errors.csv"'
+    )
+    write_error_report(product_import.errors, response)
+    return response
+
+
 @login_required
 def edit_product_view(request, slug):
     product = get_object_or_404(Product, slug=slug, seller=request.user)
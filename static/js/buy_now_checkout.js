@@ -17,6 +17,9 @@ document.addEventListener("DOMContentLoaded", function () {
     return;
   }
 
+  // One key per page load, so a repeated click gets the first result
+  const paymentKey = newIdempotencyKey();
+
   buyNowBtn.addEventListener("click", function () {
     console.log("=== BUY NOW BUTTON CLICKED ===");
     console.log("Button data attributes:", {
@@ -73,6 +76,7 @@ document.addEventListener("DOMContentLoaded", function () {
       headers: {
         "Content-Type": "application/json",
         "X-CSRFToken": csrfToken,
+        "Idempotency-Key": paymentKey,
       },
       body: JSON.stringify({}),
     })
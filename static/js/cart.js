@@ -93,6 +93,90 @@ function updateCartItem(cartItemId, quantity) {
     });
 }
 
+// Quantity changes on the cart page are sent together to /cart/batch/
+const pendingCartOperations = new Map();
+let cartBatchTimer = null;
+
+function queueCartUpdate(cartItemId, quantity) {
+  pendingCartOperations.set(cartItemId, {
+    op: "update",
+    cart_item_id: cartItemId,
+    quantity: quantity,
+  });
+  clearTimeout(cartBatchTimer);
+  cartBatchTimer = setTimeout(flushCartUpdates, 400);
+}
+
+function flushCartUpdates() {
+  const operations = Array.from(pendingCartOperations.values());
+  pendingCartOperations.clear();
+  if (operations.length) {
+    batchUpdateCart(operations);
+  }
+}
+
+function batchUpdateCart(operations) {
+  const token = getCSRFToken();
+  if (!token) {
+    showNotification("CSRF token not found. Please refresh the page.", "error");
+    return;
+  }
+
+  return fetch("/cart/batch/", {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      "X-CSRFToken": token,
+    },
+    body: JSON.stringify({ operations: operations }),
+  })
+    .then((response) => response.json())
+    .then((data) => {
+      if (data.success) {
+        renderCartTotals(data);
+      } else {
+        showNotification(data.message || "Error updating cart", "error");
+        // Put the inputs back to what the cart really holds
+        setTimeout(() => location.reload(), 2000);
+      }
+      return data;
+    })
+    .catch((error) => {
+      console.error("Error:", error);
+      showNotification("Error updating cart", "error");
+    });
+}
+
+function renderCartTotals(data) {
+  data.items.forEach((item) => {
+    const total = document.querySelector(`[data-item-total="${item.id}"]`);
+    if (total) {
+      total.textContent = `${item.total_price} BDT`;
+    }
+  });
+  data.removed.forEach((id) => {
+    document.querySelector(`[data-cart-item="${id}"]`)?.remove();
+  });
+
+  const fields = {
+    "[data-cart-total-items]": data.total_items,
+    "[data-cart-subtotal]": `${data.subtotal} BDT`,
+    "[data-cart-discount]": `-${data.discount} BDT`,
+    "[data-cart-total]": `${data.total} BDT`,
+  };
+  Object.entries(fields).forEach(([selector, value]) => {
+    const element = document.querySelector(selector);
+    if (element) {
+      element.textContent = value;
+    }
+  });
+  updateCartCount(data.total_items);
+
+  if (!data.items.length) {
+    location.reload(); // Show the empty cart page
+  }
+}
+
 // Buy Now function
 function buyNow(productId, quantity = 1) {
   console.log("=== BUY NOW FUNCTION CALLED ===");
@@ -290,7 +374,7 @@ function initializeCart() {
       const quantity = parseInt(this.value);
 
       if (quantity > 0) {
-        updateCartItem(cartItemId, quantity);
+        queueCartUpdate(cartItemId, quantity);
       }
     });
   });
@@ -314,6 +398,7 @@ window.CrazyCartCart = {
   addToCart,
   buyNow,
   updateCartItem,
+  batchUpdateCart,
   updateCartCount,
   showClearCartModal,
   initializeCart,
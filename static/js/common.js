@@ -45,6 +45,16 @@ function showNotification(message, type = "info") {
   }, 3000);
 }
 
+// Idempotency-Key for a purchase: make one per attempt and send it again
+// on retries, so the server answers a repeated click with the first
+// result instead of placing a second order
+function newIdempotencyKey() {
+  if (window.crypto && crypto.randomUUID) {
+    return crypto.randomUUID();
+  }
+  return Date.now().toString(36) + Math.random().toString(36).slice(2);
+}
+
 // Price formatting
 function formatPrice(price) {
   return parseFloat(price).toFixed(2) + " BDT";